@@ -1,6 +1,6 @@
 """
 Bot de seleção automática de volatility indices + timeframes (Python).
-- Coleta ticks em tempo real (WebSocket público da Deriv).
+- Coleta ticks em tempo real pelo barramento de ticks do DerivWS (conexão única, re-subscrição automática).
 - Agrega em janelas (ticks / segundos / minutos).
 - Simula trades simples para avaliar performance por símbolo+timeframe.
 - Seleciona o melhor e (opcional) executa a ordem real via Deriv.
@@ -9,18 +9,15 @@ Integrado ao sistema existente de trading da Deriv.
 """
 
 import asyncio
-import json
 import time
-from collections import deque, defaultdict
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Any, Optional
 import numpy as np
 import pandas as pd
-import websockets
 import logging
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-import os
 
 # configuração de logging
 logger = logging.getLogger(__name__)
@@ -48,9 +45,6 @@ TIMEFRAMES = [
 SIM_WINDOW_SECONDS = 60  # janela de histórico (em segundos) usada para simular performance
 SIM_TRADE_STAKE = 1.0    # stake hipotético por simulação (apenas para ranking)
 
-# Websocket endpoint público (Deriv/Binaryws)
-DERIV_WS = f"wss://ws.derivws.com/websockets/v3?app_id={os.environ.get('DERIV_APP_ID', '1089')}"
-
 # parâmetros da estratégia de simulação (CONSERVADOR: critérios mais rigorosos)
 @dataclass
 class StrategyParams:
@@ -127,14 +121,242 @@ class AutoBotStatus(BaseModel):
     # Estatísticas de performance por tipo de timeframe
     timeframe_performance: Optional[Dict[str, Dict[str, Any]]] = None
 
+class AutoBotGridRequest(BaseModel):
+    ma_short: List[int] = [2, 3, 5]
+    ma_long: List[int] = [8, 13, 21]
+    expiry: List[int] = [1, 3, 5, 10]
+    top: int = 50
+
 class AutoBotResults(BaseModel):
     timestamp: datetime
     results: List[Dict[str, Any]]
     best_combo: Optional[Dict[str, Any]] = None
 
 # --- Estruturas de dados em memória ---
-# armazenar ticks por símbolo como deque de (timestamp, price)
-ticks_store: Dict[str, deque] = {sym: deque(maxlen=20000) for sym in SYMBOLS}
+TICK_CAPACITY = 20000  # ticks mantidos por símbolo
+CANDLE_HISTORY = 512   # candles fechados mantidos por (símbolo, timeframe)
+
+
+class ColumnRing:
+    """
+    Armazenamento colunar em float64 pré-alocado, com capacidade fixa (linha 0 = chave de tempo).
+    As colunas têm `capacity + slack` posições: escreve-se em sequência e, ao chegar ao fim,
+    os últimos `capacity` registros são compactados para o início (custo amortizado O(1)).
+    Assim a janela viva é sempre contígua e as leituras são views sem cópia.
+    A chave de tempo é mantida não-decrescente, o que permite recortes com searchsorted.
+    As views são válidas até o próximo append (use-as de forma síncrona no event loop).
+    """
+    __slots__ = ("capacity", "_data", "_start", "_end")
+
+    def __init__(self, ncols: int, capacity: int, slack: Optional[int] = None):
+        self.capacity = max(1, int(capacity))
+        size = self.capacity + max(1, int(slack if slack is not None else self.capacity // 8))
+        self._data = np.empty((ncols, size), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, *values: float):
+        data = self._data
+        if self._end == data.shape[1]:
+            keep = self.capacity - 1
+            data[:, :keep] = data[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        if self._end > self._start and values[0] < data[0, self._end - 1]:
+            # feed fora de ordem não pode quebrar a ordenação usada no searchsorted
+            values = (data[0, self._end - 1],) + values[1:]
+        data[:, self._end] = values
+        self._end += 1
+        if self._end - self._start > self.capacity:
+            self._start += 1
+
+    def view(self) -> np.ndarray:
+        """Todas as colunas (ncols, n) como view; desempacotável: `ts, price = ring.view()`."""
+        return self._data[:, self._start:self._end]
+
+    def since(self, cutoff: float) -> np.ndarray:
+        """Registros com chave >= cutoff (busca binária, sem cópia)."""
+        cols = self.view()
+        i = int(np.searchsorted(cols[0], cutoff, side="left"))
+        return cols[:, i:]
+
+    def last(self, n: int) -> np.ndarray:
+        cols = self.view()
+        n = max(0, min(int(n), cols.shape[1]))
+        return cols[:, cols.shape[1] - n:]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+
+class TickRing(ColumnRing):
+    """Ticks (timestamp, price) de um símbolo."""
+    __slots__ = ()
+
+    def __init__(self, capacity: int = TICK_CAPACITY, slack: Optional[int] = None):
+        super().__init__(2, capacity, slack)
+
+
+class CandleSeries:
+    """
+    Candles de um timeframe atualizados tick a tick.
+    Fechados ficam num ColumnRing (end_ts, start_ts, open, high, low, close, volume), onde end_ts é o
+    timestamp do último tick do candle; o candle em formação fica em escalares.
+    - ticks: fecha a cada `tf_val` ticks
+    - s / m: bucket floor(ts / period) * period; fecha quando chega tick de outro bucket
+    """
+    __slots__ = ("tf_type", "tf_val", "period", "closed", "_cur")
+
+    def __init__(self, tf_type: str, tf_val: int, history: int = CANDLE_HISTORY):
+        if tf_type == 'ticks':
+            self.period = None
+        elif tf_type == 's':
+            self.period = float(tf_val)
+        elif tf_type == 'm':
+            self.period = float(tf_val) * 60.0
+        else:
+            raise ValueError("tf_type inválido")
+        self.tf_type = tf_type
+        self.tf_val = max(1, int(tf_val))
+        self.closed = ColumnRing(7, history)
+        self._cur: Optional[List[float]] = None  # [end, start, open, high, low, close, volume]
+
+    def on_tick(self, ts: float, price: float):
+        cur = self._cur
+        if self.period is not None:
+            bucket = (ts // self.period) * self.period
+            if cur is not None and bucket != cur[1]:
+                self.closed.append(*cur)
+                cur = None
+            if cur is None:
+                self._cur = [ts, bucket, price, price, price, price, 1.0]
+                return
+        elif cur is None:
+            cur = self._cur = [ts, ts, price, price, price, price, 0.0]
+        cur[0] = ts
+        if price > cur[3]:
+            cur[3] = price
+        if price < cur[4]:
+            cur[4] = price
+        cur[5] = price
+        cur[6] += 1.0
+        if self.period is None and cur[6] >= self.tf_val:
+            self.closed.append(*cur)
+            self._cur = None
+
+    def window(self, cutoff_ts: float, include_forming: bool = True) -> np.ndarray:
+        """Candles com algum tick em ts >= cutoff_ts: (7, n); o em formação entra como última coluna."""
+        cols = self.closed.since(cutoff_ts)
+        if include_forming and self._cur is not None and self._cur[0] >= cutoff_ts:
+            return np.concatenate([cols, np.asarray(self._cur, dtype=np.float64)[:, None]], axis=1)
+        return cols
+
+    @staticmethod
+    def to_frame(cols: np.ndarray) -> pd.DataFrame:
+        """DataFrame no formato de sempre: index = início do candle, colunas open/high/low/close/volume."""
+        return pd.DataFrame({
+            'open': cols[2],
+            'high': cols[3],
+            'low': cols[4],
+            'close': cols[5],
+            'volume': cols[6].astype(np.int64),
+        }, index=pd.Index(cols[1], name='ts'))
+
+
+class MultiTimeframeAggregator:
+    """Atualiza as séries de todos os timeframes configurados a cada tick de um símbolo."""
+    __slots__ = ("series",)
+
+    def __init__(self, timeframes: List[Tuple[str, int]], history: int = CANDLE_HISTORY):
+        self.series: Dict[Tuple[str, int], CandleSeries] = {
+            (tf_type, int(tf_val)): CandleSeries(tf_type, tf_val, history) for tf_type, tf_val in timeframes
+        }
+
+    def on_tick(self, ts: float, price: float):
+        for s in self.series.values():
+            s.on_tick(ts, price)
+
+    def timeframes(self) -> List[Tuple[str, int]]:
+        return list(self.series.keys())
+
+    def window(self, tf_type: str, tf_val: int, cutoff_ts: float, include_forming: bool = True) -> Optional[np.ndarray]:
+        s = self.series.get((tf_type, int(tf_val)))
+        return None if s is None else s.window(cutoff_ts, include_forming)
+
+    @classmethod
+    def from_ticks(cls, timeframes: List[Tuple[str, int]], ring: Optional[TickRing], history: int = CANDLE_HISTORY) -> "MultiTimeframeAggregator":
+        agg = cls(timeframes, history)
+        if ring is not None:
+            ts, price = ring.view()
+            for t, p in zip(ts.tolist(), price.tolist()):
+                agg.on_tick(t, p)
+        return agg
+
+
+def simulate_strategy_grid(series: Dict[Any, np.ndarray], ma_shorts: List[int], ma_longs: List[int],
+                           expiries: List[int], stake: float = 1.0, payout: float = 0.8) -> pd.DataFrame:
+    """
+    Simulação vetorizada da regra de cruzamento de médias (ma_diff > 0 => CALL, < 0 => PUT; resultado
+    comparando o close `expiry` candles à frente) para todas as séries e toda a grade de parâmetros.
+    series: {chave: closes} (ex.: chave = (symbol, tf_type, tf_val)); as séries são empilhadas numa matriz
+    com padding NaN à direita, as médias saem de somas cumulativas (rolling com min_periods=1) e sinal/
+    resultado são avaliados de uma vez para cada expiry. Pares com ma_short == ma_long são ignorados.
+    Retorna tabela ordenada por (net, winrate) com colunas: key, ma_short, ma_long, expiry, trades, wins,
+    losses, net, winrate (NaN sem trades).
+    """
+    columns = ['key', 'ma_short', 'ma_long', 'expiry', 'trades', 'wins', 'losses', 'net', 'winrate']
+    keys = list(series.keys())
+    pairs = [(int(a), int(b)) for a in dict.fromkeys(ma_shorts) for b in dict.fromkeys(ma_longs) if int(a) != int(b)]
+    exps = [max(1, int(e)) for e in dict.fromkeys(expiries)]
+    if not keys or not pairs or not exps:
+        return pd.DataFrame(columns=columns)
+
+    lens = np.array([len(series[k]) for k in keys])
+    n = max(1, int(lens.max()))
+    closes = np.full((len(keys), n), np.nan)
+    for i, k in enumerate(keys):
+        c = np.asarray(series[k], dtype=np.float64)
+        # centraliza no primeiro close: somas menores (menos arredondamento) e mercado parado => diff 0 exato
+        closes[i, :len(c)] = c - c[0] if len(c) else c
+    cs = np.concatenate([np.zeros((len(keys), 1)), np.cumsum(np.nan_to_num(closes), axis=1)], axis=1)
+    idx = np.arange(n)
+    means = {}
+    for w in {w for pair in pairs for w in pair}:
+        lo = np.maximum(idx + 1 - w, 0)
+        means[w] = (cs[:, idx + 1] - cs[:, lo]) / np.minimum(idx + 1, w)
+    tol = 8 * np.finfo(np.float64).eps * n * np.nanmax(np.abs(closes)) if np.isfinite(closes).any() else 0.0
+    diff = np.stack([means[a] - means[b] for a, b in pairs], axis=1)             # (S, Q, n)
+    signal = np.where(diff > tol, 1, np.where(diff < -tol, -1, 0)).astype(np.int8)
+    min_len = np.array([max(a, b) + 1 for a, b in pairs])                        # len >= max(ma)+1
+    enough = lens[:, None] >= min_len[None, :]                                   # (S, Q)
+
+    rows = []
+    for e in exps:
+        if e >= n:
+            trades = wins = np.zeros((len(keys), len(pairs)), dtype=np.int64)
+        else:
+            move = np.zeros((len(keys), n), dtype=np.int8)
+            with np.errstate(invalid="ignore"):
+                move[:, :n - e] = np.sign(closes[:, e:] - closes[:, :n - e])
+            valid = idx[None, :] < (lens[:, None] - e)                             # futuro disponível
+            traded = (signal != 0) & valid[:, None, :] & enough[:, :, None]
+            trades = traded.sum(axis=2)
+            wins = (traded & (signal == move[:, None, :])).sum(axis=2)
+        for si, k in enumerate(keys):
+            for qi, (a, b) in enumerate(pairs):
+                t, w = int(trades[si, qi]), int(wins[si, qi])
+                rows.append((k, a, b, e, t, w, t - w, w * payout * stake - (t - w) * stake, w / t if t else np.nan))
+    table = pd.DataFrame(rows, columns=columns)
+    return table.sort_values(['net', 'winrate'], ascending=False, na_position='last', kind='stable').reset_index(drop=True)
+
+
+# ticks por símbolo (colunar, ver TickRing)
+ticks_store: Dict[str, TickRing] = {sym: TickRing() for sym in SYMBOLS}
+# candles por símbolo, todos os timeframes, alimentados tick a tick
+candle_aggs: Dict[str, MultiTimeframeAggregator] = {sym: MultiTimeframeAggregator(TIMEFRAMES) for sym in SYMBOLS}
 
 # --- Classe principal do bot ---
 class AutoSelectionBot:
@@ -173,7 +395,13 @@ class AutoSelectionBot:
         global ticks_store
         for symbol in config.symbols:
             if symbol not in ticks_store:
-                ticks_store[symbol] = deque(maxlen=20000)
+                ticks_store[symbol] = TickRing()
+        # Agregadores de candles: recria (replay dos ticks guardados) se os timeframes mudaram
+        timeframes = [(tf_type, int(tf_val)) for tf_type, tf_val in config.timeframes]
+        for symbol in config.symbols:
+            agg = candle_aggs.get(symbol)
+            if agg is None or agg.timeframes() != timeframes:
+                candle_aggs[symbol] = MultiTimeframeAggregator.from_ticks(timeframes, ticks_store.get(symbol))
                 
     async def start(self):
         """Inicia o bot de seleção automática"""
@@ -229,62 +457,53 @@ class AutoSelectionBot:
         return self.status
         
     async def _collect_ticks(self):
-        """Conecta ao WebSocket da Deriv e mantém recebendo ticks para os símbolos listados."""
+        """Recebe ticks pelo barramento do DerivWS (mesmo socket do runner e dos clientes WS).
+        Reconexão e re-subscrição ficam a cargo do DerivWS; aqui só acompanhamos os símbolos da config."""
+        if self.deriv_api is None:
+            logger.error("Coleta de ticks: DerivWS não configurado (set_deriv_api)")
+            return
+        hub = self.deriv_api.tick_hub
+        symbols: List[str] = []
         try:
-            self.status.collecting_ticks = True
-            logger.info(f"Conectando ao WebSocket da Deriv: {DERIV_WS}")
-            
-            async with websockets.connect(DERIV_WS) as ws:
-                # subscreve cada símbolo
-                for symbol in self.config.symbols:
-                    await self._subscribe_ticks(symbol, ws)
-                    logger.info(f"Subscrito ticks: {symbol}")
-                    
-                # loop de recebimento
-                async for message in ws:
-                    if not self.running:
-                        break
-                        
-                    try:
-                        data = json.loads(message)
-                    except Exception as e:
-                        logger.warning(f"Erro ao parsear mensagem WebSocket: {e}")
-                        continue
-                        
-                    # mensagem de ticks geralmente tem a chave 'tick'
-                    if "tick" in data:
-                        await self._process_tick(data['tick'])
-                        
+            while self.running:
+                wanted = list(self.config.symbols)
+                if wanted != symbols:
+                    hub.unlisten([s for s in symbols if s not in wanted], self._process_tick)
+                    await hub.listen(wanted, self._process_tick)
+                    logger.info(f"Subscrito ticks: {wanted}")
+                    symbols = wanted
+                self.status.collecting_ticks = bool(self.deriv_api.connected)
+                await asyncio.sleep(1.0)
         except Exception as e:
             logger.error(f"Erro na coleta de ticks: {e}")
         finally:
+            hub.unlisten(symbols, self._process_tick)
             self.status.collecting_ticks = False
-            
-    async def _subscribe_ticks(self, symbol: str, websocket):
-        """Envia pedido de subscrição de ticks para o symbol"""
-        req = {"ticks": symbol, "subscribe": 1}
-        await websocket.send(json.dumps(req))
-        
-    async def _process_tick(self, tick_data):
-        """Processa um tick recebido"""
+
+    def _process_tick(self, tick: Dict[str, Any]):
+        """Processa um tick do barramento ({symbol, price, timestamp, ask, bid}, já decodificado)"""
         try:
-            symbol = tick_data.get('symbol') or tick_data.get('quote') or tick_data.get('name') or tick_data.get('s')
+            symbol = tick.get('symbol')
             if not symbol:
                 return
-                
-            # timestamp: alguns feeds trazem 'epoch' em segundos
-            ts = float(tick_data.get('epoch', time.time()))
-            price = float(tick_data.get('quote') or tick_data.get('ask') or tick_data.get('bid') or tick_data.get('price', 0))
-            
-            if symbol in ticks_store:
-                ticks_store[symbol].append((ts, price))
-            else:
+
+            # timestamp: epoch em segundos
+            ts = float(tick.get('timestamp') or time.time())
+            price = float(tick.get('price') or tick.get('ask') or tick.get('bid') or 0)
+
+            ring = ticks_store.get(symbol)
+            if ring is None:
                 # caso símbolo não esteja no store (safety)
-                ticks_store[symbol] = deque([(ts, price)], maxlen=20000)
-                
+                ring = ticks_store[symbol] = TickRing()
+            ring.append(ts, price)
+            agg = candle_aggs.get(symbol)
+            if agg is None:
+                agg = candle_aggs[symbol] = MultiTimeframeAggregator(self.config.timeframes)
+            agg.on_tick(ts, price)
+
         except Exception as e:
             logger.warning(f"Erro ao processar tick: {e}")
-            
+
     async def _evaluation_loop(self):
         """Loop principal de avaliação e decisão"""
         try:
@@ -320,54 +539,48 @@ class AutoSelectionBot:
     def _evaluate_all_combinations(self) -> Dict:
         """
         Para cada símbolo e timeframe:
-         - pega ticks recentes do ticks_store
-         - agrega pra candles de timeframe
+         - lê os candles da janela recente do agregador incremental (candle_aggs)
          - simula performance com critérios avançados
         Retorna ranking por score combinado (winrate + PnL + volume) ou net.
         """
         results = []
         cutoff_ts = time.time() - self.config.sim_window_seconds
-        
-        total_combinations = 0
         valid_combinations = 0
         
-        for sym in self.config.symbols:
-            ticks_list = list(ticks_store.get(sym, []))
-            # filtrar somente ticks recentes (janela)
-            ticks_recent = [(ts, p) for ts, p in ticks_list if ts >= cutoff_ts]
-            
-            if not ticks_recent:
-                continue
+        closes = self._window_closes(cutoff_ts)
+        total_combinations = len(closes)
+        # uma passada vetorizada para todos os pares (símbolo, timeframe) com os parâmetros da estratégia
+        table = simulate_strategy_grid(closes, [STRAT.ma_short], [STRAT.ma_long], [STRAT.expiry_seconds],
+                                       stake=self.config.sim_trade_stake)
+        sims = {row.key: self._sim_row(row) for row in table.itertuples(index=False)}
+        
+        for (sym, tf_type, tf_val), c in closes.items():
+            try:
+                sim = sims.get((sym, tf_type, tf_val)) or {"trades":0,"wins":0,"losses":0,"net":0.0,"winrate":None}
                 
-            for tf_type, tf_val in self.config.timeframes:
-                total_combinations += 1
-                try:
-                    candles = self._aggregate_to_candles(ticks_recent, tf_type, tf_val)
-                    sim = self._simulate_simple_strategy(candles, STRAT, stake=self.config.sim_trade_stake)
-                    
-                    # Calcula score combinado
-                    combined_score = self._calculate_combined_score(sim)
-                    
-                    # Adiciona métricas extras
-                    result = {
-                        "symbol": sym,
-                        "tf_type": tf_type,
-                        "tf_val": tf_val,
-                        "timeframe_desc": f"{tf_type}{tf_val}",
-                        "combined_score": combined_score,
-                        "meets_criteria": self._meets_execution_criteria(sim),
-                        "candles_count": len(candles),
-                        **sim
-                    }
-                    
-                    results.append(result)
-                    
-                    if sim['trades'] > 0:
-                        valid_combinations += 1
-                        
-                except Exception as e:
-                    logger.warning(f"Erro ao avaliar {sym} {tf_type}{tf_val}: {e}")
+                # Calcula score combinado
+                combined_score = self._calculate_combined_score(sim)
+                
+                # Adiciona métricas extras
+                result = {
+                    "symbol": sym,
+                    "tf_type": tf_type,
+                    "tf_val": tf_val,
+                    "timeframe_desc": f"{tf_type}{tf_val}",
+                    "combined_score": combined_score,
+                    "meets_criteria": self._meets_execution_criteria(sim),
+                    "candles_count": len(c),
+                    **sim
+                }
+                
+                results.append(result)
+                
+                if sim['trades'] > 0:
+                    valid_combinations += 1
                     
+            except Exception as e:
+                logger.warning(f"Erro ao avaliar {sym} {tf_type}{tf_val}: {e}")
+                
         # Ordena por score combinado se configurado, senão por net
         if self.config.use_combined_score:
             results_sorted = sorted(results, key=lambda x: x['combined_score'], reverse=True)
@@ -545,52 +758,60 @@ class AutoSelectionBot:
         
         return basic_criteria
         
-    def _aggregate_to_candles(self, ticks: List[Tuple[float, float]], tf_type: str, tf_value: int) -> pd.DataFrame:
+    def _window_closes(self, cutoff_ts: float) -> Dict[Tuple[str, str, int], np.ndarray]:
+        """Closes da janela recente para cada (símbolo, timeframe) com ticks após cutoff_ts."""
+        closes: Dict[Tuple[str, str, int], np.ndarray] = {}
+        for sym in self.config.symbols:
+            agg = candle_aggs.get(sym)
+            ring = ticks_store.get(sym)
+            # sem ticks na janela recente => nada a avaliar
+            if agg is None or ring is None or len(ring.since(cutoff_ts)[0]) == 0:
+                continue
+            for tf_type, tf_val in self.config.timeframes:
+                cols = agg.window(tf_type, tf_val, cutoff_ts)
+                closes[(sym, tf_type, tf_val)] = cols[5] if cols is not None else np.empty(0)
+        return closes
+
+    @staticmethod
+    def _sim_row(row) -> Dict[str, Any]:
+        return {
+            "trades": int(row.trades),
+            "wins": int(row.wins),
+            "losses": int(row.losses),
+            "net": float(row.net),
+            "winrate": None if pd.isna(row.winrate) else float(row.winrate),
+        }
+
+    def simulate_grid(self, ma_shorts: List[int], ma_longs: List[int], expiries: List[int], top: int = 50) -> List[Dict[str, Any]]:
+        """Busca de parâmetros: ranking de toda a grade ma_short/ma_long/expiry x (símbolo, timeframe) da janela atual."""
+        cutoff_ts = time.time() - self.config.sim_window_seconds
+        table = simulate_strategy_grid(self._window_closes(cutoff_ts), ma_shorts, ma_longs, expiries,
+                                       stake=self.config.sim_trade_stake)
+        out = []
+        for row in table.head(max(1, int(top))).itertuples(index=False):
+            sym, tf_type, tf_val = row.key
+            out.append({
+                "symbol": sym,
+                "tf_type": tf_type,
+                "tf_val": tf_val,
+                "timeframe_desc": f"{tf_type}{tf_val}",
+                "ma_short": int(row.ma_short),
+                "ma_long": int(row.ma_long),
+                "expiry": int(row.expiry),
+                **self._sim_row(row),
+            })
+        return out
+
+    def _window_candles(self, agg: MultiTimeframeAggregator, tf_type: str, tf_value: int, cutoff_ts: float) -> pd.DataFrame:
         """
-        Agrupa uma lista de ticks (timestamp, price) em candles conforme timeframe.
+        Candles do timeframe com ticks na janela [cutoff_ts, agora] (inclui o candle em formação).
         tf_type in {'ticks','s','m'}
         Retorna DataFrame com index = candle_start_ts e colunas ['open','high','low','close','volume']
         """
-        if not ticks:
+        cols = agg.window(tf_type, tf_value, cutoff_ts)
+        if cols is None or cols.shape[1] == 0:
             return pd.DataFrame(columns=['open','high','low','close','volume'])
-
-        df = pd.DataFrame(ticks, columns=['ts','price'])
-        
-        if tf_type == 'ticks':
-            # criar candles por número de ticks
-            group = np.arange(len(df)) // tf_value
-            df['grp'] = group
-            agg = df.groupby('grp').agg(
-                open=('price','first'),
-                high=('price','max'),
-                low=('price','min'),
-                close=('price','last'),
-                ts=('ts','first'),
-                volume=('price','count')
-            )
-            agg = agg.set_index('ts').sort_index()
-            return agg[['open','high','low','close','volume']]
-        else:
-            # converter ts em bins de segundos
-            if tf_type == 's':
-                period = tf_value
-            elif tf_type == 'm':
-                period = tf_value * 60
-            else:
-                raise ValueError("tf_type inválido")
-                
-            # bucket by floor(ts / period) * period
-            df['bucket'] = (df['ts'] // period) * period
-            agg = df.groupby('bucket').agg(
-                open=('price','first'),
-                high=('price','max'),
-                low=('price','min'),
-                close=('price','last'),
-                volume=('price','count')
-            )
-            agg.index.name = 'ts'
-            agg = agg.sort_index()
-            return agg[['open','high','low','close','volume']]
+        return CandleSeries.to_frame(cols)
             
     def _compute_simple_indicators(self, candles: pd.DataFrame, ma_short: int, ma_long: int) -> pd.DataFrame:
         """Calcula indicadores simples"""
@@ -609,42 +830,16 @@ class AutoSelectionBot:
         Usa candles para calcular taxa de acerto e lucro hipotético em uma janela curta.
         Para simplificação, assumimos que se price after expiry moved na direção, ganhamos 0.8x stake,
         caso contrário perdemos stake (exemplo de payout assume ~1:0.8). Ajuste conforme sua realidade.
+        (Caso de uma série/um ponto de simulate_strategy_grid.)
         """
         if candles.empty or len(candles) < max(params.ma_long, params.ma_short)+1:
             return {"trades":0,"wins":0,"losses":0,"net":0.0,"winrate":None}
-            
-        df = self._compute_simple_indicators(candles, params.ma_short, params.ma_long)
-        trades = 0
-        wins = 0
-        losses = 0
-        net = 0.0
-        
-        # Simular: para cada candle, tomar decisão e comparar com candle 'expiry' ahead.
-        expiry = max(1, int(params.expiry_seconds))  # aqui expiry em unidades de candles (aprox)
-        closes = df['close'].values
-        ma_diff = df['ma_diff'].values
-        n = len(closes)
-        
-        for i in range(n - expiry):
-            signal = np.sign(ma_diff[i])
-            if signal == 0:
-                continue
-            trades += 1
-            future = closes[i + expiry]
-            current = closes[i]
-            move = future - current
-            direction = np.sign(move)
-            
-            if direction == signal:
-                # win — assumir payout 0.8 * stake (EXEMPLO)
-                wins += 1
-                net += 0.8 * stake
-            else:
-                losses += 1
-                net -= stake
-                
-        winrate = (wins / trades) if trades>0 else None
-        return {"trades":trades,"wins":wins,"losses":losses,"net":net,"winrate":winrate}
+        # expiry em unidades de candles (aprox)
+        table = simulate_strategy_grid({0: candles['close'].to_numpy(dtype=float)}, [params.ma_short], [params.ma_long],
+                                       [max(1, int(params.expiry_seconds))], stake=stake)
+        if table.empty:
+            return {"trades":0,"wins":0,"losses":0,"net":0.0,"winrate":None}
+        return self._sim_row(next(table.itertuples(index=False)))
         
     async def _try_execute_trade(self):
         """Tenta executar trade real baseado na melhor combinação COM CRITÉRIOS CONSERVADORES"""
@@ -675,12 +870,11 @@ class AutoSelectionBot:
                 
             # Determina direção baseada no último sinal
             symbol = best['symbol']
-            ticks_recent = list(ticks_store.get(symbol, []))
+            agg = candle_aggs.get(symbol)
             cutoff_ts = time.time() - self.config.sim_window_seconds
-            ticks_filtered = [(ts, p) for ts, p in ticks_recent if ts >= cutoff_ts]
             
-            if ticks_filtered:
-                candles = self._aggregate_to_candles(ticks_filtered, best['tf_type'], best['tf_val'])
+            if agg is not None:
+                candles = self._window_candles(agg, best['tf_type'], best['tf_val'], cutoff_ts)
                 df = self._compute_simple_indicators(candles, STRAT.ma_short, STRAT.ma_long)
                 
                 if not df.empty:
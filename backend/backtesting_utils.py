@@ -2,7 +2,9 @@ from __future__ import annotations
 import json
 import os
 import math
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -10,14 +12,22 @@ from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (só o RLock do processo)
+    fcntl = None
+
 # NOTE: This module is purposely backend-agnostic and does not import FastAPI app directly.
 # Server will pass in callables to fetch candles from Deriv if CSVs are missing.
 
 BACKTESTS_DIR = Path(__file__).parent / "backtests"
 BACKTESTS_DIR.mkdir(exist_ok=True)
+# formato antigo (um JSON reescrito a cada run); importado uma vez para o store append-only
 BACKTESTS_RESULTS = BACKTESTS_DIR / "results.json"
-if not BACKTESTS_RESULTS.exists():
-    BACKTESTS_RESULTS.write_text(json.dumps({"runs": []}, indent=2))
+BACKTESTS_RUNS = BACKTESTS_DIR / "runs.jsonl"
+BACKTESTS_MAX_RUNS = int(os.environ.get("BACKTESTS_MAX_RUNS", "50000"))
+# cache colunar dos CSVs de OHLCV (um .npy por símbolo/timeframe, invalidado pelo mtime/tamanho do CSV)
+OHLCV_CACHE_DIR = BACKTESTS_DIR / "ohlcv_cache"
 
 
 def map_timeframe_to_granularity(timeframe: str) -> int:
@@ -57,40 +67,123 @@ def _candidate_csv_paths(symbol: str, timeframe: str) -> List[Path]:
     return [p for p in patterns if p is not None]
 
 
-def load_csv_ohlcv(symbol: str, timeframe: str) -> Optional[pd.DataFrame]:
+def _read_csv_ohlcv(p: Path) -> Optional[pd.DataFrame]:
+    df = pd.read_csv(p)
+    # Normalize columns
+    cols = {c.lower(): c for c in df.columns}
+    rename_map = {}
+    for key in ["datetime", "timestamp", "epoch", "time"]:
+        if key in cols:
+            rename_map[cols[key]] = "timestamp"
+            break
+    for key in ["open", "high", "low", "close", "volume"]:
+        if key in cols:
+            rename_map[cols[key]] = key
+    if rename_map:
+        df = df.rename(columns=rename_map)
+    # Build epoch seconds if possible
+    if "timestamp" in df.columns:
+        try:
+            if np.issubdtype(df["timestamp"].dtype, np.number):
+                ts = pd.to_datetime(df["timestamp"], unit="s", errors="coerce")
+            else:
+                ts = pd.to_datetime(df["timestamp"], errors="coerce")
+        except Exception:
+            ts = pd.to_datetime(df["timestamp"], errors="coerce")
+        df.index = ts
+    else:
+        # fallback create index
+        df.index = pd.date_range(start=datetime.utcnow(), periods=len(df), freq="1min")
+    # Ensure needed columns
+    needed = ["open", "high", "low", "close"]
+    if not all(c in df.columns for c in needed):
+        return None
+    return df
+
+
+def _ohlcv_cache_files(symbol: str, timeframe: str) -> Tuple[Path, Path, Path]:
+    stem = OHLCV_CACHE_DIR / f"{symbol}_{timeframe}"
+    return stem.with_suffix(".meta.json"), stem.with_suffix(".values.npy"), stem.with_suffix(".index.npy")
+
+
+def _source_signature(p: Path) -> Dict[str, Any]:
+    st = p.stat()
+    return {"source": str(p), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _load_ohlcv_cache(symbol: str, timeframe: str, p: Path) -> Optional[pd.DataFrame]:
+    meta_path, values_path, index_path = _ohlcv_cache_files(symbol, timeframe)
+    try:
+        meta = json.loads(meta_path.read_text())
+    except Exception:
+        return None
+    if {k: meta.get(k) for k in ("source", "mtime_ns", "size")} != _source_signature(p):
+        return None
+    # mmap copy-on-write: leitura sem cópia; escritas eventuais ficam só na memória do processo
+    values = np.load(values_path, mmap_mode="c")
+    index = np.load(index_path, mmap_mode="c")
+    if values.shape != (len(meta["columns"]), len(index)):
+        return None
+    # bloco (colunas, linhas) vira o bloco interno do DataFrame sem cópia
+    dt_index = pd.DatetimeIndex(index.view("datetime64[ns]"))
+    if meta.get("tz"):
+        dt_index = dt_index.tz_localize("UTC").tz_convert(meta["tz"])
+    dt_index.name = meta.get("index_name")
+    return pd.DataFrame(values.T, columns=meta["columns"], index=dt_index, copy=False)
+
+
+def _write_ohlcv_cache(symbol: str, timeframe: str, p: Path, df: pd.DataFrame, signature: Dict[str, Any]) -> bool:
+    if "timestamp" not in df.columns or not isinstance(df.index, pd.DatetimeIndex):
+        return False  # índice sintético (datetime.utcnow) não é cacheável
+    columns = [c for c in df.columns if np.issubdtype(df[c].dtype, np.number)]
+    if df.index.tz is not None:
+        index = df.index.tz_convert("UTC").tz_localize(None)
+    else:
+        index = df.index
+    OHLCV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    meta_path, values_path, index_path = _ohlcv_cache_files(symbol, timeframe)
+    # arrays primeiro, meta por último (tmp + os.replace): meta válido só aponta para arrays completos
+    for path, arr in ((values_path, np.ascontiguousarray(df[columns].to_numpy(dtype=np.float64).T)),
+                      (index_path, index.asi8)):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, path)
+    tmp = meta_path.with_name(meta_path.name + ".tmp")
+    tmp.write_text(json.dumps({**signature, "columns": columns, "rows": len(df),
+                               "tz": str(df.index.tz) if df.index.tz is not None else None,
+                               "index_name": df.index.name,
+                               "sorted": bool(index.is_monotonic_increasing)}))
+    os.replace(tmp, meta_path)
+    return True
+
+
+def load_csv_ohlcv(symbol: str, timeframe: str, use_cache: bool = True) -> Optional[pd.DataFrame]:
+    """OHLCV do primeiro CSV candidato. O CSV é convertido uma vez para um cache colunar (.npy) e as
+    cargas seguintes são memory-mapped (sem parse nem cópia) enquanto o CSV não mudar (mtime/tamanho).
+    Do cache vêm só as colunas numéricas, em float64, com o timestamp no índice."""
     for p in _candidate_csv_paths(symbol, timeframe):
         if p.exists():
             try:
-                df = pd.read_csv(p)
-                # Normalize columns
-                cols = {c.lower(): c for c in df.columns}
-                rename_map = {}
-                for key in ["datetime", "timestamp", "epoch", "time"]:
-                    if key in cols:
-                        rename_map[cols[key]] = "timestamp"
-                        break
-                for key in ["open", "high", "low", "close", "volume"]:
-                    if key in cols:
-                        rename_map[cols[key]] = key
-                if rename_map:
-                    df = df.rename(columns=rename_map)
-                # Build epoch seconds if possible
-                if "timestamp" in df.columns:
+                if use_cache:
                     try:
-                        if np.issubdtype(df["timestamp"].dtype, np.number):
-                            ts = pd.to_datetime(df["timestamp"], unit="s", errors="coerce")
-                        else:
-                            ts = pd.to_datetime(df["timestamp"], errors="coerce")
+                        df = _load_ohlcv_cache(symbol, timeframe, p)
+                        if df is not None:
+                            return df
                     except Exception:
-                        ts = pd.to_datetime(df["timestamp"], errors="coerce")
-                    df.index = ts
-                else:
-                    # fallback create index
-                    df.index = pd.date_range(start=datetime.utcnow(), periods=len(df), freq="1min")
-                # Ensure needed columns
-                needed = ["open", "high", "low", "close"]
-                if not all(c in df.columns for c in needed):
+                        pass
+                signature = _source_signature(p)
+                df = _read_csv_ohlcv(p)
+                if df is None:
                     return None
+                if use_cache:
+                    try:
+                        if _write_ohlcv_cache(symbol, timeframe, p, df, signature):
+                            cached = _load_ohlcv_cache(symbol, timeframe, p)
+                            if cached is not None:
+                                return cached
+                    except Exception:
+                        pass
                 return df
             except Exception:
                 continue
@@ -104,6 +197,12 @@ def slice_df_date(df: pd.DataFrame, date_from: Optional[str], date_to: Optional[
         return df
     s = pd.to_datetime(date_from) if date_from else None
     e = pd.to_datetime(date_to) if date_to else None
+    idx = df.index
+    if isinstance(idx, pd.DatetimeIndex) and idx.is_monotonic_increasing and not idx.hasnans:
+        # índice ordenado: busca binária + fatia (view), sem máscara booleana sobre o frame inteiro
+        lo = idx.searchsorted(s, side="left") if s is not None else 0
+        hi = idx.searchsorted(e, side="right") if e is not None else len(idx)
+        return df.iloc[lo:hi]
     if s is not None:
         df = df[df.index >= s]
     if e is not None:
@@ -111,10 +210,15 @@ def slice_df_date(df: pd.DataFrame, date_from: Optional[str], date_to: Optional[
     return df
 
 
-def decision_engine_backtest(df: pd.DataFrame, make_engine, engine_config: Dict[str, Any] | None = None) -> Dict[str, Any]:
+def decision_engine_backtest(df: pd.DataFrame, make_engine, engine_config: Dict[str, Any] | None = None,
+                             streaming: bool = True) -> Dict[str, Any]:
     """
     Run simple by-trade backtest: at each t, get decision RISE/FALL from engine on df[:t],
     realize P&L at t+1 using binary payout assumption (win +0.95, loss -1.0).
+
+    streaming=True (default, when the engine supports start_stream/step) builds the engine once,
+    computes features over the whole frame and advances the strategies bar by bar in O(1).
+    streaming=False keeps the reference path (new engine + evaluate(df[:t]) per bar).
     """
     if df is None or len(df) < 50:
         return {
@@ -133,20 +237,31 @@ def decision_engine_backtest(df: pd.DataFrame, make_engine, engine_config: Dict[
     cumulative = 0.0
     peak = 0.0
     max_dd = 0.0
+    close = df["close"].to_numpy(dtype=float)
+    stream_engine = None
+    if streaming:
+        try:
+            stream_engine = make_engine(engine_config)
+            stream_engine.start_stream(df)
+        except Exception:
+            stream_engine = None
     # Rolling loop
     for i in range(50, len(df) - 1):
-        window = df.iloc[: i + 1]
         try:
-            engine = make_engine(engine_config)
-            # Build ctx inside server where detect_market_regime exists; but here we only rely on engine.evaluate signature
-            res = engine.evaluate(window, ctx=None)  # engine should ignore ctx=None or wrapper will provide
+            if stream_engine is not None:
+                res = stream_engine.step(i, ctx=None)
+            else:
+                window = df.iloc[: i + 1]
+                engine = make_engine(engine_config)
+                # Build ctx inside server where detect_market_regime exists; but here we only rely on engine.evaluate signature
+                res = engine.evaluate(window, ctx=None)  # engine should ignore ctx=None or wrapper will provide
             side = res.get("decision")
         except Exception:
             side = None
         if side not in ("RISE", "FALL"):
             continue
-        c0 = float(df.iloc[i]["close"])
-        c1 = float(df.iloc[i + 1]["close"])
+        c0 = float(close[i])
+        c1 = float(close[i + 1])
         pnl = 0.95 if ((side == "RISE" and c1 > c0) or (side == "FALL" and c1 < c0)) else -1.0
         pnls.append(pnl)
         if pnl > 0:
@@ -177,21 +292,277 @@ def decision_engine_backtest(df: pd.DataFrame, make_engine, engine_config: Dict[
     }
 
 
+def river_threshold_sweep(
+    close: np.ndarray,
+    adx: np.ndarray,
+    rsi: np.ndarray,
+    thresholds: List[float],
+    warmup: int = 50,
+    payout: float = 0.95,
+    adx_min: float = 22.0,
+    rsi_ob: float = 70.0,
+    rsi_os: float = 30.0,
+) -> List[Dict[str, Any]]:
+    """
+    Vectorized threshold sweep for the River momentum backtest.
+    Builds a (threshold x candle) P&L matrix in one shot: momentum probability,
+    ADX/RSI confirmation masks, binary payout at t+1, then per-row win rate, EV,
+    max drawdown (peak starts at 0), Sharpe and Sortino (per trade, ddof=1).
+    Missing indicator values must be NaN.
+    """
+    close = np.asarray(close, dtype=float)
+    adx = np.asarray(adx, dtype=float)
+    rsi = np.asarray(rsi, dtype=float)
+    thr = np.asarray(thresholds, dtype=float).reshape(-1, 1)
+    n = len(close)
+    if n <= warmup + 1 or thr.size == 0:
+        return [
+            {"threshold": float(t), "trades": 0, "wins": 0, "win_rate": 0.0, "pnl_total": 0.0,
+             "expected_value": 0.0, "max_drawdown": 0.0, "sharpe": None, "sortino": None}
+            for t in thr.ravel()
+        ]
+
+    idx = np.arange(warmup, n - 1)
+    cur = close[idx]
+    prev = close[idx - 1]
+    nxt = close[idx + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        momentum = (cur - prev) / prev
+    prob_up = np.clip(0.5 + momentum * 2, 0.1, 0.9)
+
+    a = adx[idx]
+    r = rsi[idx]
+    ind_ok = ~np.isnan(a) & ~np.isnan(r) & np.isfinite(prob_up)
+    with np.errstate(invalid="ignore"):
+        call_ok = ind_ok & (r < rsi_ob) & (a > adx_min)
+        put_ok = ind_ok & (r > rsi_os) & (a > adx_min)
+
+    rise = prob_up[None, :] >= thr
+    fall = ~rise & (prob_up[None, :] <= (1.0 - thr))
+    calls = rise & call_ok[None, :]
+    puts = fall & put_ok[None, :]
+    traded = calls | puts
+
+    win_call = nxt > cur
+    win_put = nxt < cur
+    wins_mask = (calls & win_call[None, :]) | (puts & win_put[None, :])
+    pnl = np.where(traded, np.where(wins_mask, payout, -1.0), 0.0)
+
+    counts = traded.sum(axis=1)
+    wins = wins_mask.sum(axis=1)
+    totals = pnl.sum(axis=1)
+    safe = np.maximum(counts, 1)
+    means = totals / safe
+
+    cum = np.cumsum(pnl, axis=1)
+    peak = np.maximum.accumulate(np.maximum(cum, 0.0), axis=1)
+    max_dd = np.max(peak - cum, axis=1)
+
+    denom = np.maximum(counts - 1, 1)
+    dev = np.where(traded, pnl - means[:, None], 0.0)
+    sd = np.sqrt((dev ** 2).sum(axis=1) / denom)
+    down = np.sqrt((np.minimum(dev, 0.0) ** 2).sum(axis=1) / denom)
+
+    out: List[Dict[str, Any]] = []
+    for k, t in enumerate(thr.ravel()):
+        c = int(counts[k])
+        out.append({
+            "threshold": float(t),
+            "trades": c,
+            "wins": int(wins[k]),
+            "win_rate": float(wins[k] / c) if c else 0.0,
+            "pnl_total": float(totals[k]),
+            "expected_value": float(means[k]) if c else 0.0,
+            "max_drawdown": float(max_dd[k]) if c else 0.0,
+            "sharpe": float(means[k] / sd[k]) if c and sd[k] > 0 else None,
+            "sortino": float(means[k] / down[k]) if c and down[k] > 0 else None,
+        })
+    return out
+
+
+class RunStore:
+    """Store append-only de runs de backtest (JSON-lines) com índice id -> offset em memória.
+
+    - append: uma linha por run, escrita com um único os.write em O_APPEND; nunca reescreve o histórico.
+    - get: seek direto no offset indexado, O(1) no tamanho do histórico.
+    - list_runs: paginação pelo índice (mais recentes primeiro).
+    - retenção: acima de max_runs (+25% de folga) as linhas mais antigas são descartadas numa
+      compactação (tmp + os.replace), amortizada O(1) por append.
+    Escritores (append, compactação, importação do legado) seguram um flock exclusivo em `<path>.lock`,
+    então um append de outro processo nunca cai no arquivo antigo durante a troca da compactação.
+    O índice acompanha appends de outros processos (arquivo cresceu) e compactações (inode mudou); leitores não
+    seguram o flock, então cada leitura confere o id da linha e, se outro processo compactou no meio, reindexa e
+    tenta de novo uma vez.
+    """
+
+    def __init__(self, path: Path = BACKTESTS_RUNS, max_runs: int = BACKTESTS_MAX_RUNS,
+                 legacy_path: Optional[Path] = BACKTESTS_RESULTS):
+        self.path = Path(path)
+        self.max_runs = max(1, int(max_runs))
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._offsets: List[int] = []
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._end = 0
+        self._inode: Optional[int] = None
+        self._ready = False
+
+    # ---------------- index ----------------
+
+    @contextmanager
+    def _write_lock(self):
+        """Lock exclusivo entre processos (arquivo separado: o inode do store muda na compactação)."""
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path) + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # fechar libera o flock
+
+    def _ensure(self):
+        if not self._ready:
+            with self._write_lock():
+                self._migrate_legacy()
+            self._ready = True
+        self._sync()
+
+    def _migrate_legacy(self):
+        if self.path.exists() or self.legacy_path is None or not Path(self.legacy_path).exists():
+            return
+        try:
+            runs = json.loads(Path(self.legacy_path).read_text()).get("runs", [])
+        except Exception:
+            return
+        tmp = self.path.with_suffix(".jsonl.tmp")
+        with open(tmp, "w") as f:
+            for run in runs:
+                f.write(json.dumps(run, default=str) + "\n")
+        os.replace(tmp, self.path)
+
+    def _sync(self):
+        """Indexa as linhas novas desde o último offset conhecido (ou tudo, se o arquivo foi trocado)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._offsets, self._ids, self._index, self._end, self._inode = [], [], {}, 0, None
+            return
+        if st.st_ino != self._inode or st.st_size < self._end:
+            self._offsets, self._ids, self._index, self._end, self._inode = [], [], {}, 0, st.st_ino
+        if st.st_size == self._end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._end)
+            pos = self._end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # linha parcial (escrita em andamento em outro processo)
+                try:
+                    run_id = str(json.loads(line).get("id"))
+                except Exception:
+                    run_id = None
+                if run_id is not None:
+                    self._offsets.append(pos)
+                    self._ids.append(run_id)
+                    self._index[run_id] = pos
+                pos += len(line)
+            self._end = pos
+
+    def _read_at(self, offset: int, run_id: str) -> Optional[Dict[str, Any]]:
+        """Run gravado em `offset`, ou None se a linha ali não é `run_id` (offset de antes de uma compactação)."""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            try:
+                run = json.loads(f.readline())
+            except Exception:
+                return None
+        return run if isinstance(run, dict) and str(run.get("id")) == run_id else None
+
+    def _resync(self):
+        self._inode = None
+        self._sync()
+
+    # ---------------- API ----------------
+
+    def append(self, run: Dict[str, Any]) -> None:
+        line = (json.dumps(run, default=str) + "\n").encode()
+        with self._lock:
+            self._ensure()
+            with self._write_lock():
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+                self._sync()
+                if len(self._offsets) > self.max_runs + self.max_runs // 4:
+                    self._compact()
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._ensure()
+            for _ in range(2):
+                offset = self._index.get(str(run_id))
+                if offset is None:
+                    return None
+                run = self._read_at(offset, str(run_id))
+                if run is not None:
+                    return run
+                self._resync()
+            return None
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure()
+            return len(self._offsets)
+
+    def list_runs(self, offset: int = 0, limit: int = 100, newest_first: bool = True) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure()
+            for _ in range(2):
+                entries = list(zip(self._offsets, self._ids))
+                if newest_first:
+                    entries.reverse()
+                page = entries[max(0, int(offset)): max(0, int(offset)) + max(0, int(limit))]
+                runs = [self._read_at(o, run_id) for o, run_id in page]
+                if all(r is not None for r in runs):
+                    break
+                self._resync()
+        return [r for r in runs if r is not None]
+
+    def _compact(self):
+        # chamado com _write_lock: nenhum append de outro processo entre a cópia e o os.replace
+        keep = self._offsets[-self.max_runs:]
+        if not keep:
+            return
+        tmp = self.path.with_suffix(".jsonl.tmp")
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(keep[0])
+            dst.write(src.read())
+        os.replace(tmp, self.path)
+        self._resync()
+
+
+_run_store: Optional[RunStore] = None
+
+
+def run_store() -> RunStore:
+    global _run_store
+    if _run_store is None:
+        _run_store = RunStore()
+    return _run_store
+
+
 def append_run_to_results(run: Dict[str, Any]) -> None:
-    try:
-        data = json.loads(BACKTESTS_RESULTS.read_text())
-    except Exception:
-        data = {"runs": []}
-    data.setdefault("runs", []).append(run)
-    BACKTESTS_RESULTS.write_text(json.dumps(data, indent=2))
+    run_store().append(run)
 
 
 def load_run_from_results(run_id: str) -> Optional[Dict[str, Any]]:
     try:
-        data = json.loads(BACKTESTS_RESULTS.read_text())
-        for r in data.get("runs", []):
-            if str(r.get("id")) == str(run_id):
-                return r
+        return run_store().get(run_id)
     except Exception:
         return None
-    return None
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ciclo de vida do estado por contrato (DerivWS, RiskManager, MLStopLossPredictor).
+# Contratos finalizados (is_expired/is_sold) são removidos de todos os mapas após um período de graça
+# (leitores tardios ainda veem o resultado final); contratos sem update por CONTRACT_IDLE_TTL_SEC são
+# removidos mesmo sem aviso de fim. A varredura é amortizada (no máximo a cada CONTRACT_SWEEP_INTERVAL_SEC).
+# Contratos finalizados despejados deixam uma lápide (ids recentes, limitados a CONTRACT_TOMBSTONES_MAX): uma
+# reassinatura tardia do mesmo contrato não repete o aprendizado pós-trade nem a contagem de estatísticas.
+
+CONTRACT_EXPIRED_GRACE_SEC = float(os.environ.get("CONTRACT_EXPIRED_GRACE_SEC", "120"))
+CONTRACT_IDLE_TTL_SEC = float(os.environ.get("CONTRACT_IDLE_TTL_SEC", "3600"))
+CONTRACT_SWEEP_INTERVAL_SEC = float(os.environ.get("CONTRACT_SWEEP_INTERVAL_SEC", "30"))
+CONTRACT_TOMBSTONES_MAX = int(os.environ.get("CONTRACT_TOMBSTONES_MAX", "50000"))
+
+
+class ContractLifecycle:
+    def __init__(self, grace_sec: float = CONTRACT_EXPIRED_GRACE_SEC, idle_ttl_sec: float = CONTRACT_IDLE_TTL_SEC,
+                 sweep_interval_sec: float = CONTRACT_SWEEP_INTERVAL_SEC, max_tombstones: int = CONTRACT_TOMBSTONES_MAX):
+        self.grace_sec = float(grace_sec)
+        self.idle_ttl_sec = float(idle_ttl_sec)
+        self.sweep_interval_sec = float(sweep_interval_sec)
+        self.max_tombstones = max(1, int(max_tombstones))
+        # contract_id -> finished_at dos contratos finalizados já despejados (mais antigos primeiro)
+        self.tombstones: "OrderedDict[int, float]" = OrderedDict()
+        # estado próprio (DerivWS expõe estes dicts com os nomes antigos)
+        self.last_data: Dict[int, Dict[str, Any]] = {}
+        self.river_learned: Dict[int, bool] = {}
+        self.stats_recorded: Dict[int, bool] = {}
+        self.subscribed: Dict[int, bool] = {}
+        self.subscription_ids: Dict[int, str] = {}
+        self.last_seen: Dict[int, float] = {}
+        self.finished_at: Dict[int, float] = {}
+        # mapas por contrato de outros componentes (RiskManager.contracts, MLStopLoss.contract_history, ...)
+        self._maps: Dict[str, Dict[int, Any]] = {
+            "last_contract_data": self.last_data,
+            "river_learned": self.river_learned,
+            "stats_recorded": self.stats_recorded,
+            "contract_subscribed": self.subscribed,
+            "subscription_ids": self.subscription_ids,
+        }
+        self._queues: Optional[Dict[int, List[Any]]] = None
+        self._last_sweep = 0.0
+        self.stats = {"finished": 0, "evicted_finished": 0, "evicted_idle": 0, "forgets": 0, "sweeps": 0}
+
+    # ---------------- registration ----------------
+
+    def attach(self, name: str, mapping: Dict[int, Any]):
+        """Passa a despejar `mapping` (chaveado por contract_id) junto com o estado do contrato."""
+        self._maps[name] = mapping
+
+    def attach_queues(self, queues: Dict[int, List[Any]]):
+        """contract_queues: só listas vazias são removidas (um cliente WS ainda conectado mantém a sua)."""
+        self._queues = queues
+
+    # ---------------- events ----------------
+
+    def touch(self, contract_id: int, subscription_id: Optional[str] = None, now: Optional[float] = None):
+        self.last_seen[contract_id] = time.time() if now is None else now
+        if subscription_id:
+            self.subscription_ids[contract_id] = str(subscription_id)
+
+    def finish(self, contract_id: int, now: Optional[float] = None) -> Optional[str]:
+        """Contrato terminou (expirado/vendido). Retorna o id da assinatura a esquecer na Deriv (uma vez)."""
+        if contract_id in self.finished_at:
+            return None
+        self.finished_at[contract_id] = time.time() if now is None else now
+        self.stats["finished"] += 1
+        self.subscribed.pop(contract_id, None)
+        sub_id = self.subscription_ids.pop(contract_id, None)
+        if sub_id:
+            self.stats["forgets"] += 1
+        return sub_id
+
+    def on_disconnect(self):
+        """Assinaturas morrem com o socket: ids antigos não servem mais para forget e a próxima
+        ensure_contract_subscription deve reassinar."""
+        self.subscribed.clear()
+        self.subscription_ids.clear()
+
+    def drop_queue_if_empty(self, contract_id: int):
+        if self._queues is not None and not self._queues.get(contract_id, True):
+            self._queues.pop(contract_id, None)
+
+    # ---------------- eviction ----------------
+
+    def is_live(self, contract_id: int) -> bool:
+        return contract_id in self.last_seen and contract_id not in self.finished_at
+
+    def is_settled(self, contract_id: int) -> bool:
+        """Contrato finalizado cujo estado já foi despejado (resultado final já processado)."""
+        return contract_id in self.tombstones
+
+    def evict(self, contract_id: int):
+        finished = self.finished_at.get(contract_id)
+        if finished is not None:
+            self.tombstones.pop(contract_id, None)
+            self.tombstones[contract_id] = finished
+            while len(self.tombstones) > self.max_tombstones:
+                self.tombstones.popitem(last=False)
+        for mapping in self._maps.values():
+            mapping.pop(contract_id, None)
+        self.drop_queue_if_empty(contract_id)
+        self.last_seen.pop(contract_id, None)
+        self.finished_at.pop(contract_id, None)
+
+    def sweep(self, now: Optional[float] = None, force: bool = False) -> List[str]:
+        """Despeja contratos finalizados há mais de grace_sec e os ociosos há mais de idle_ttl_sec.
+        Retorna ids de assinatura de contratos despejados por inatividade (para forget na Deriv)."""
+        now = time.time() if now is None else now
+        if not force and now - self._last_sweep < self.sweep_interval_sec:
+            return []
+        self._last_sweep = now
+        self.stats["sweeps"] += 1
+        # ids que só existem em mapas anexados (ex.: predição avulsa no MLStopLoss) começam a contar agora
+        for mapping in self._maps.values():
+            for cid in list(mapping):
+                self.last_seen.setdefault(cid, now)
+        if self._queues is not None:
+            for cid in [c for c, qs in self._queues.items() if not qs]:
+                self._queues.pop(cid, None)
+        forgets: List[str] = []
+        for cid, t in list(self.finished_at.items()):
+            if now - t >= self.grace_sec:
+                self.evict(cid)
+                self.stats["evicted_finished"] += 1
+        for cid, t in list(self.last_seen.items()):
+            if cid not in self.finished_at and now - t >= self.idle_ttl_sec:
+                if self._queues is not None and self._queues.get(cid):
+                    continue  # cliente WS ainda acompanhando
+                sub_id = self.subscription_ids.get(cid)
+                if sub_id:
+                    forgets.append(sub_id)
+                    self.stats["forgets"] += 1
+                self.evict(cid)
+                self.stats["evicted_idle"] += 1
+        if forgets:
+            logger.info(f"ContractLifecycle: {len(forgets)} assinaturas ociosas esquecidas")
+        return forgets
+
+    # ---------------- metrics ----------------
+
+    @staticmethod
+    def _approx_bytes(mapping: Dict[int, Any]) -> int:
+        total = sys.getsizeof(mapping)
+        for k, v in mapping.items():
+            total += sys.getsizeof(k) + sys.getsizeof(v)
+            if isinstance(v, dict):
+                total += sum(sys.getsizeof(x) for x in v.values())
+            elif isinstance(v, (list, tuple)):
+                total += sum(sys.getsizeof(x) for x in v)
+        return total
+
+    def snapshot(self) -> Dict[str, Any]:
+        maps = dict(self._maps)
+        if self._queues is not None:
+            maps["contract_queues"] = self._queues
+        sizes = {name: len(m) for name, m in maps.items()}
+        footprint = {name: self._approx_bytes(m) for name, m in maps.items()}
+        return {
+            "live_contracts": sum(1 for cid in self.last_seen if cid not in self.finished_at),
+            "finished_pending_eviction": len(self.finished_at),
+            "tombstones": len(self.tombstones),
+            "tracked_contracts": len(self.last_seen),
+            "map_sizes": sizes,
+            "approx_bytes": footprint,
+            "approx_bytes_total": sum(footprint.values()),
+            "grace_sec": self.grace_sec,
+            "idle_ttl_sec": self.idle_ttl_sec,
+            "stats": dict(self.stats),
+        }
@@ -1,11 +1,16 @@
 from __future__ import annotations
+import dataclasses
 import json
+import logging
+import threading
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional
 import pandas as pd
-from strategies import StrategyContext
+from strategies import StrategyContext, CandleFeatures
 from strategies import registry as strat_registry
 
+logger = logging.getLogger(__name__)
+
 CONFIG_DIR = Path(__file__).parent / "config"
 CONFIG_DIR.mkdir(exist_ok=True)
 CONFIG_PATH = CONFIG_DIR / "config.json"
@@ -36,21 +41,98 @@ def save_config(cfg: Dict[str, Any]):
     CONFIG_PATH.write_text(json.dumps(cfg, indent=2))
 
 
+def config_mtime() -> Optional[int]:
+    try:
+        return CONFIG_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
 class WeightedVotingDecisionEngine:
+    """Votação ponderada das estratégias do registry.
+
+    Instâncias são longevas: as estratégias são construídas uma vez (o River não é mais deserializado
+    por decisão), os indicadores do candle atual ficam num CandleFeatures compartilhado entre as
+    estratégias e entre chamadas para o mesmo candle, e o config.json só é relido quando o mtime muda
+    (apenas quando o engine foi criado sem config explícito).
+    """
+
     def __init__(self, config: Dict[str, Any] | None = None):
-        self.config = config or load_config()
+        self._watch_config = config is None
+        self._apply_config(config or load_config())
+        self._config_mtime = config_mtime() if self._watch_config else None
+        self.strategies: Dict[str, Any] = {}
+        self.strategy_errors: Dict[str, str] = {}
+        for name, cls in strat_registry.REGISTRY.items():
+            try:
+                self.strategies[name] = cls()
+            except Exception as e:
+                self.strategy_errors[name] = str(e)
+                logger.warning(f"DecisionEngine: estratégia {name} indisponível: {e}")
+        self._features: Optional[CandleFeatures] = None
+        self.stats = {"evaluations": 0, "feature_hits": 0, "config_reloads": 0}
+
+    def _apply_config(self, config: Dict[str, Any]):
+        self.config = config
         self.weights: Dict[str, float] = self.config.get("weights", {})
         self.threshold: float = float(self.config.get("decision_threshold", 0.55))
         self.min_agree: int = int(self.config.get("min_strategies_agree", 1))
 
-    def evaluate(self, df: pd.DataFrame, ctx: StrategyContext) -> Dict[str, Any]:
+    def reload_config_if_changed(self) -> bool:
+        if not self._watch_config:
+            return False
+        mtime = config_mtime()
+        if mtime == self._config_mtime:
+            return False
+        self._config_mtime = mtime
+        self._apply_config(load_config())
+        self.stats["config_reloads"] += 1
+        return True
+
+    def features_for(self, df: pd.DataFrame) -> CandleFeatures:
+        """CandleFeatures do candle atual; reaproveitado enquanto o DataFrame terminar no mesmo candle."""
+        feats = self._features
+        if feats is not None and (feats.df is df or feats.key == CandleFeatures.key_of(df)):
+            self.stats["feature_hits"] += 1
+            return feats
+        feats = CandleFeatures(df)
+        self._features = feats
+        return feats
+
+    def evaluate(self, df: pd.DataFrame, ctx: StrategyContext | None = None) -> Dict[str, Any]:
+        self.reload_config_if_changed()
+        self.stats["evaluations"] += 1
+        ctx = dataclasses.replace(ctx or StrategyContext(), features=self.features_for(df))
+        return self._vote(lambda strat: strat.decide(df, ctx))
+
+    # ---------------- streaming (backtest) ----------------
+
+    def start_stream(self, df: pd.DataFrame):
+        """Prepara um backtest em streaming: features calculadas uma vez sobre o frame inteiro.
+        Depois, step(i) equivale a evaluate(df.iloc[:i + 1]) em O(1) por barra."""
+        self.reload_config_if_changed()
+        features = CandleFeatures(df)
+        for strat in self.strategies.values():
+            strat.start_stream(df, features)
+
+    def step(self, bar: int, ctx: StrategyContext | None = None) -> Dict[str, Any]:
+        self.stats["evaluations"] += 1
+        ctx = dataclasses.replace(ctx or StrategyContext(), features=None)
+        for strat in self.strategies.values():
+            strat.update(bar)
+        return self._vote(lambda strat: strat.decide_current(ctx))
+
+    def _vote(self, decide: Callable[[Any], Any]) -> Dict[str, Any]:
         details: List[Dict[str, Any]] = []
         votes: Dict[str, float] = {"RISE": 0.0, "FALL": 0.0}
         active_strats = []
-        for name, cls in strat_registry.REGISTRY.items():
+        for name in strat_registry.REGISTRY:
+            strat = self.strategies.get(name)
+            if strat is None:
+                details.append({"strategy": name, "error": self.strategy_errors.get(name, "indisponível")})
+                continue
             try:
-                strat = cls()
-                d = strat.decide(df, ctx)
+                d = decide(strat)
                 details.append({"strategy": name, "decision": d.__dict__})
                 w = float(self.weights.get(name, 0.0))
                 if d.signal in ("RISE", "FALL"):
@@ -72,12 +154,27 @@ class WeightedVotingDecisionEngine:
         return {"decision": side, "score": score, "votes": votes, "details": details, "used_strategies": active_strats}
 
 
+_engine: Optional[WeightedVotingDecisionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> WeightedVotingDecisionEngine:
+    """Engine compartilhado do processo (config.json observado por mtime)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = WeightedVotingDecisionEngine()
+    return _engine
+
+
 def decide_trade(df: pd.DataFrame, ctx: StrategyContext, config: Dict[str, Any] | None = None) -> Dict[str, Any]:
     """Convenience function to decide a trade using the weighted voting engine.
     Returns a dict with keys: side (RISE/FALL/None), reason, and meta (full engine output).
+    Without an explicit config it uses the shared long-lived engine (see get_engine).
     """
     try:
-        engine = WeightedVotingDecisionEngine(config or load_config())
+        engine = WeightedVotingDecisionEngine(config) if config else get_engine()
         res = engine.evaluate(df, ctx)
         decision = res.get("decision")
         if decision in ("RISE", "FALL"):
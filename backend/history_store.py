@@ -0,0 +1,234 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Histórico de candles baixado da Deriv, persistido por (symbol, granularity) em formato colunar:
+# epoch.npy (int64), values.npy (open/high/low/close x linhas, float64) e meta.json com as faixas já cobertas
+# (lista de [start, end] disjuntas). O download pagina ticks_history para trás por número de candles (mercados
+# que fecham, como frx*, têm buracos no tempo), sob rate limit, e para assim que há `count` candles; trechos já
+# cobertos vêm do store. Leitura e escrita do store rodam fora do event loop (asyncio.to_thread).
+
+HISTORY_DIR = Path(os.environ.get("HISTORY_STORE_DIR", str(Path(__file__).parent / "backtests" / "history")))
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "5000"))  # limite da Deriv por ticks_history
+HISTORY_MAX_CONCURRENCY = int(os.environ.get("HISTORY_MAX_CONCURRENCY", "4"))
+HISTORY_RATE_PER_SEC = float(os.environ.get("HISTORY_RATE_PER_SEC", "4"))
+
+COLUMNS = ("open", "high", "low", "close")
+
+# fetch(symbol, granularity, start_epoch, end_epoch, count) -> candles da Deriv ({"epoch", "open", ...});
+# start None = sem limite inferior (os últimos `count` candles até end_epoch)
+FetchPage = Callable[[str, int, Optional[int], int, int], Awaitable[List[Dict[str, Any]]]]
+
+Range = Tuple[int, int]
+
+
+def merge_ranges(ranges: List[Range], granularity: int) -> List[Range]:
+    """Une faixas sobrepostas ou contíguas (fim + granularity >= início da próxima)."""
+    out: List[List[int]] = []
+    for start, end in sorted((int(a), int(b)) for a, b in ranges):
+        if out and start <= out[-1][1] + granularity:
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return [(a, b) for a, b in out]
+
+
+class CandleHistoryStore:
+    """Armazenamento colunar por (symbol, granularity). Arrays são gravados antes do meta (tmp + os.replace),
+    então um meta válido sempre aponta para arrays completos; leituras são memory-mapped."""
+
+    def __init__(self, root: Path = HISTORY_DIR):
+        self.root = Path(root)
+
+    def _files(self, symbol: str, granularity: int) -> Tuple[Path, Path, Path]:
+        d = self.root / f"{symbol}_{int(granularity)}"
+        return d / "meta.json", d / "epoch.npy", d / "values.npy"
+
+    def load(self, symbol: str, granularity: int) -> Optional[Tuple[Dict[str, Any], np.ndarray, np.ndarray]]:
+        meta_path, epoch_path, values_path = self._files(symbol, granularity)
+        try:
+            meta = json.loads(meta_path.read_text())
+            epochs = np.load(epoch_path, mmap_mode="r")
+            values = np.load(values_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(epochs) != meta.get("rows") or values.shape != (len(COLUMNS), len(epochs)):
+            logger.warning(f"Histórico {symbol}/{granularity} inconsistente; será baixado de novo")
+            return None
+        return meta, epochs, values
+
+    @staticmethod
+    def _meta_ranges(meta: Dict[str, Any]) -> List[Range]:
+        if "ranges" in meta:
+            return [(int(a), int(b)) for a, b in meta["ranges"]]
+        # meta antigo: uma única faixa contínua
+        return [(int(meta["covered_start"]), int(meta["covered_end"]))]
+
+    def coverage(self, symbol: str, granularity: int) -> Optional[List[Range]]:
+        loaded = self.load(symbol, granularity)
+        if loaded is None:
+            return None
+        return self._meta_ranges(loaded[0])
+
+    def merge(self, symbol: str, granularity: int, candles: List[Dict[str, Any]], covered: List[Range]) -> int:
+        """Incorpora candles novos (prevalecem sobre os gravados no mesmo epoch) e as faixas baixadas.
+        Retorna linhas adicionadas."""
+        loaded = self.load(symbol, granularity)
+        new_epochs = np.fromiter((int(c["epoch"]) for c in candles), dtype=np.int64, count=len(candles))
+        new_values = np.array([[float(c[k]) for c in candles] for k in COLUMNS], dtype=np.float64).reshape(len(COLUMNS), len(candles))
+        before = 0
+        ranges = list(covered)
+        if loaded is not None:
+            meta, epochs, values = loaded
+            before = len(epochs)
+            ranges += self._meta_ranges(meta)
+            # novos primeiro: np.unique fica com a primeira ocorrência de cada epoch
+            new_epochs = np.concatenate([new_epochs, np.asarray(epochs)])
+            new_values = np.concatenate([new_values, np.asarray(values)], axis=1)
+        epochs, first = np.unique(new_epochs, return_index=True)
+        values = np.ascontiguousarray(new_values[:, first])
+        ranges = merge_ranges(ranges, int(granularity))
+        meta_path, epoch_path, values_path = self._files(symbol, granularity)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        for path, arr in ((epoch_path, epochs), (values_path, values)):
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+        tmp = meta_path.with_name(meta_path.name + ".tmp")
+        tmp.write_text(json.dumps({"symbol": symbol, "granularity": int(granularity), "rows": int(len(epochs)),
+                                   "covered_start": ranges[0][0], "covered_end": ranges[-1][1],
+                                   "ranges": [list(r) for r in ranges], "updated_at": int(time.time())}))
+        os.replace(tmp, meta_path)
+        return int(len(epochs)) - before
+
+    def tail(self, symbol: str, granularity: int, count: int, end_epoch: int) -> List[Dict[str, Any]]:
+        """Últimos `count` candles com epoch <= end_epoch (mesmo formato do CandleStore)."""
+        loaded = self.load(symbol, granularity)
+        if loaded is None:
+            return []
+        _, epochs, values = loaded
+        hi = int(np.searchsorted(epochs, end_epoch, side="right"))
+        lo = max(0, hi - int(count))
+        cols = [values[i, lo:hi].tolist() for i in range(len(COLUMNS))]
+        return [{"epoch": e, "open": o, "high": h, "low": lw, "close": c}
+                for e, o, h, lw, c in zip(epochs[lo:hi].tolist(), *cols)]
+
+
+class RateLimiter:
+    """Espaça as requisições em no máximo `rate_per_sec` por segundo (compartilhado entre downloads)."""
+
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HistoryDownloader:
+    """Serviço de histórico: garante no store os últimos `count` candles fechados e os devolve. Concorrência e
+    rate limit valem entre séries; dentro de uma série as páginas são sequenciais (cada uma parte da anterior)."""
+
+    def __init__(self, fetch: FetchPage, store: Optional[CandleHistoryStore] = None, page_size: int = HISTORY_PAGE_SIZE,
+                 max_concurrency: int = HISTORY_MAX_CONCURRENCY, rate_per_sec: float = HISTORY_RATE_PER_SEC):
+        self.fetch = fetch
+        self.store = store or CandleHistoryStore()
+        self.page_size = max(1, int(page_size))
+        self._sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+        self._limiter = RateLimiter(rate_per_sec)
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self.stats: Dict[str, int] = {"requests": 0, "pages": 0, "candles_downloaded": 0, "store_hits": 0}
+
+    async def _page(self, symbol: str, granularity: int, start: Optional[int], end: int) -> List[Dict[str, Any]]:
+        async with self._sem:
+            await self._limiter.acquire()
+            candles = await self.fetch(symbol, granularity, start, end, self.page_size)
+        self.stats["pages"] += 1
+        self.stats["candles_downloaded"] += len(candles)
+        return [c for c in candles if int(c["epoch"]) <= end]
+
+    async def _download(self, symbol: str, g: int, count: int, last_closed: int, cov: List[Range],
+                        epochs: np.ndarray) -> Tuple[List[Dict[str, Any]], List[Range]]:
+        """Anda para trás a partir de last_closed até juntar `count` candles (store + páginas novas). Devolve os
+        candles baixados e as faixas que eles cobrem (de epoch de fato recebido até o fim pedido da página)."""
+        candles: List[Dict[str, Any]] = []
+        ranges: List[Range] = []
+        cursor, have = last_closed, 0
+        while have < count:
+            inside = next((a for a, b in cov if a <= cursor <= b), None)
+            if inside is not None:
+                have += int(np.searchsorted(epochs, cursor, side="right") - np.searchsorted(epochs, inside, side="left"))
+                cursor = inside - g
+                continue
+            below = max((b for a, b in cov if b < cursor), default=None)
+            if below is not None:
+                # faixa já coberta abaixo: janela de tempo limitada a page_size candles (nunca truncada pelo
+                # count), então mesmo vazia (mercado fechado) ela fica coberta
+                start = max(below + g, cursor - (self.page_size - 1) * g)
+                page = await self._page(symbol, g, start, cursor)
+                candles += page
+                ranges.append((start, cursor))
+                have += len(page)
+                cursor = start - g
+                continue
+            page = await self._page(symbol, g, None, cursor)
+            if not page:
+                break  # início da série
+            oldest = min(int(c["epoch"]) for c in page)
+            candles += page
+            ranges.append((oldest, cursor))
+            have += len(page)
+            cursor = oldest - g
+        return candles, ranges
+
+    async def get(self, symbol: str, granularity: int, count: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        g = int(granularity)
+        now = time.time() if now is None else now
+        last_closed = (int(now) // g) * g - g
+        self.stats["requests"] += 1
+        lock = self._locks.setdefault((symbol, g), asyncio.Lock())
+        async with lock:
+            loaded = await asyncio.to_thread(self.store.load, symbol, g)
+            cov = self.store._meta_ranges(loaded[0]) if loaded is not None else []
+            epochs = loaded[1] if loaded is not None else np.empty(0, dtype=np.int64)
+            try:
+                candles, ranges = await self._download(symbol, g, int(count), last_closed, cov, epochs)
+            except Exception as e:
+                if loaded is None:
+                    raise
+                # sem conexão/limite da Deriv: segue com o que já está no store
+                logger.warning(f"Histórico {symbol}/{g}s: download falhou ({getattr(e, 'detail', e)}); usando store local")
+                return await asyncio.to_thread(self.store.tail, symbol, g, count, last_closed)
+            if ranges:
+                added = await asyncio.to_thread(self.store.merge, symbol, g, candles, ranges)
+                logger.info(f"Histórico {symbol}/{g}s: {added} candles novos em {len(ranges)} página(s)")
+            else:
+                self.stats["store_hits"] += 1
+            return await asyncio.to_thread(self.store.tail, symbol, g, count, last_closed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        series = []
+        if self.store.root.exists():
+            for d in sorted(self.store.root.iterdir()):
+                try:
+                    meta = json.loads((d / "meta.json").read_text())
+                except (OSError, ValueError):
+                    continue
+                series.append({k: meta.get(k) for k in ("symbol", "granularity", "rows", "covered_start", "covered_end", "ranges", "updated_at")})
+        return {**self.stats, "series": series, "root": str(self.store.root)}
@@ -0,0 +1,288 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+# Streaming (O(1) per candle) versions of the ml_utils indicators used by server.py.
+# Semantics mirror ml_utils.rsi / macd / bollinger / adx / sma / atr so that the last values
+# match the pandas implementations used by the IND_* wrappers.
+# Every primitive supports push(x) (new candle) and revise(x) (replace the last candle),
+# which lets the forming candle of the CandleStore be updated tick by tick.
+
+
+class _Ewm:
+    """EWM with adjust=False (pandas), seeded with the first observation."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.prev: Optional[float] = None
+        self.value: Optional[float] = None
+
+    def _apply(self, base: Optional[float], x: float) -> float:
+        return x if base is None else self.alpha * x + (1.0 - self.alpha) * base
+
+    def push(self, x: float) -> float:
+        self.prev = self.value
+        self.value = self._apply(self.prev, x)
+        return self.value
+
+    def revise(self, x: float) -> float:
+        self.value = self._apply(self.prev, x)
+        return self.value
+
+
+class _RollingWindow:
+    """Fixed window with running sum and sum of squares (for mean/std).
+    Values are shifted by the first observation to limit cancellation and the sums
+    are recomputed exactly every `period` pushes (amortized O(1)).
+    None values are allowed; the window is only valid when it holds `period` valid values.
+    """
+
+    def __init__(self, period: int):
+        self.period = int(period)
+        self.values: Deque[Optional[float]] = deque()
+        self.shift: Optional[float] = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.missing = 0
+        self._since_resync = 0
+
+    def _add(self, x: Optional[float]):
+        if x is None:
+            self.missing += 1
+            return
+        if self.shift is None:
+            self.shift = x
+        d = x - self.shift
+        self.total += d
+        self.total_sq += d * d
+
+    def _remove(self, x: Optional[float]):
+        if x is None:
+            self.missing -= 1
+            return
+        d = x - self.shift
+        self.total -= d
+        self.total_sq -= d * d
+
+    def _resync(self):
+        valid = [v for v in self.values if v is not None]
+        self.shift = valid[-1] if valid else None
+        self.total = sum(v - self.shift for v in valid) if valid else 0.0
+        self.total_sq = sum((v - self.shift) ** 2 for v in valid) if valid else 0.0
+        self._since_resync = 0
+
+    def push(self, x: Optional[float]):
+        if len(self.values) == self.period:
+            self._remove(self.values.popleft())
+        self.values.append(x)
+        self._add(x)
+        self._since_resync += 1
+        if self._since_resync >= self.period:
+            self._resync()
+
+    def revise(self, x: Optional[float]):
+        if not self.values:
+            self.push(x)
+            return
+        self._remove(self.values[-1])
+        self.values[-1] = x
+        self._add(x)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.values) == self.period and self.missing == 0
+
+    def mean(self) -> Optional[float]:
+        if not self.ready:
+            return None
+        return self.shift + self.total / self.period
+
+    def std(self) -> Optional[float]:
+        """Sample standard deviation (ddof=1), like pandas rolling().std()."""
+        if not self.ready or self.period < 2:
+            return None
+        var = (self.total_sq - self.total * self.total / self.period) / (self.period - 1)
+        return max(var, 0.0) ** 0.5
+
+
+class IndicatorEngine:
+    """Stateful indicator engine for one (symbol, granularity) series.
+
+    update(high, low, close) appends a candle; revise(high, low, close) replaces the last one.
+    sync(candles) applies only the candles not seen yet (by epoch), revising the forming candle.
+    snapshot() returns the latest values; history() the last `history` snapshots.
+    """
+
+    def __init__(self, rsi_period: int = 14, macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9,
+                 bb_period: int = 20, bb_k: float = 2.0, adx_period: int = 14,
+                 sma_periods: Sequence[int] = (9, 21), history: int = 5):
+        self.rsi_period = int(rsi_period)
+        self.macd_fast = int(macd_fast)
+        self.macd_slow = int(macd_slow)
+        self.macd_signal = int(macd_signal)
+        self.bb_period = int(bb_period)
+        self.bb_k = float(bb_k)
+        self.adx_period = int(adx_period)
+        self.sma_periods = tuple(int(p) for p in sma_periods)
+        self.history_len = max(2, int(history))
+        self.reset()
+
+    def reset(self):
+        # RSI (Wilder via ewm alpha=1/period)
+        self._rsi_up = _Ewm(1.0 / self.rsi_period)
+        self._rsi_down = _Ewm(1.0 / self.rsi_period)
+        # MACD
+        self._ema_fast = _Ewm(2.0 / (self.macd_fast + 1))
+        self._ema_slow = _Ewm(2.0 / (self.macd_slow + 1))
+        self._macd_sig = _Ewm(2.0 / (self.macd_signal + 1))
+        # Bollinger / SMA
+        self._bb = _RollingWindow(self.bb_period)
+        self._sma = {p: _RollingWindow(p) for p in self.sma_periods}
+        # ADX / ATR (rolling means, like ml_utils.adx/atr)
+        self._tr = _RollingWindow(self.adx_period)
+        self._plus_dm = _RollingWindow(self.adx_period)
+        self._minus_dm = _RollingWindow(self.adx_period)
+        self._dx = _RollingWindow(self.adx_period)
+        # previous/last candle (h, l, c)
+        self._prev: Optional[tuple] = None
+        self._last: Optional[tuple] = None
+        self.count = 0
+        self.last_epoch: Optional[int] = None
+        self._history: Deque[Dict[str, Optional[float]]] = deque(maxlen=self.history_len)
+
+    # ---------------- core ----------------
+    def _directional(self, h: float, low: float, c: float):
+        prev = self._prev
+        if prev is None:
+            return h - low, 0.0, 0.0
+        ph, pl, pc = prev
+        tr = max(h - low, abs(h - pc), abs(low - pc))
+        up = h - ph
+        down = pl - low
+        plus = up if (up > down and up > 0) else 0.0
+        minus = down if (down > plus and down > 0) else 0.0
+        return tr, plus, minus
+
+    def _dx_value(self) -> Optional[float]:
+        tr = self._tr.mean()
+        plus = self._plus_dm.mean()
+        minus = self._minus_dm.mean()
+        if tr is None or plus is None or minus is None or tr == 0:
+            return None
+        pdi = 100.0 * plus / tr
+        mdi = 100.0 * minus / tr
+        if (pdi + mdi) == 0:
+            return None
+        return 100.0 * abs(pdi - mdi) / (pdi + mdi)
+
+    def _apply(self, h: float, low: float, c: float, revise: bool):
+        op = "revise" if revise else "push"
+        if not revise:
+            self._prev = self._last
+        self._last = (h, low, c)
+        # RSI: delta only exists from the second candle on
+        if self._prev is not None:
+            delta = c - self._prev[2]
+            getattr(self._rsi_up, op)(max(delta, 0.0))
+            getattr(self._rsi_down, op)(max(-delta, 0.0))
+        # MACD
+        line = getattr(self._ema_fast, op)(c) - getattr(self._ema_slow, op)(c)
+        getattr(self._macd_sig, op)(line)
+        # Bollinger / SMA
+        getattr(self._bb, op)(c)
+        for w in self._sma.values():
+            getattr(w, op)(c)
+        # ADX / ATR
+        tr, plus, minus = self._directional(h, low, c)
+        getattr(self._tr, op)(tr)
+        getattr(self._plus_dm, op)(plus)
+        getattr(self._minus_dm, op)(minus)
+        getattr(self._dx, op)(self._dx_value())
+        snap = self._compute_snapshot()
+        if revise and self._history:
+            self._history[-1] = snap
+        else:
+            self._history.append(snap)
+
+    def update(self, high: float, low: float, close: float, epoch: Optional[int] = None):
+        self._apply(float(high), float(low), float(close), revise=False)
+        self.count += 1
+        self.last_epoch = epoch
+
+    def revise(self, high: float, low: float, close: float):
+        if self._last is None:
+            self.update(high, low, close)
+            return
+        self._apply(float(high), float(low), float(close), revise=True)
+
+    # ---------------- candles sync ----------------
+    @staticmethod
+    def _epoch(c: Dict[str, Any]) -> Optional[int]:
+        ep = c.get("epoch", c.get("timestamp"))
+        try:
+            return int(ep) if ep is not None else None
+        except Exception:
+            return None
+
+    def sync(self, candles: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+        """Bring the engine up to date with a candle list (oldest -> newest).
+        Only new candles are applied (O(k) for k new candles); the last known candle is revised
+        because it may have been the forming one. Gaps or missing epochs trigger a full replay.
+        """
+        if not candles:
+            return self.snapshot()
+        first_ep = self._epoch(candles[0])
+        last_ep = self._epoch(candles[-1])
+        start: Optional[int] = None
+        if self.last_epoch is not None and first_ep is not None and last_ep is not None \
+                and first_ep <= self.last_epoch <= last_ep:
+            i = len(candles) - 1
+            while i >= 0 and (self._epoch(candles[i]) or 0) > self.last_epoch:
+                i -= 1
+            if i >= 0 and self._epoch(candles[i]) == self.last_epoch:
+                start = i
+        if start is None:
+            self.reset()
+            for c in candles:
+                self.update(c["high"], c["low"], c["close"], self._epoch(c))
+            return self.snapshot()
+        c = candles[start]
+        self.revise(c["high"], c["low"], c["close"])
+        for c in candles[start + 1:]:
+            self.update(c["high"], c["low"], c["close"], self._epoch(c))
+        return self.snapshot()
+
+    # ---------------- outputs ----------------
+    def _compute_snapshot(self) -> Dict[str, Optional[float]]:
+        rsi = None
+        if self._rsi_up.value is not None and self._rsi_down.value is not None:
+            rs = self._rsi_up.value / (self._rsi_down.value + 1e-12)
+            rsi = 100.0 - (100.0 / (1.0 + rs))
+        macd_line = None
+        if self._ema_fast.value is not None and self._ema_slow.value is not None:
+            macd_line = self._ema_fast.value - self._ema_slow.value
+        macd_sig = self._macd_sig.value
+        bb_mid = self._bb.mean()
+        bb_sd = self._bb.std()
+        dx_mean = self._dx.mean()
+        snap: Dict[str, Optional[float]] = {
+            "close": self._last[2] if self._last else None,
+            "rsi": rsi,
+            "macd": macd_line,
+            "macd_signal": macd_sig,
+            "macd_hist": (macd_line - macd_sig) if (macd_line is not None and macd_sig is not None) else None,
+            "bb_mid": bb_mid,
+            "bb_upper": (bb_mid + self.bb_k * bb_sd) if (bb_mid is not None and bb_sd is not None) else None,
+            "bb_lower": (bb_mid - self.bb_k * bb_sd) if (bb_mid is not None and bb_sd is not None) else None,
+            "atr": self._tr.mean(),
+            "adx": dx_mean,
+        }
+        for p, w in self._sma.items():
+            snap[f"sma_{p}"] = w.mean()
+        return snap
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        return dict(self._history[-1]) if self._history else {}
+
+    def history(self) -> List[Dict[str, Optional[float]]]:
+        return list(self._history)
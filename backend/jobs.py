@@ -0,0 +1,266 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Heavy jobs (LightGBM/SHAP/transformer, walk-forward, CSV training, backtests) run in a
+# ProcessPoolExecutor so they never share the event loop that drives DerivWS and live trading.
+# Task functions below must be top-level (picklable) and only receive plain data (lists/DataFrames).
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", "200"))
+
+
+class JobCancelled(RuntimeError):
+    pass
+
+
+class JobManager:
+    """Registry of background jobs: submit -> job_id, status/result lookup and cancellation.
+
+    Pending jobs are cancelled for real; a job that is already running in a worker cannot be
+    interrupted by ProcessPoolExecutor, so it is marked cancelled and its result is discarded.
+    Tasks therefore never publish side effects themselves: they return data (or write to a staging
+    path) and the job's on_result persists/promotes it, which is skipped for cancelled jobs.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_jobs: int = JOB_HISTORY):
+        self.max_workers = max(1, int(max_workers))
+        self.max_jobs = max(10, int(max_jobs))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None or getattr(self._executor, "_broken", False):
+            # spawn: workers never inherit the event loop / websocket state of the server process
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _evict(self):
+        while len(self.jobs) > self.max_jobs:
+            victim = next((k for k, j in self.jobs.items() if j["status"] in ("done", "error", "cancelled")), None)
+            if victim is None:
+                break
+            self.jobs.pop(victim, None)
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args: Any,
+               on_result: Optional[Callable[[Any], Any]] = None,
+               meta: Optional[Dict[str, Any]] = None) -> str:
+        """Agenda fn(*args) no pool de processos. on_result roda no event loop (processo principal)
+        e transforma o retorno do worker no resultado público do job."""
+        loop = asyncio.get_running_loop()
+        try:
+            cf = self._pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self._executor = None
+            cf = self._pool().submit(fn, *args)
+        job_id = uuid.uuid4().hex
+        job: Dict[str, Any] = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "meta": meta or {},
+            "result": None,
+            "error": None,
+            "_future": cf,
+            "_done": loop.create_future(),
+        }
+        self.jobs[job_id] = job
+        self._evict()
+
+        def _finish(f: Future):
+            try:
+                loop.call_soon_threadsafe(self._complete, job_id, f, on_result)
+            except RuntimeError:
+                pass  # event loop já encerrado (shutdown)
+
+        cf.add_done_callback(_finish)
+        return job_id
+
+    def _complete(self, job_id: str, f: Future, on_result: Optional[Callable[[Any], Any]]):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job["status"] != "cancelled":
+            job["finished_at"] = time.time()
+            if f.cancelled():
+                job["status"] = "cancelled"
+            else:
+                exc = f.exception()
+                if exc is not None:
+                    job["status"] = "error"
+                    job["error"] = str(exc) or exc.__class__.__name__
+                    logger.warning(f"Job {job['kind']} {job_id} falhou: {job['error']}")
+                else:
+                    try:
+                        res = f.result()
+                        job["result"] = on_result(res) if on_result else res
+                        job["status"] = "done"
+                    except Exception as e:
+                        job["status"] = "error"
+                        job["error"] = str(e)
+                        logger.warning(f"Job {job['kind']} {job_id} falhou ao finalizar: {e}")
+        done = job["_done"]
+        if not done.done():
+            done.set_result(None)
+
+    def _status(self, job: Dict[str, Any]) -> str:
+        if job["status"] == "queued" and job["_future"].running():
+            job["status"] = "running"
+            job["started_at"] = time.time()
+        return job["status"]
+
+    def info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        status = self._status(job)
+        end = job["finished_at"] or time.time()
+        return {
+            "job_id": job_id,
+            "kind": job["kind"],
+            "status": status,
+            "created_at": job["created_at"],
+            "started_at": job.get("started_at"),
+            "finished_at": job["finished_at"],
+            "elapsed_sec": round(end - job["created_at"], 3),
+            "meta": job["meta"],
+            "error": job["error"],
+        }
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        ids = list(self.jobs.keys())[-max(1, int(limit)):]
+        return [self.info(j) for j in reversed(ids)]
+
+    def result(self, job_id: str) -> Any:
+        job = self.jobs.get(job_id)
+        return None if job is None else job["result"]
+
+    async def wait(self, job_id: str) -> Any:
+        job = self.jobs[job_id]
+        await asyncio.shield(job["_done"])
+        if job["status"] == "cancelled":
+            raise JobCancelled(f"Job {job_id} cancelado")
+        if job["status"] == "error":
+            raise RuntimeError(job["error"])
+        return job["result"]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        status = self._status(job)
+        if status in ("done", "error", "cancelled"):
+            return {"job_id": job_id, "cancelled": False, "status": status}
+        was_running = not job["_future"].cancel()
+        job["status"] = "cancelled"
+        job["finished_at"] = time.time()
+        if not job["_done"].done():
+            job["_done"].set_result(None)
+        return {"job_id": job_id, "cancelled": True, "was_running": was_running, "status": "cancelled"}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# ---------------- task functions (executadas nos workers) ----------------
+
+def ml_engine_train_task(df, seq_len: int, horizon: int, use_transformer: bool, epochs: int, batch_size: int,
+                         calibrate: str, staging_path: str) -> Dict[str, Any]:
+    import ml_engine
+    config = ml_engine.MLConfig()
+    config.seq_len = seq_len
+    trained_models = ml_engine.fit_models_from_candles(
+        df, config, horizon=horizon,
+        use_transformer=bool(use_transformer),
+        transformer_epochs=int(max(1, min(epochs, 10))),
+        transformer_batch=int(max(16, min(batch_size, 256))),
+        calibrate=str(calibrate or "sigmoid").lower()
+    )
+    # grava no staging; on_result promove para o caminho definitivo (job cancelado não publica nada)
+    ml_engine.save_trained_models(trained_models, staging_path)
+    test_pred = ml_engine.predict_from_models(df, trained_models, config)
+    return {"models": trained_models, "test_pred": test_pred, "seq_len": config.seq_len, "candles_used": len(df)}
+
+
+def ml_engine_backtest_task(df, seq_len: int, train_window_sec: int, test_window_sec: int, step_sec: int,
+                            horizon: int = 3, use_transformer: bool = True, epochs: int = 6, batch_size: int = 64,
+                            calibrate: str = "sigmoid", compute_shap: bool = False, fold_workers: int = 1) -> Dict[str, Any]:
+    import ml_engine
+    config = ml_engine.MLConfig()
+    config.seq_len = seq_len
+    return ml_engine.walk_forward_backtest(
+        df,
+        train_window_sec=train_window_sec,
+        test_window_sec=test_window_sec,
+        step_sec=step_sec,
+        cfg=config,
+        horizon=horizon,
+        use_transformer=bool(use_transformer),
+        transformer_epochs=int(max(1, min(epochs, 10))),
+        transformer_batch=int(max(16, min(batch_size, 256))),
+        calibrate=str(calibrate or "none").lower(),
+        compute_shap=bool(compute_shap),
+        n_jobs=int(max(1, fold_workers)),
+    )
+
+
+def river_train_csv_task(csv_text: str, model_blob: bytes) -> Dict[str, Any]:
+    # o modelo chega serializado no momento do submit (snapshot consistente do singleton)
+    import io
+    import pickle
+    import pandas as pd
+    import river_online_model
+    df = pd.read_csv(io.StringIO(csv_text))
+    model = pickle.loads(model_blob)
+    # sem gravar no disco: o on_result (processo principal) troca o singleton e agenda a persistência
+    return river_online_model.run_on_dataframe(df, model, save=False)
+
+
+def river_backtest_task(candles: List[Dict[str, Any]], thresholds: List[float]) -> List[Dict[str, Any]]:
+    import numpy as np
+    from indicator_engine import IndicatorEngine
+    from backtesting_utils import river_threshold_sweep
+    engine = IndicatorEngine()
+    n = len(candles)
+    close = np.empty(n, dtype=float)
+    adx = np.full(n, np.nan)
+    rsi = np.full(n, np.nan)
+    for i, c in enumerate(candles):
+        engine.update(c["high"], c["low"], c["close"])
+        snap = engine.snapshot()
+        close[i] = float(c["close"])
+        if snap.get("adx") is not None:
+            adx[i] = snap["adx"]
+        if snap.get("rsi") is not None:
+            rsi[i] = snap["rsi"]
+    return river_threshold_sweep(close, adx, rsi, thresholds)
+
+
+def rsi_reinforced_backtest_task(df, params) -> Dict[str, Any]:
+    from rsi_reinforced import generate_signals, backtest_signals
+    df2, signals = generate_signals(df, params)
+    metrics = backtest_signals(df2, signals, params)
+    return {"count": len(df2), "metrics": metrics}
+
+
+def rsi_reinforced_grid_task(df, params, grid: Dict[str, List[Any]], top: int) -> Dict[str, Any]:
+    from rsi_reinforced import grid_backtest
+    results = grid_backtest(df, params, grid)
+    return {"count": len(df), "combinations": len(results), "results": results[:top]}
@@ -10,6 +10,7 @@ from typing import List, Tuple, Dict, Any, Optional
 import numpy as np
 import pandas as pd
 from dataclasses import dataclass
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import accuracy_score, roc_auc_score
 from sklearn.preprocessing import StandardScaler
@@ -134,14 +135,49 @@ def multi_scale_features(candles: pd.DataFrame, freqs: List[int]) -> pd.DataFram
 class TimeSeriesDataset(Dataset):
     def __init__(self, X: np.ndarray, y: np.ndarray):
         assert len(X) == len(y)
-        self.X = X.astype(np.float32)
+        # X pode ser a view de sliding_window_view: converte janela a janela em vez de copiar tudo
+        self.X = X
         self.y = y.astype(np.float32)
 
     def __len__(self):
         return len(self.X)
 
     def __getitem__(self, idx):
-        return self.X[idx], self.y[idx]
+        return np.asarray(self.X[idx], dtype=np.float32), self.y[idx]
+
+# linhas extras de histórico para as features rolantes da inferência (maior janela = 60; EMA21 converge)
+FEATURE_WARMUP = 256
+
+def window_aggregates(arr: np.ndarray, seq_len: int) -> np.ndarray:
+    """
+    Agregados por janela (mean, std, last) para todas as janelas deslizantes de `seq_len` linhas,
+    via somas cumulativas (O(n x features), sem materializar n x seq_len x features).
+    As colunas são centralizadas antes da soma para reduzir cancelamento numérico no std.
+    """
+    n, n_feat = arr.shape
+    n_win = n - seq_len + 1
+    if n_win <= 0:
+        return np.empty((0, 3 * n_feat))
+    center = arr.mean(axis=0)
+    z = arr - center
+    cs = np.vstack([np.zeros((1, n_feat)), np.cumsum(z, axis=0)])
+    cs2 = np.vstack([np.zeros((1, n_feat)), np.cumsum(z * z, axis=0)])
+    s1 = (cs[seq_len:] - cs[:-seq_len]) / seq_len
+    s2 = (cs2[seq_len:] - cs2[:-seq_len]) / seq_len
+    mean = s1 + center
+    var = s2 - s1 * s1
+    # resíduo de arredondamento das somas cumulativas -> std 0 (janelas constantes)
+    tol = np.finfo(float).eps * np.sqrt(n) * cs2[-1] / seq_len
+    std = np.sqrt(np.where(var > tol, var, 0.0))
+    last = arr[seq_len - 1:]
+    return np.hstack([mean, std, last])
+
+def sequence_windows(arr: np.ndarray, seq_len: int) -> np.ndarray:
+    """Janelas (num_samples, seq_len, num_features) como view zero-copy (somente leitura)."""
+    n, n_feat = arr.shape
+    if n < seq_len:
+        return np.empty((0, seq_len, n_feat))
+    return sliding_window_view(arr, seq_len, axis=0).transpose(0, 2, 1)
 
 def build_supervised_dataset(candles: pd.DataFrame, seq_len: int, horizon: int = 3) -> Tuple[np.ndarray,np.ndarray]:
     """
@@ -156,27 +192,29 @@ def build_supervised_dataset(candles: pd.DataFrame, seq_len: int, horizon: int =
     df['target'] = (df['future_close'] > df['close']).astype(int)
     df.dropna(inplace=True)
     features = [c for c in df.columns if c not in ['future_close','target']]
-    arr = df[features].values
+    arr = df[features].to_numpy(dtype=float)
     targets = df['target'].values
-    # build sliding windows
-    X_seq = []
-    y_seq = []
-    for i in range(len(arr) - seq_len + 1):
-        X_seq.append(arr[i:i+seq_len])
-        y_seq.append(targets[i+seq_len-1])  # target aligned to end of window
-    X_seq = np.array(X_seq)
-    y_seq = np.array(y_seq)
-    # flattened for LGB: use only last row of each window (or aggregates)
-    # We'll use aggregates across the window: mean, std, last
-    X_lgb = []
-    for w in X_seq:
-        mean = w.mean(axis=0)
-        std = w.std(axis=0)
-        last = w[-1]
-        X_lgb.append(np.concatenate([mean, std, last]))
-    X_lgb = np.vstack(X_lgb)
+    # sliding windows (view) + target aligned to end of window
+    X_seq = sequence_windows(arr, seq_len)
+    y_seq = targets[seq_len - 1:] if len(arr) >= seq_len else targets[:0]
+    # flattened for LGB: aggregates across the window: mean, std, last
+    X_lgb = window_aggregates(arr, seq_len)
     return X_lgb, X_seq, y_seq, features
 
+def build_inference_window(candles: pd.DataFrame, seq_len: int, features: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Features apenas da janela mais recente (inclui o último candle): featuriza seq_len + FEATURE_WARMUP
+    linhas, de modo que a latência não depende do tamanho do histórico.
+    Retorna (x_lgb (1, 3F), x_seq (1, seq_len, F)); vazios se não houver candles suficientes.
+    """
+    tail = candles.iloc[-(seq_len + FEATURE_WARMUP):]
+    if len(tail) < seq_len:
+        return np.empty((0, 0)), np.empty((0, seq_len, 0))
+    df = multi_scale_features(tail.copy(), CFG.feat_freqs)
+    cols = features or list(df.columns)
+    arr = df.reindex(columns=cols).fillna(0.0).to_numpy(dtype=float)[-seq_len:]
+    return window_aggregates(arr, seq_len), arr[None, :, :]
+
 # ------------------------
 # LightGBM trainer
 # ------------------------
@@ -313,9 +351,14 @@ class TrainedModels:
     lgb_feat_dim: Optional[int] = None
     shap_top20: Optional[List[Tuple[str, float]]] = None
 
-def fit_models_from_candles(candles: pd.DataFrame, cfg: MLConfig = CFG, horizon: int = 3, use_transformer: bool = True, transformer_epochs: int = 6, transformer_batch: int = 64, calibrate: str = "sigmoid") -> TrainedModels:
-    X_lgb, X_seq, y, feat_names = None, None, None, None
+def fit_models_from_candles(candles: pd.DataFrame, cfg: MLConfig = CFG, horizon: int = 3, use_transformer: bool = True, transformer_epochs: int = 6, transformer_batch: int = 64, calibrate: str = "sigmoid", compute_shap: bool = True) -> TrainedModels:
     X_lgb, X_seq, y, features = build_supervised_dataset(candles, seq_len=cfg.seq_len, horizon=horizon)
+    return fit_models_from_dataset(X_lgb, X_seq, y, features, cfg, use_transformer=use_transformer,
+                                   transformer_epochs=transformer_epochs, transformer_batch=transformer_batch,
+                                   calibrate=calibrate, compute_shap=compute_shap)
+
+def fit_models_from_dataset(X_lgb: np.ndarray, X_seq: Optional[np.ndarray], y: np.ndarray, features: List[str], cfg: MLConfig = CFG, use_transformer: bool = True, transformer_epochs: int = 6, transformer_batch: int = 64, calibrate: str = "sigmoid", compute_shap: bool = True) -> TrainedModels:
+    """Treina o stack (LGB + calibração + SHAP + transformer) a partir de matrizes já featurizadas."""
     # standardize LGB features (improves some models)
     scaler = StandardScaler()
     X_lgb_s = scaler.fit_transform(X_lgb)
@@ -326,29 +369,32 @@ def fit_models_from_candles(candles: pd.DataFrame, cfg: MLConfig = CFG, horizon:
         try:
             from sklearn.calibration import CalibratedClassifierCV
             calibrator = CalibratedClassifierCV(lgb_model, method=calibrate, cv=3)
-            calibrator.fit(X_lgb_s, y)
+            # mesmas colunas que o predict usa (features selecionadas pelo train_lgb)
+            sel_idx = getattr(lgb_model, "selected_features_idx_", None)
+            calibrator.fit(X_lgb_s[:, sel_idx] if sel_idx is not None else X_lgb_s, y)
         except Exception as _e:
             logging.warning(f"Falha ao calibrar ({calibrate}): {_e}")
             calibrator = None
     # SHAP Top-20
     shap_top20 = None
-    try:
-        import shap
-        explainer = shap.TreeExplainer(lgb_model)
-        # usar amostra para performance
-        sample = X_lgb_s[-min(2000, len(X_lgb_s)):, :]
-        shap_values = explainer.shap_values(sample)
-        # shap_values pode ser [class0, class1] em binário
-        sv = shap_values[1] if isinstance(shap_values, list) else shap_values
-        import numpy as np
-        rel = np.mean(np.abs(sv), axis=0)
-        # nomes das features: agregadas (mean,std,last) não têm nomes, então index
-        idx_rel = np.argsort(rel)[::-1]
-        top = idx_rel[:20]
-        shap_top20 = [(f"feat_{int(i)}", float(rel[i])) for i in top]
-    except Exception as _se:
-        logging.warning(f"Falha SHAP: {_se}")
-        shap_top20 = None
+    if compute_shap:
+        try:
+            import shap
+            explainer = shap.TreeExplainer(lgb_model)
+            # usar amostra para performance
+            sample = X_lgb_s[-min(2000, len(X_lgb_s)):, :]
+            shap_values = explainer.shap_values(sample)
+            # shap_values pode ser [class0, class1] em binário
+            sv = shap_values[1] if isinstance(shap_values, list) else shap_values
+            import numpy as np
+            rel = np.mean(np.abs(sv), axis=0)
+            # nomes das features: agregadas (mean,std,last) não têm nomes, então index
+            idx_rel = np.argsort(rel)[::-1]
+            top = idx_rel[:20]
+            shap_top20 = [(f"feat_{int(i)}", float(rel[i])) for i in top]
+        except Exception as _se:
+            logging.warning(f"Falha SHAP: {_se}")
+            shap_top20 = None
     # transformer
     transformer_model = None
     if use_transformer:
@@ -372,17 +418,25 @@ def predict_from_models(candles: pd.DataFrame, tm: TrainedModels, cfg: MLConfig
     if candles.empty:
         return {"prob":0.5, "prob_lgb":0.5, "prob_trans":0.5, "conf":0.0, "direction":None}
 
-    # preparar features (take last seq_len window)
-    df = candles.copy()
-    X_lgb_full, X_seq_full, y, features = build_supervised_dataset(df, seq_len=cfg.seq_len, horizon=3)
-    if len(X_lgb_full)==0:
+    # preparar features apenas da última janela de seq_len candles
+    x_lgb, x_seq = build_inference_window(candles, cfg.seq_len, tm.features)
+    if len(x_lgb)==0:
         return {"prob":0.5, "prob_lgb":0.5, "prob_trans":0.5, "conf":0.0, "direction":None}
-    # take last sample
-    x_lgb = X_lgb_full[-1:]
-    x_seq = X_seq_full[-1:]
+    prob_lgb, prob_trans = predict_batch(x_lgb, x_seq, tm, cfg)
+    prob_lgb, prob_trans = prob_lgb[0], float(prob_trans[0])
+    # combine
+    w = cfg.ensemble_weights
+    combined = prob_lgb * w.get('lgb',0.5) + prob_trans * w.get('transformer',0.5)
+    conf = abs(combined - 0.5) * 2.0  # 0..1
+    direction = "CALL" if combined > 0.5 else "PUT"
+    return {"prob":combined, "prob_lgb":prob_lgb, "prob_trans":prob_trans, "conf":conf, "direction":direction}
+
+def predict_batch(X_lgb: np.ndarray, X_seq: Optional[np.ndarray], tm: TrainedModels, cfg: MLConfig = CFG, batch_size: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+    """Probabilidades (lgb, transformer) para várias janelas já featurizadas de uma vez."""
+    n = len(X_lgb)
     # LGB com seleção de features (se disponível) e calibrador (se disponível)
     if tm.lgb_model is not None:
-        x_lgb_s = tm.lgb_scaler.transform(x_lgb)
+        x_lgb_s = tm.lgb_scaler.transform(X_lgb)
         try:
             sel_idx = getattr(tm.lgb_model, "selected_features_idx_", None)
             if sel_idx is not None:
@@ -392,84 +446,171 @@ def predict_from_models(candles: pd.DataFrame, tm: TrainedModels, cfg: MLConfig
         except Exception:
             x_use = x_lgb_s
         if tm.lgb_calibrator is not None:
-            prob_lgb = tm.lgb_calibrator.predict_proba(x_use)[:,1][0]
+            prob_lgb = tm.lgb_calibrator.predict_proba(x_use)[:,1]
         else:
-            prob_lgb = tm.lgb_model.predict_proba(x_use)[:,1][0]
+            prob_lgb = tm.lgb_model.predict_proba(x_use)[:,1]
     else:
-        prob_lgb = 0.5
+        prob_lgb = np.full(n, 0.5)
     # transformer
-    if tm.transformer is not None:
+    if tm.transformer is not None and X_seq is not None:
         model = tm.transformer
         model.eval()
+        parts = []
         with torch.no_grad():
-            xb = torch.tensor(x_seq, dtype=torch.float32).to(cfg.device)
-            pred = model(xb).cpu().numpy().reshape(-1)
-            prob_trans = float(pred[-1])
+            for i in range(0, n, batch_size):
+                xb = torch.tensor(np.asarray(X_seq[i:i+batch_size], dtype=np.float32)).to(cfg.device)
+                parts.append(model(xb).cpu().numpy().reshape(-1))
+        prob_trans = np.concatenate(parts) if parts else np.full(n, 0.5)
     else:
-        prob_trans = 0.5
-    # combine
-    w = cfg.ensemble_weights
-    combined = prob_lgb * w.get('lgb',0.5) + prob_trans * w.get('transformer',0.5)
-    conf = abs(combined - 0.5) * 2.0  # 0..1
-    direction = "CALL" if combined > 0.5 else "PUT"
-    return {"prob":combined, "prob_lgb":prob_lgb, "prob_trans":prob_trans, "conf":conf, "direction":direction}
+        prob_trans = np.full(n, 0.5)
+    return prob_lgb, prob_trans
 
 # ------------------------
-# Walk-forward backtester (simplified)
+# Walk-forward backtester
 # ------------------------
-def walk_forward_backtest(candles: pd.DataFrame, train_window_sec: int=300, test_window_sec: int=60, step_sec: int=60, cfg: MLConfig = CFG):
+def _index_seconds(candles: pd.DataFrame) -> np.ndarray:
+    """Índice do DataFrame em segundos (DatetimeIndex -> epoch; numérico -> como está)."""
+    if isinstance(candles.index, pd.DatetimeIndex):
+        return candles.index.asi8.astype(float) / 1e9
+    return candles.index.values.astype(float)
+
+def _walk_forward_fold(fold: Dict[str, Any]) -> Dict[str, Any]:
+    """Treina e testa um fold a partir das fatias pré-computadas (top-level: roda em processo separado)."""
+    t0 = time.perf_counter()
+    cfg = fold["cfg"]
+    seq_len = cfg.seq_len
+    seq_train = sequence_windows(fold["seq_train"], seq_len) if fold["seq_train"] is not None else None
+    seq_test = sequence_windows(fold["seq_test"], seq_len) if fold["seq_test"] is not None else None
+    tm = fit_models_from_dataset(
+        fold["X_train"], seq_train, fold["y_train"], fold["features"], cfg,
+        use_transformer=fold["use_transformer"],
+        transformer_epochs=fold["transformer_epochs"],
+        transformer_batch=fold["transformer_batch"],
+        calibrate=fold["calibrate"],
+        compute_shap=fold["compute_shap"],
+    )
+    t1 = time.perf_counter()
+    prob_lgb, prob_trans = predict_batch(fold["X_test"], seq_test, tm, cfg)
+    w = cfg.ensemble_weights
+    combined = prob_lgb * w.get('lgb',0.5) + prob_trans * w.get('transformer',0.5)
+    call = combined > 0.5
+    now, future = fold["price_now"], fold["price_future"]
+    win = np.where(call, future > now, future < now)
+    payouts = np.where(win, 0.8, -1.0)
+    t2 = time.perf_counter()
+    trades = int(len(payouts))
+    wins = int(win.sum())
+    return {
+        "start": fold["start"],
+        "net": float(payouts.sum()),
+        "wins": wins,
+        "trades": trades,
+        "winrate": wins / trades if trades else None,
+        "train_samples": int(len(fold["y_train"])),
+        "fit_sec": round(t1 - t0, 4),
+        "predict_sec": round(t2 - t1, 4),
+        "elapsed_sec": round(t2 - t0, 4),
+    }
+
+def _walk_forward_folds(candles: pd.DataFrame, train_window_sec: int, test_window_sec: int, step_sec: int, cfg: MLConfig = CFG,
+                        horizon: int = 3, use_transformer: bool = True, transformer_epochs: int = 6, transformer_batch: int = 64,
+                        calibrate: str = "sigmoid", compute_shap: bool = False) -> List[Dict[str, Any]]:
+    """Featuriza a série uma vez e fatia as matrizes de cada fold (entradas de _walk_forward_fold)."""
+    seq_len = cfg.seq_len
+    feat = multi_scale_features(candles.copy(), CFG.feat_freqs)
+    features = list(feat.columns)
+    arr = feat[features].to_numpy(dtype=float)
+    close = feat['close'].to_numpy(dtype=float)
+    n = len(arr)
+    # alvo da janela que termina em t: close[t+horizon] > close[t] (válido apenas para t < n-horizon)
+    target = np.zeros(n, dtype=int)
+    if n > horizon:
+        target[:n - horizon] = (close[horizon:] > close[:-horizon]).astype(int)
+    X_lgb = window_aggregates(arr, seq_len)  # linha k = janela que termina em t = k + seq_len - 1
+
+    timestamps = _index_seconds(candles)
+    folds = []
+    start = timestamps[0] + train_window_sec if n else 0.0
+    end = timestamps[-1] if n else 0.0
+    while n and start + test_window_sec <= end:
+        tr_lo, tr_hi = np.searchsorted(timestamps, [start - train_window_sec, start], side="left")
+        te_lo, te_hi = np.searchsorted(timestamps, [start, start + test_window_sec], side="left")
+        if (tr_hi - tr_lo) < seq_len*2 or (te_hi - te_lo) < seq_len:
+            start += step_sec
+            continue
+        # treino: janelas inteiramente no treino e com alvo dentro do treino
+        a, b = tr_lo + seq_len - 1, tr_hi - horizon
+        # teste: janelas terminando em te_lo+seq_len-1.. com o futuro dentro do teste
+        c, d = te_lo + seq_len - 1, te_hi - horizon
+        if b <= a or d <= c:
+            start += step_sec
+            continue
+        folds.append({
+            "start": float(start),
+            "test_index": (c, d),
+            "cfg": cfg,
+            "features": features,
+            "X_train": X_lgb[a - seq_len + 1:b - seq_len + 1],
+            "y_train": target[a:b],
+            "seq_train": arr[a - seq_len + 1:b] if use_transformer else None,
+            "X_test": X_lgb[c - seq_len + 1:d - seq_len + 1],
+            "seq_test": arr[c - seq_len + 1:d] if use_transformer else None,
+            "price_now": close[c:d],
+            "price_future": close[c + horizon:d + horizon],
+            "use_transformer": use_transformer,
+            "transformer_epochs": transformer_epochs,
+            "transformer_batch": transformer_batch,
+            "calibrate": calibrate,
+            "compute_shap": compute_shap,
+        })
+        start += step_sec
+
+    return folds
+
+def _fold_worker_init():
+    """Processos de fold: um thread de torch cada (o paralelismo vem dos processos)."""
+    if torch is not None:
+        torch.set_num_threads(1)
+
+def walk_forward_backtest(candles: pd.DataFrame, train_window_sec: int=300, test_window_sec: int=60, step_sec: int=60, cfg: MLConfig = CFG, horizon: int = 3, use_transformer: bool = True, transformer_epochs: int = 6, transformer_batch: int = 64, calibrate: str = "sigmoid", compute_shap: bool = False, n_jobs: int = 1):
     """
     Walk-forward: itera pela série treinando em janela passada e testando imediatamente após.
-    Retorna métricas agregadas (winrate, net simulated payout).
+    A série é featurizada uma única vez; cada fold apenas fatia as matrizes (janelas de treino com alvo
+    dentro da janela de treino, janelas de teste com o futuro `horizon` dentro da janela de teste).
+    Folds rodam em paralelo com n_jobs > 1 (processos). SHAP é desligado por padrão (não entra nas métricas).
+    Retorna métricas agregadas (winrate, net simulated payout) e tempo por fold.
     Observação: payout e expiry aqui são hipotéticos — ajustar para refletir payouts reais da Deriv.
     """
+    t_start = time.perf_counter()
+    folds = _walk_forward_folds(candles, train_window_sec, test_window_sec, step_sec, cfg, horizon=horizon,
+                                use_transformer=use_transformer, transformer_epochs=transformer_epochs,
+                                transformer_batch=transformer_batch, calibrate=calibrate, compute_shap=compute_shap)
+    featurize_sec = time.perf_counter() - t_start
+
     results = []
-    timestamps = candles.index.values.astype(float)
-    start = timestamps[0] + train_window_sec
-    end = timestamps[-1]
-    pos = 0
-    while start + test_window_sec <= end:
-        train_mask = (timestamps >= (start - train_window_sec)) & (timestamps < start)
-        test_mask = (timestamps >= start) & (timestamps < start + test_window_sec)
-        train_df = candles.iloc[train_mask]
-        test_df = candles.iloc[test_mask]
-        if len(train_df) < cfg.seq_len*2 or len(test_df) < cfg.seq_len:
-            start += step_sec
-            continue
-        # train models
-        tm = fit_models_from_candles(train_df, cfg, horizon=3)
-        # roll through test_df in sliding step and predict
-        predictions = []
-        # we will step by 1 candle
-        for i in range(cfg.seq_len, len(test_df)):
-            window = pd.concat([train_df, test_df.iloc[:i]])
-            # keep only last part (we already trained on train_df; but this mimics online)
-            window_tail = window.iloc[-(cfg.seq_len+3):]  # ensure horizon available
-            pred = predict_from_models(window_tail, tm, cfg)
-            # simulate trade result using real future price after horizon (3)
-            # the real future is in test_df at position i+3-1
-            idx_future = test_df.index[i + 3 - 1] if (i + 3 - 1) < len(test_df) else None
-            if idx_future is None:
-                continue
-            price_now = window_tail['close'].iloc[-1]
-            price_future = test_df.loc[idx_future,'close']
-            direction = pred['direction']
-            win = (price_future > price_now and direction=="CALL") or (price_future < price_now and direction=="PUT")
-            payout = 0.8 if win else -1.0
-            predictions.append(payout)
-        if predictions:
-            net = sum(predictions)
-            wins = sum(1 for p in predictions if p>0)
-            trades = len(predictions)
-            results.append({"start":start, "net":net, "wins":wins, "trades":trades, "winrate": wins/trades})
-        start += step_sec
+    if folds and n_jobs > 1:
+        import copy
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # um thread do LightGBM por fold: o paralelismo vem dos processos
+        fold_cfg = copy.deepcopy(cfg)
+        fold_cfg.lgb_params = dict(cfg.lgb_params, n_jobs=1)
+        for f in folds:
+            f["cfg"] = fold_cfg
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(folds)), mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_fold_worker_init) as ex:
+            results = list(ex.map(_walk_forward_fold, folds))
+    else:
+        results = [_walk_forward_fold(f) for f in folds]
+    results = [r for r in results if r["trades"] > 0]
+    timing = {"featurize_sec": round(featurize_sec, 4), "elapsed_sec": round(time.perf_counter() - t_start, 4)}
     # aggregate
     if not results:
-        return {"net":0.0,"winrate":None,"trades":0}
+        return {"net":0.0,"winrate":None,"trades":0, "folds": [], **timing}
     total_net = sum(r['net'] for r in results)
     total_trades = sum(r['trades'] for r in results)
     total_wins = sum(r['wins'] for r in results)
-    return {"net":total_net, "winrate": (total_wins/total_trades if total_trades>0 else None), "trades":total_trades}
+    return {"net":total_net, "winrate": (total_wins/total_trades if total_trades>0 else None), "trades":total_trades, "folds": results, **timing}
 
 # ------------------------
 # Position sizing and risk utilities
@@ -542,7 +683,9 @@ def save_trained_models(tm: TrainedModels, path_prefix: str):
         except Exception:
             pass
     # features meta
-    joblib.dump({"features": tm.features, "lgb_feat_dim": tm.lgb_feat_dim, "shap_top20": tm.shap_top20}, f"{path_prefix}_meta.pkl")
+    trans_input_dim = getattr(getattr(tm.transformer, "input_proj", None), "in_features", None)
+    joblib.dump({"features": tm.features, "lgb_feat_dim": tm.lgb_feat_dim, "shap_top20": tm.shap_top20,
+                 "trans_input_dim": trans_input_dim}, f"{path_prefix}_meta.pkl")
 
 def load_trained_models(path_prefix: str, cfg: MLConfig = CFG) -> TrainedModels:
     tm = TrainedModels()
@@ -556,6 +699,7 @@ def load_trained_models(path_prefix: str, cfg: MLConfig = CFG) -> TrainedModels:
     except Exception:
         tm.lgb_model = None
         tm.lgb_scaler = None
+    meta = {}
     try:
         meta = joblib.load(f"{path_prefix}_meta.pkl")
         tm.features = meta.get('features')
@@ -563,14 +707,25 @@ def load_trained_models(path_prefix: str, cfg: MLConfig = CFG) -> TrainedModels:
         tm.shap_top20 = meta.get('shap_top20')
     except Exception:
         pass
+    # transformer: reconstruído com o input_dim gravado no meta (artefatos antigos não têm -> fica None)
+    trans_input_dim = meta.get('trans_input_dim')
+    if trans_input_dim and torch is not None:
+        try:
+            model = SeqTransformer(input_dim=int(trans_input_dim))
+            model.load_state_dict(torch.load(f"{path_prefix}_trans.pt", map_location=cfg.device))
+            tm.transformer = model.to(cfg.device).eval()
+        except Exception as e:
+            logging.warning(f"Transformer de {path_prefix} não pôde ser restaurado: {e}")
+    return tm
+
+def can_reload_transformer(path_prefix: str) -> bool:
+    """True se load_trained_models consegue reconstruir o transformer salvo em path_prefix."""
+    if torch is None:
+        return False
     try:
-        # to load transformer we need a model object with correct dims; we assume same input_dim
-        if tm.features is not None and tm.lgb_feat_dim is not None:
-            # We cannot reconstruct transformer input_dim from lgb meta easily; user should rebuild transformer separately
-            pass
+        return bool(joblib.load(f"{path_prefix}_meta.pkl").get('trans_input_dim'))
     except Exception:
-        pass
-    return tm
+        return False
 
 # ------------------------
 # Example quick usage / integration (skeleton)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import asyncio
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import ml_engine
+
+logger = logging.getLogger(__name__)
+
+# Registry of trained ML Engine models keyed by (symbol, timeframe, horizon).
+# Each key has versions (artifacts written by ml_engine.save_trained_models) and one active version.
+# Training completion hot-swaps the active version unless it was pinned; only the most recently
+# used models stay resident (LRU), the others are loaded lazily from disk on the next lookup.
+# Versions whose transformer cannot be rebuilt from disk are never evicted (reloading would silently
+# drop the transformer from the ensemble).
+
+ML_MODELS_DIR = "/app/backend/ml_models"
+ML_REGISTRY_MAX_RESIDENT = int(os.environ.get("ML_REGISTRY_MAX_RESIDENT", "8"))
+ML_REGISTRY_KEEP_VERSIONS = int(os.environ.get("ML_REGISTRY_KEEP_VERSIONS", "5"))
+
+ModelKey = Tuple[str, str, int]
+
+# ml_engine_<symbol>_<timeframe>_h<horizon>[_v<version>]_meta.pkl (symbol pode conter "_", ex.: R_10)
+_ARTIFACT_RE = re.compile(r"^ml_engine_(?P<symbol>.+)_(?P<timeframe>[^_]+)_h(?P<horizon>\d+)(?:_v(?P<version>\d+))?_meta\.pkl$")
+_ARTIFACT_SUFFIXES = ("_lgb.pkl", "_scaler.pkl", "_cal.pkl", "_trans.pt", "_meta.pkl")
+_STAGING_PREFIX = ".staging_"
+
+
+def key_name(key: ModelKey) -> str:
+    symbol, timeframe, horizon = key
+    return f"{symbol}_{timeframe}_h{horizon}"
+
+
+class ModelRegistry:
+    def __init__(self, models_dir: str = ML_MODELS_DIR, max_resident: int = ML_REGISTRY_MAX_RESIDENT,
+                 keep_versions: int = ML_REGISTRY_KEEP_VERSIONS, cfg: ml_engine.MLConfig = ml_engine.CFG):
+        self.models_dir = models_dir
+        self.max_resident = max(1, int(max_resident))
+        self.keep_versions = max(1, int(keep_versions))
+        self.cfg = cfg
+        self._lock = threading.RLock()
+        # key -> {version: {"path": str, "created_at": float}}
+        self.versions: Dict[ModelKey, Dict[int, Dict[str, Any]]] = {}
+        self.active: Dict[ModelKey, int] = {}
+        self.pinned: Dict[ModelKey, bool] = {}
+        # símbolo -> key ativada mais recentemente (fallback quando timeframe/horizon não batem)
+        self.latest_by_symbol: Dict[str, ModelKey] = {}
+        self.last_key: Optional[ModelKey] = None
+        self.resident: "OrderedDict[Tuple[ModelKey, int], ml_engine.TrainedModels]" = OrderedDict()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "swaps": 0}
+
+    # ---------------- paths / discovery ----------------
+
+    def artifact_path(self, key: ModelKey, version: Optional[int] = None) -> str:
+        version = int(time.time() * 1000) if version is None else int(version)
+        return os.path.join(self.models_dir, f"ml_engine_{key_name(key)}_v{version}")
+
+    def staging_path(self, key: ModelKey, version: int) -> str:
+        """Prefixo temporário onde o worker grava os artefatos; só vira versão em promote()."""
+        return os.path.join(self.models_dir, _STAGING_PREFIX + os.path.basename(self.artifact_path(key, version)))
+
+    @staticmethod
+    def promote(staging: str, path: str):
+        """Move os artefatos do staging para o prefixo final (meta por último: meta válido => artefatos completos)."""
+        for suffix in _ARTIFACT_SUFFIXES:
+            if os.path.exists(staging + suffix):
+                os.replace(staging + suffix, path + suffix)
+
+    def scan(self) -> int:
+        """Indexa os artefatos em disco (sem carregar modelos). Ativa a versão mais nova de cada key."""
+        found = 0
+        # staging órfão: job cancelado/derrubado antes do promote
+        for stale in glob.glob(os.path.join(self.models_dir, _STAGING_PREFIX + "*")):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        with self._lock:
+            for meta in sorted(glob.glob(os.path.join(self.models_dir, "ml_engine_*_meta.pkl"))):
+                m = _ARTIFACT_RE.match(os.path.basename(meta))
+                if not m:
+                    continue
+                key = (m.group("symbol"), m.group("timeframe"), int(m.group("horizon")))
+                version = int(m.group("version") or 0)
+                prefix = meta[: -len("_meta.pkl")]
+                self.versions.setdefault(key, {})[version] = {"path": prefix, "created_at": os.path.getmtime(meta)}
+                found += 1
+            # mais antigas primeiro: latest_by_symbol/last_key terminam na key treinada por último
+            for key, vers in sorted(self.versions.items(), key=lambda kv: max(v["created_at"] for v in kv[1].values())):
+                if not self.pinned.get(key):
+                    self.active[key] = max(vers)
+                    self._touch_symbol(key)
+        return found
+
+    def _touch_symbol(self, key: ModelKey):
+        self.latest_by_symbol[key[0]] = key
+        self.last_key = key
+
+    # ---------------- registration / hot-swap ----------------
+
+    def register(self, key: ModelKey, version: int, path: str,
+                 models: Optional[ml_engine.TrainedModels] = None) -> bool:
+        """Registra uma versão nova (treino concluído). Retorna True se virou a versão ativa."""
+        with self._lock:
+            info = {"path": path, "created_at": time.time()}
+            self.versions.setdefault(key, {})[int(version)] = info
+            if models is not None:
+                if models.transformer is not None and not ml_engine.can_reload_transformer(path):
+                    info["reloadable"] = False
+                    logger.warning(f"{key_name(key)} v{version}: transformer não recarregável do disco; modelo fica residente")
+                self._put(key, int(version), models)
+            swapped = False
+            if not self.pinned.get(key):
+                # troca atômica: leitores pegam a versão antiga ou a nova, nunca um estado intermediário
+                self.active[key] = int(version)
+                self._touch_symbol(key)
+                self.stats["swaps"] += 1
+                swapped = True
+            self._prune(key)
+            return swapped
+
+    def pin(self, key: ModelKey, version: Optional[int] = None) -> int:
+        """Fixa a versão ativa (default: a atual); novos treinos não a substituem até unpin."""
+        with self._lock:
+            vers = self.versions.get(key) or {}
+            if version is None:
+                version = self.active.get(key)
+            if version is None or int(version) not in vers:
+                raise KeyError(f"Versão {version} não encontrada para {key_name(key)}")
+            self.active[key] = int(version)
+            self.pinned[key] = True
+            self._touch_symbol(key)
+            return int(version)
+
+    def unpin(self, key: ModelKey) -> Optional[int]:
+        """Remove o pin e volta para a versão mais nova."""
+        with self._lock:
+            self.pinned.pop(key, None)
+            vers = self.versions.get(key) or {}
+            if vers:
+                self.active[key] = max(vers)
+            return self.active.get(key)
+
+    def _prune(self, key: ModelKey):
+        vers = self.versions.get(key) or {}
+        keep = set(sorted(vers)[-self.keep_versions:])
+        keep.add(self.active.get(key))
+        for version in [v for v in vers if v not in keep]:
+            info = vers.pop(version)
+            self.resident.pop((key, version), None)
+            for suffix in _ARTIFACT_SUFFIXES:
+                try:
+                    os.remove(info["path"] + suffix)
+                except OSError:
+                    pass
+
+    # ---------------- lookup ----------------
+
+    def resolve(self, symbol: str, timeframe: Optional[str] = None, horizon: Optional[int] = None) -> Optional[ModelKey]:
+        """Key exata se existir; senão a key do símbolo ativada mais recentemente."""
+        if timeframe is not None and horizon is not None:
+            key = (symbol, timeframe, int(horizon))
+            if key in self.active:
+                return key
+        return self.latest_by_symbol.get(symbol)
+
+    def get(self, key: Optional[ModelKey]) -> Optional[ml_engine.TrainedModels]:
+        """Modelos da versão ativa; carrega do disco sob demanda (LRU limitado a max_resident)."""
+        if key is None:
+            return None
+        with self._lock:
+            version = self.active.get(key)
+            if version is None:
+                return None
+            slot = (key, version)
+            tm = self.resident.get(slot)
+            if tm is not None:
+                self.resident.move_to_end(slot)
+                self.stats["hits"] += 1
+                return tm
+            info = (self.versions.get(key) or {}).get(version)
+        if info is None or info.get("failed"):
+            return None
+        # carga fora do lock (joblib); corrida entre dois loads só custa um load extra
+        tm = ml_engine.load_trained_models(info["path"], self.cfg)
+        if tm.lgb_model is None and tm.transformer is None:
+            info["failed"] = True
+            logger.warning(f"Artefatos de {key_name(key)} v{version} não puderam ser carregados ({info['path']})")
+            return None
+        with self._lock:
+            self.stats["loads"] += 1
+            self._put(key, version, tm)
+        return tm
+
+    async def aget(self, key: Optional[ModelKey]) -> Optional[ml_engine.TrainedModels]:
+        """get() para o event loop: modelo residente sai direto, carga do disco (joblib/torch) vai para uma thread."""
+        if key is None:
+            return None
+        with self._lock:
+            version = self.active.get(key)
+            tm = self.resident.get((key, version)) if version is not None else None
+            if tm is not None:
+                self.resident.move_to_end((key, version))
+                self.stats["hits"] += 1
+                return tm
+        return await asyncio.to_thread(self.get, key)
+
+    def _put(self, key: ModelKey, version: int, tm: ml_engine.TrainedModels):
+        slot = (key, version)
+        self.resident[slot] = tm
+        self.resident.move_to_end(slot)
+        # despeja os menos usados que podem ser recarregados do disco
+        for victim in list(self.resident):
+            if len(self.resident) <= self.max_resident:
+                break
+            if victim == slot or not (self.versions.get(victim[0]) or {}).get(victim[1], {}).get("reloadable", True):
+                continue
+            self.resident.pop(victim)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            models: List[Dict[str, Any]] = []
+            for key, vers in self.versions.items():
+                active = self.active.get(key)
+                models.append({
+                    "symbol": key[0],
+                    "timeframe": key[1],
+                    "horizon": key[2],
+                    "active_version": active,
+                    "pinned": bool(self.pinned.get(key)),
+                    "resident": (key, active) in self.resident,
+                    "versions": sorted(vers),
+                })
+            return {
+                "models": models,
+                "last_key": key_name(self.last_key) if self.last_key else None,
+                "resident": len(self.resident),
+                "max_resident": self.max_resident,
+                "stats": dict(self.stats),
+            }
@@ -12,10 +12,13 @@ import numpy as np
 import pickle
 import shutil
 from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Sequence, Tuple
 from pathlib import Path
 import json
+import os
+import threading
 import time
 
 # River ML (online)
@@ -29,6 +32,29 @@ MIN_TICK = 1e-8
 MODEL_SAVE_PATH = "/app/backend/ml_models/river_online_model.pkl"
 BACKUP_DIR = "/app/backend/ml_models/river_backups"
 METADATA_PATH = "/app/backend/ml_models/river_metadata.json"
+# Persistência em background (RiverPersistence)
+SAVE_INTERVAL_SEC = float(os.environ.get("RIVER_SAVE_INTERVAL", "30"))
+SAVE_EVERY_N = int(os.environ.get("RIVER_SAVE_EVERY", "20"))
+MAX_BACKUPS = 10
+
+
+def _atomic_write(path: str, data: bytes):
+    """Escrita atômica: arquivo temporário no mesmo diretório + fsync + rename."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            try:
+                tmp.unlink()
+            except Exception:
+                pass
 
 
 class RiverOnlineCandleModel:
@@ -41,9 +67,11 @@ class RiverOnlineCandleModel:
         # Metrics
         self.metric_acc = metrics.Accuracy()
         self.metric_logloss = metrics.LogLoss()
-        # Rolling state
+        # Rolling state (janela padrão; símbolos com estado próprio ficam em `windows`)
         self.closes = deque(maxlen=ROLLING_WINDOW)
         self.vols = deque(maxlen=ROLLING_WINDOW)
+        self.windows: Dict[str, Tuple[deque, deque]] = {}
+        self.last_learned: Dict[Optional[str], Any] = {}
         # Internal counters
         self.sample_count = 0
 
@@ -60,13 +88,27 @@ class RiverOnlineCandleModel:
             return ts
         return datetime.utcnow()
 
-    def _make_features(self, timestamp, o, h, l, c, v) -> Dict[str, float]:
+    def _window(self, key: Optional[str], create: bool = False) -> Optional[Tuple[deque, deque]]:
+        """Estado rolante (closes, vols) da chave; None = janela padrão (modelos antigos não têm `windows`)."""
+        if key is None:
+            return self.closes, self.vols
+        windows = self.__dict__.setdefault("windows", {})
+        w = windows.get(key)
+        if w is None and create:
+            w = windows[key] = (deque(maxlen=ROLLING_WINDOW), deque(maxlen=ROLLING_WINDOW))
+        return w
+
+    def _make_features(self, timestamp, o, h, l, c, v, key: Optional[str] = None) -> Dict[str, float]:
         # update history
-        self.closes.append(float(c))
-        self.vols.append(float(v) if v is not None else 0.0)
+        closes_w, vols_w = self._window(key, create=True)
+        closes_w.append(float(c))
+        vols_w.append(float(v) if v is not None else 0.0)
+        return self._features_from(closes_w, vols_w, timestamp, o, h, l, c, v)
 
-        closes = np.array(self.closes, dtype=float)
-        vols = np.array(self.vols, dtype=float)
+    def _features_from(self, closes_w: Sequence[float], vols_w: Sequence[float], timestamp, o, h, l, c, v) -> Dict[str, float]:
+        """Features do candle a partir de uma janela que já termina nele (não altera estado)."""
+        closes = np.array(closes_w, dtype=float)
+        vols = np.array(vols_w, dtype=float)
 
         # returns
         ret_1 = 0.0
@@ -104,8 +146,130 @@ class RiverOnlineCandleModel:
             "body": float(body),
         }
 
+    def _seconds_of_day_many(self, timestamps) -> np.ndarray:
+        """Segundos do dia para uma coluna de timestamps (mesma semântica de _parse_ts)."""
+        values = pd.Series(timestamps)
+        if values.map(lambda t: isinstance(t, str)).all():
+            try:
+                # ISO8601 com o mesmo offset em todas as linhas: hora local do próprio timestamp (igual a fromisoformat)
+                parsed = pd.to_datetime(values.str.replace("Z", "+00:00", regex=False), format="ISO8601")
+                if isinstance(parsed.dtype, pd.DatetimeTZDtype) or np.issubdtype(parsed.dtype, np.datetime64):
+                    return (parsed.dt.hour * 3600 + parsed.dt.minute * 60 + parsed.dt.second).to_numpy(dtype=np.int64)
+            except Exception:
+                pass
+        out = np.empty(len(values), dtype=np.int64)
+        for i, t in enumerate(values.tolist()):
+            ts = self._parse_ts(t)
+            out[i] = ts.hour * 3600 + ts.minute * 60 + ts.second
+        return out
+
+    def make_features_many(self, timestamps, o, h, l, c, v) -> List[Dict[str, float]]:
+        """Versão vetorizada de _make_features para um lote de candles (ordem cronológica).
+        Continua o estado rolante atual (closes/vols) e o deixa como o caminho por-candle deixaria."""
+        o = np.asarray(o, dtype=float)
+        h = np.asarray(h, dtype=float)
+        l = np.asarray(l, dtype=float)
+        c = np.asarray(c, dtype=float)
+        v = np.asarray(v, dtype=float)
+        n = len(c)
+        if n == 0:
+            return []
+        k = len(self.closes)
+        full_c = np.concatenate([np.array(self.closes, dtype=float), c])
+        full_v = np.concatenate([np.array(self.vols, dtype=float), v])
+        ends = np.arange(k, k + n)
+
+        sma = np.empty(n)
+        std = np.zeros(n)
+        vol_mean = np.empty(n)
+        w = ROLLING_WINDOW
+        full_rows = ends >= (w - 1)
+        if full_rows.any():
+            first = int(np.argmax(full_rows))
+            win_c = sliding_window_view(full_c, w)[ends[first:] - (w - 1)]
+            win_v = sliding_window_view(full_v, w)[ends[first:] - (w - 1)]
+            sma[first:] = win_c.mean(axis=1)
+            std[first:] = win_c.std(axis=1)
+            vol_mean[first:] = win_v.mean(axis=1)
+        # janelas parciais (histórico ainda menor que ROLLING_WINDOW)
+        for j in np.flatnonzero(~full_rows):
+            e = ends[j]
+            wc = full_c[: e + 1]
+            sma[j] = wc.mean()
+            std[j] = wc.std(ddof=0) if len(wc) > 1 else 0.0
+            vol_mean[j] = full_v[: e + 1].mean()
+
+        ret_1 = np.zeros(n)
+        has_prev = ends >= 1
+        prev = full_c[ends[has_prev] - 1]
+        ret_1[has_prev] = np.log((c[has_prev] + MIN_TICK) / (prev + MIN_TICK))
+
+        seconds = self._seconds_of_day_many(timestamps)
+        sec_in_day = 24 * 3600
+        tod_sin = np.sin(2 * np.pi * seconds / sec_in_day)
+        tod_cos = np.cos(2 * np.pi * seconds / sec_in_day)
+        hl_range = h - l
+        body = c - o
+
+        # avançar o estado rolante exatamente como o caminho por-candle
+        self.closes.extend(c[-ROLLING_WINDOW:].tolist())
+        self.vols.extend(v[-ROLLING_WINDOW:].tolist())
+
+        cols = [o, h, l, c, v, ret_1, sma, std, vol_mean, tod_sin, tod_cos, hl_range, body]
+        names = ["open", "high", "low", "close", "volume", "ret_1", "sma", "std", "vol_mean",
+                 "tod_sin", "tod_cos", "hl_range", "body"]
+        rows = zip(*[col.tolist() for col in cols])
+        return [dict(zip(names, r)) for r in rows]
+
     def predict_and_update(self, timestamp, o, h, l, c, v, next_close: Optional[float] = None) -> Dict[str, Any]:
         x = self._make_features(timestamp, o, h, l, c, v)
+        return self._predict_learn(x, c, next_close)
+
+    def predict(self, timestamp, o, h, l, c, v, key: Optional[str] = None,
+                history: Optional[Sequence[Tuple[float, float]]] = None) -> Dict[str, Any]:
+        """Predição sem efeitos colaterais: nem o modelo nem as janelas rolantes mudam.
+        Janela = `history` (candles anteriores como pares (close, volume), quando o chamador os tem),
+        senão um snapshot da janela de `key` (vazia se a chave ainda não tem estado; key None = janela padrão), mais o candle atual.
+        O snapshot é uma tupla tirada de uma vez, então predições concorrentes não precisam de lock nem de cópia do modelo."""
+        vol = float(v) if v is not None else 0.0
+        if history is not None:
+            prev = list(history)[-(ROLLING_WINDOW - 1):] if ROLLING_WINDOW > 1 else []
+            closes_w = [float(pc) for pc, _ in prev] + [float(c)]
+            vols_w = [float(pv or 0.0) for _, pv in prev] + [vol]
+        else:
+            # chave sem estado não herda a janela padrão (candles de outro símbolo/modelo antigo)
+            w = self._window(key) or ((), ())
+            closes_w = (tuple(w[0]) + (float(c),))[-ROLLING_WINDOW:]
+            vols_w = (tuple(w[1]) + (vol,))[-ROLLING_WINDOW:]
+        x = self._features_from(closes_w, vols_w, timestamp, o, h, l, c, v)
+        return self._predict_learn(x, c, None)
+
+    def learn(self, timestamp, o, h, l, c, v, next_close: Optional[float], key: Optional[str] = None) -> Dict[str, Any]:
+        """Avança a janela de `key` com um candle fechado e aprende com o rótulo de `next_close` (se houver).
+        Idempotente por candle: repetir o mesmo timestamp para a mesma chave não duplica a janela nem o aprendizado.
+        Quem chama deve segurar o lock de persistência (RiverPersistence.lock) como nas demais atualizações."""
+        last = self.__dict__.setdefault("last_learned", {})
+        if timestamp is not None and last.get(key) == timestamp:
+            info = self.predict(timestamp, o, h, l, c, v, key=key)
+            info["duplicate"] = True
+            return info
+        x = self._make_features(timestamp, o, h, l, c, v, key=key)
+        last[key] = timestamp
+        return self._predict_learn(x, c, next_close)
+
+    def predict_and_update_many(self, xs: List[Dict[str, float]], next_closes: List[Optional[float]],
+                                log_every: int = 100) -> List[Dict[str, Any]]:
+        """Laço enxuto prequential (prever -> aprender) sobre features pré-computadas.
+        Usa predict_proba_one/learn_one em ordem para produzir exatamente o mesmo modelo do caminho
+        por-candle (learn_many em mini-batch alteraria os pesos). Retorna os logs a cada `log_every`."""
+        logs = []
+        for i, x in enumerate(xs):
+            info = self._predict_learn(x, x["close"], next_closes[i])
+            if i % log_every == 0:
+                logs.append({"i": i, "prob_up": round(info["prob_up"], 4), "pred": int(info["pred_class"]), "label": info.get("label")})
+        return logs
+
+    def _predict_learn(self, x: Dict[str, float], c: float, next_close: Optional[float]) -> Dict[str, Any]:
         # predict prob up
         try:
             y_proba = self.model.predict_proba_one(x)
@@ -150,25 +314,35 @@ class RiverOnlineCandleModel:
         # 🔄 BACKUP AUTOMÁTICO: Criar backup antes de salvar
         self._create_backup()
         
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        _atomic_write(path, pickle.dumps(self))
             
         # Atualizar metadados
         self._update_metadata()
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "last_update": datetime.utcnow().isoformat(),
+            "sample_count": self.sample_count,
+            "accuracy": float(self.metric_acc.get()) if self.sample_count > 0 else None,
+            "logloss": float(self.metric_logloss.get()) if self.sample_count > 0 else None,
+            "model_path": MODEL_SAVE_PATH,
+            "rolling_window": ROLLING_WINDOW
+        }
     
-    def _create_backup(self):
+    def _create_backup(self, sample_count: Optional[int] = None):
         """Cria backup automático do modelo River com timestamp"""
         try:
             Path(BACKUP_DIR).mkdir(parents=True, exist_ok=True)
             
             if Path(MODEL_SAVE_PATH).exists():
                 timestamp = int(time.time())
-                backup_filename = f"river_model_samples_{self.sample_count}_{timestamp}.pkl"
+                samples = self.sample_count if sample_count is None else sample_count
+                backup_filename = f"river_model_samples_{samples}_{timestamp}.pkl"
                 backup_path = Path(BACKUP_DIR) / backup_filename
                 
                 # Copiar modelo atual para backup
                 shutil.copy2(MODEL_SAVE_PATH, backup_path)
-                print(f"🔄 Backup River criado: {backup_filename} (samples: {self.sample_count})")
+                print(f"🔄 Backup River criado: {backup_filename} (samples: {samples})")
                 
                 # Manter apenas os últimos 10 backups
                 self._cleanup_old_backups()
@@ -180,29 +354,20 @@ class RiverOnlineCandleModel:
         """Remove backups antigos, mantendo apenas os 10 mais recentes"""
         try:
             backup_files = list(Path(BACKUP_DIR).glob("river_model_samples_*.pkl"))
-            if len(backup_files) > 10:
-                # Ordenar por timestamp (mais antigo primeiro)
-                backup_files.sort()
-                for old_backup in backup_files[:-10]:
+            if len(backup_files) > MAX_BACKUPS:
+                # Ordenar por data de modificação (mais antigo primeiro)
+                backup_files.sort(key=lambda p: p.stat().st_mtime)
+                for old_backup in backup_files[:-MAX_BACKUPS]:
                     old_backup.unlink()
                     print(f"🗑️ Backup antigo removido: {old_backup.name}")
         except Exception as e:
             print(f"⚠️ Erro limpando backups antigos: {e}")
     
-    def _update_metadata(self):
+    def _update_metadata(self, metadata: Optional[Dict[str, Any]] = None):
         """Atualiza metadados do modelo River"""
         try:
-            metadata = {
-                "last_update": datetime.utcnow().isoformat(),
-                "sample_count": self.sample_count,
-                "accuracy": float(self.metric_acc.get()) if self.sample_count > 0 else None,
-                "logloss": float(self.metric_logloss.get()) if self.sample_count > 0 else None,
-                "model_path": MODEL_SAVE_PATH,
-                "rolling_window": ROLLING_WINDOW
-            }
-            
-            with open(METADATA_PATH, "w") as f:
-                json.dump(metadata, f, indent=2)
+            metadata = metadata or self.metadata()
+            _atomic_write(METADATA_PATH, json.dumps(metadata, indent=2).encode("utf-8"))
                 
         except Exception as e:
             print(f"⚠️ Erro atualizando metadados River: {e}")
@@ -275,8 +440,98 @@ class RiverOnlineCandleModel:
             return pickle.load(f)
 
 
-def run_on_dataframe(df: pd.DataFrame, model: Optional[RiverOnlineCandleModel] = None) -> Dict[str, Any]:
-        """Simulate streaming over a OHLCV dataframe (sorted by datetime)"""
+class RiverPersistence:
+    """Persistência do modelo River fora do caminho quente.
+
+    mark_dirty() apenas marca o modelo como alterado; uma thread em background tira o snapshot
+    (pickle sob `lock`) a cada `interval_sec` ou a cada `every_n` atualizações e faz backup,
+    escrita atômica (tmp + rename), rotação de backups e metadados sem bloquear o event loop.
+    Quem altera o modelo deve fazê-lo segurando `lock` para o snapshot ser consistente.
+    """
+
+    def __init__(self, path: str = MODEL_SAVE_PATH, interval_sec: float = SAVE_INTERVAL_SEC, every_n: int = SAVE_EVERY_N):
+        self.path = path
+        self.interval_sec = max(0.5, float(interval_sec))
+        self.every_n = max(1, int(every_n))
+        self.lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._model: Optional[RiverOnlineCandleModel] = None
+        self._pending = 0
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"saves": 0, "errors": 0, "last_save_at": None, "last_error": None}
+
+    def mark_dirty(self, model: RiverOnlineCandleModel, immediate: bool = False):
+        """immediate=True acorda a thread já (ex.: modelo novo vindo de um treino CSV)."""
+        with self.lock:
+            self._model = model
+            self._pending += 1
+            pending = self._pending
+        self._ensure_thread()
+        if immediate or pending >= self.every_n:
+            self._wake.set()
+
+    def discard(self):
+        """Descarta alterações pendentes (ex.: após restaurar um backup no disco)."""
+        with self.lock:
+            self._model = None
+            self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._worker, name="river-persistence", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.interval_sec)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> bool:
+        """Grava o snapshot pendente (se houver). Pode ser chamado de qualquer thread."""
+        with self.lock:
+            model = self._model
+            if model is None or self._pending == 0:
+                return False
+            blob = pickle.dumps(model)
+            meta = model.metadata()
+            self._pending = 0
+        try:
+            model._create_backup(sample_count=meta["sample_count"])
+            _atomic_write(self.path, blob)
+            model._update_metadata(meta)
+            self.stats["saves"] += 1
+            self.stats["last_save_at"] = time.time()
+            return True
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.stats["last_error"] = str(e)
+            print(f"⚠️ Erro salvando River em background: {e}")
+            with self.lock:
+                self._pending = max(self._pending, 1)
+            return False
+
+    def stop(self, flush: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if flush:
+            self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._pending, "interval_sec": self.interval_sec, "every_n": self.every_n}
+
+
+def run_on_dataframe(df: pd.DataFrame, model: Optional[RiverOnlineCandleModel] = None, save: bool = True) -> Dict[str, Any]:
+        """Simulate streaming over a OHLCV dataframe (sorted by datetime). save=False leaves persistence to the caller."""
         required_cols = {"datetime", "open", "high", "low", "close", "volume"}
         # normalize column names to lower
         df2 = df.copy()
@@ -288,18 +543,17 @@ def run_on_dataframe(df: pd.DataFrame, model: Optional[RiverOnlineCandleModel] =
         if model is None:
             model = RiverOnlineCandleModel()
 
-        logs = []
-        for i in range(len(df2)):
-            row = df2.iloc[i]
-            next_close = float(df2.iloc[i + 1]["close"]) if i + 1 < len(df2) else None
-            info = model.predict_and_update(
-                row["datetime"], float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"]), float(row.get("volume", 0.0)),
-                next_close=next_close,
-            )
-            if i % 100 == 0:
-                logs.append({"i": i, "prob_up": round(info["prob_up"], 4), "pred": int(info["pred_class"]), "label": info.get("label")})
+        # ⚡ Features vetorizadas para o DataFrame inteiro + laço enxuto sobre dicts pré-montados
+        closes = df2["close"].to_numpy(dtype=float)
+        xs = model.make_features_many(
+            df2["datetime"].tolist(), df2["open"].to_numpy(dtype=float), df2["high"].to_numpy(dtype=float),
+            df2["low"].to_numpy(dtype=float), closes, df2["volume"].to_numpy(dtype=float),
+        )
+        next_closes: List[Optional[float]] = closes[1:].tolist() + [None]
+        logs = model.predict_and_update_many(xs, next_closes)
 
-        model.save()
+        if save:
+            model.save()
         summary = {
             "message": "treino online finalizado",
             "model_path": MODEL_SAVE_PATH,
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import os
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
@@ -53,9 +54,100 @@ def compute_rsi_bbands(rsi_series: pd.Series, length: int, k: float) -> Tuple[pd
     return mid, upper, lower
 
 
-def generate_signals(df: pd.DataFrame, params: RsiReinforcedParams) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+def _signal_columns(cdf: pd.DataFrame) -> Dict[str, np.ndarray]:
+    return {
+        "rsi": cdf["rsi"].values,
+        "mid": cdf["rsi_bb_mid"].values,
+        "up": cdf["rsi_bb_upper"].values,
+        "lo": cdf["rsi_bb_lower"].values,
+        "width": cdf["rsi_bb_width"].values,
+        "htf": cdf["htf_rsi"].values,
+        "htf_slope": cdf["htf_rsi_slope"].values,
+    }
+
+
+def _signal_at(i: int, cols: Dict[str, np.ndarray], htf_i: float, htf_slope_i: float,
+               params: RsiReinforcedParams) -> Optional[str]:
+    """Signal rule at bar i ("CALL", "PUT" or None) given the HTF RSI value/slope seen at that bar."""
+    rsi_val, mid_v, up_v, lo_v, w_v = cols["rsi"], cols["mid"], cols["up"], cols["lo"], cols["width"]
+    if np.isnan(rsi_val[i]) or np.isnan(up_v[i]) or np.isnan(lo_v[i]) or np.isnan(htf_i):
+        return None
+    # Ignore when band width is too small (not at extremes)
+    if w_v[i] < params.min_bandwidth:
+        return None
+    dist_from_mid = abs(rsi_val[i] - mid_v[i])
+    if dist_from_mid < params.distance_from_mid_min:
+        return None
+
+    # Reentry logic
+    long_reentry = (rsi_val[i-1] < lo_v[i-1] and rsi_val[i] >= lo_v[i]) if params.reentry_only else (rsi_val[i] <= lo_v[i])
+    short_reentry = (rsi_val[i-1] > up_v[i-1] and rsi_val[i] <= up_v[i]) if params.reentry_only else (rsi_val[i] >= up_v[i])
+
+    # HTF confirmation
+    long_ok = True
+    short_ok = True
+    if params.confirm_with_midline:
+        long_ok = long_ok and (htf_i >= 50.0)
+        short_ok = short_ok and (htf_i <= 50.0)
+    if params.confirm_with_slope and not np.isnan(htf_slope_i):
+        long_ok = long_ok and (htf_slope_i >= 0)
+        short_ok = short_ok and (htf_slope_i <= 0)
+
+    if long_reentry and long_ok:
+        return "CALL"
+    if short_reentry and short_ok:
+        return "PUT"
+    return None
+
+
+def _prev(a: np.ndarray) -> np.ndarray:
+    out = np.full(a.shape, np.nan)
+    out[..., 1:] = a[..., :-1]
+    return out
+
+
+def _signal_masks(rsi: np.ndarray, mid: np.ndarray, up: np.ndarray, lo: np.ndarray, width: np.ndarray,
+                  htf: np.ndarray, htf_slope: np.ndarray, params: RsiReinforcedParams,
+                  min_bandwidth: Any = None, distance_from_mid_min: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized _signal_at over the last axis: returns (call, put) boolean masks.
+
+    Inputs broadcast against each other, so a (k, n) stack of bands or thresholds shaped (m, 1, 1)
+    evaluate many parameter combinations at once. NaN comparisons behave as in the per-bar rule.
+    """
+    min_bw = params.min_bandwidth if min_bandwidth is None else min_bandwidth
+    min_dist = params.distance_from_mid_min if distance_from_mid_min is None else distance_from_mid_min
+    with np.errstate(invalid="ignore"):
+        ok = ~(np.isnan(rsi) | np.isnan(up) | np.isnan(lo) | np.isnan(htf))
+        ok = ok & ~(width < min_bw) & ~(np.abs(rsi - mid) < min_dist)
+        if params.reentry_only:
+            long_re = (_prev(rsi) < _prev(lo)) & (rsi >= lo)
+            short_re = (_prev(rsi) > _prev(up)) & (rsi <= up)
+        else:
+            long_re = rsi <= lo
+            short_re = rsi >= up
+        long_ok = ok
+        short_ok = ok
+        if params.confirm_with_midline:
+            long_ok = long_ok & (htf >= 50.0)
+            short_ok = short_ok & (htf <= 50.0)
+        if params.confirm_with_slope:
+            no_slope = np.isnan(htf_slope)
+            long_ok = long_ok & (no_slope | (htf_slope >= 0))
+            short_ok = short_ok & (no_slope | (htf_slope <= 0))
+    call = long_re & long_ok
+    put = short_re & short_ok & ~call
+    call[..., :2] = False
+    put[..., :2] = False
+    return call, put
+
+
+def generate_signals(df: pd.DataFrame, params: RsiReinforcedParams,
+                     rsi: Optional[pd.Series] = None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
     """Compute RSI Bollinger signals with multi-timeframe confirmation.
 
+    `rsi` optionally supplies the base RSI (same index as df, period params.rsi_period) already
+    computed by the caller, e.g. the DecisionEngine shared feature cache.
+
     Returns: (df_with_cols, signals)
       - df includes columns: rsi, rsi_bb_mid, rsi_bb_upper, rsi_bb_lower, rsi_bb_width, htf_rsi, htf_rsi_slope
       - signals: list of dict(timestamp, side, index)
@@ -64,7 +156,7 @@ def generate_signals(df: pd.DataFrame, params: RsiReinforcedParams) -> Tuple[pd.
     cdf = cdf[[c for c in ["open","high","low","close","volume"] if c in cdf.columns]].copy()
 
     # RSI on close
-    cdf["rsi"] = rsi_fn(cdf["close"], params.rsi_period)
+    cdf["rsi"] = rsi if rsi is not None else rsi_fn(cdf["close"], params.rsi_period)
     mid, up, lo = compute_rsi_bbands(cdf["rsi"], params.rsi_bb_length, params.rsi_bb_k)
     cdf["rsi_bb_mid"], cdf["rsi_bb_upper"], cdf["rsi_bb_lower"] = mid, up, lo
     cdf["rsi_bb_width"] = (up - lo)
@@ -77,92 +169,189 @@ def generate_signals(df: pd.DataFrame, params: RsiReinforcedParams) -> Tuple[pd.
     cdf["htf_rsi"] = htf_rsi_ff
     cdf["htf_rsi_slope"] = cdf["htf_rsi"].diff(params.slope_lookback)
 
-    # Signal generation
-    signals: List[Dict[str, Any]] = []
-    rsi_val = cdf["rsi"].values
-    mid_v = cdf["rsi_bb_mid"].values
-    up_v = cdf["rsi_bb_upper"].values
-    lo_v = cdf["rsi_bb_lower"].values
-    w_v = cdf["rsi_bb_width"].values
-    htf_v = cdf["htf_rsi"].values
-    htf_slope_v = cdf["htf_rsi_slope"].values
-
-    for i in range(2, len(cdf)):
-        if np.isnan(rsi_val[i]) or np.isnan(up_v[i]) or np.isnan(lo_v[i]) or np.isnan(htf_v[i]):
-            continue
-        # Ignore when band width is too small (not at extremes)
-        if w_v[i] < params.min_bandwidth:
-            continue
-        dist_from_mid = abs(rsi_val[i] - mid_v[i])
-        if dist_from_mid < params.distance_from_mid_min:
-            continue
-
-        # Reentry logic
-        long_reentry = (rsi_val[i-1] < lo_v[i-1] and rsi_val[i] >= lo_v[i]) if params.reentry_only else (rsi_val[i] <= lo_v[i])
-        short_reentry = (rsi_val[i-1] > up_v[i-1] and rsi_val[i] <= up_v[i]) if params.reentry_only else (rsi_val[i] >= up_v[i])
-
-        # HTF confirmation
-        long_ok = True
-        short_ok = True
-        if params.confirm_with_midline:
-            long_ok = long_ok and (htf_v[i] >= 50.0)
-            short_ok = short_ok and (htf_v[i] <= 50.0)
-        if params.confirm_with_slope and not np.isnan(htf_slope_v[i]):
-            long_ok = long_ok and (htf_slope_v[i] >= 0)
-            short_ok = short_ok and (htf_slope_v[i] <= 0)
-
-        if long_reentry and long_ok:
-            signals.append({"index": i, "timestamp": cdf.index[i], "side": "CALL"})
-        elif short_reentry and short_ok:
-            signals.append({"index": i, "timestamp": cdf.index[i], "side": "PUT"})
+    # Signal generation (masks over all bars)
+    cols = _signal_columns(cdf)
+    call, put = _signal_masks(cols["rsi"], cols["mid"], cols["up"], cols["lo"], cols["width"],
+                              cols["htf"], cols["htf_slope"], params)
+    index = cdf.index
+    signals: List[Dict[str, Any]] = [
+        {"index": i, "timestamp": index[i], "side": "CALL" if call[i] else "PUT"}
+        for i in np.flatnonzero(call | put).tolist()
+    ]
 
     return cdf, signals
 
 
+def _ewm_step(prev: float, cur: float, alpha: float) -> float:
+    """One step of Series.ewm(alpha=alpha, adjust=False).mean(), with the same float operations as pandas."""
+    if prev != prev:
+        return cur
+    if prev == cur:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * cur) / (old_wt + alpha)
+
+
+def prefix_signals(df: pd.DataFrame, params: RsiReinforcedParams,
+                   rsi: Optional[pd.Series] = None) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """Latest signal that generate_signals(df.iloc[:i + 1]) would return, for every i, in a single pass.
+
+    Every column is causal except the HTF RSI: on a prefix the last HTF candle is still forming (its
+    close is close[i]), so the signal at the last bar is re-evaluated with that partial HTF RSI, stepped
+    from the previous complete HTF candle. Earlier bars see exactly the full-frame values.
+
+    Returns (cdf, last_index, last_side): last_index[i] is the bar of the latest signal (-1 if none) and
+    last_side[i] its side (1 = CALL, -1 = PUT, 0 = none).
+    """
+    cdf, signals = generate_signals(df, params, rsi=rsi)
+    n = len(cdf)
+    cols = _signal_columns(cdf)
+    close = cdf["close"].values
+    full_idx = np.array([s["index"] for s in signals], dtype=np.int64)
+    full_side = np.array([1 if s["side"] == "CALL" else -1 for s in signals], dtype=np.int64)
+
+    factor = int(params.higher_tf_factor)
+    lb = int(params.slope_lookback)
+    if factor > 1 and n:
+        htf_close = _aggregate_htf(cdf[["open", "high", "low", "close"]], factor)["close"]
+        delta = htf_close.diff()
+        alpha = 1 / params.rsi_period
+        roll_up = delta.clip(lower=0).ewm(alpha=alpha, adjust=False).mean().values
+        roll_down = (-delta.clip(upper=0)).ewm(alpha=alpha, adjust=False).mean().values
+        htf_close = htf_close.values
+
+    last_index = np.full(n, -1, dtype=np.int64)
+    last_side = np.zeros(n, dtype=np.int64)
+    pos = np.searchsorted(full_idx, np.arange(n), side="left")  # sinais completos com índice < i
+    for i in range(n):
+        side = None
+        if i >= 2:
+            if factor > 1:
+                g = i // factor
+                if g == 0:
+                    htf_i = np.nan
+                else:
+                    d = close[i] - htf_close[g - 1]
+                    ru = _ewm_step(roll_up[g - 1], max(d, 0.0), alpha)
+                    rd = _ewm_step(roll_down[g - 1], -min(d, 0.0), alpha)
+                    htf_i = 100 - (100 / (1 + ru / (rd + 1e-12)))
+            else:
+                htf_i = cols["htf"][i]
+            slope_i = htf_i - cols["htf"][i - lb] if i - lb >= 0 else np.nan
+            side = _signal_at(i, cols, htf_i, slope_i, params)
+        if side is not None:
+            last_index[i] = i
+            last_side[i] = 1 if side == "CALL" else -1
+        elif pos[i] > 0:
+            last_index[i] = full_idx[pos[i] - 1]
+            last_side[i] = full_side[pos[i] - 1]
+    return cdf, last_index, last_side
+
+
+def _outcome_metrics(close: np.ndarray, idx: np.ndarray, is_call: np.ndarray, horizon: int,
+                     payout_ratio: float) -> Dict[str, Any]:
+    """Metrics of signals entered at close[idx] and settled at close[idx + horizon] (outcome vectors)."""
+    h = max(1, int(horizon))
+    keep = idx + h < len(close)
+    idx, is_call = idx[keep], is_call[keep]
+    entry = close[idx]
+    out = close[idx + h]
+    win = np.where(is_call, out > entry, out < entry)
+    wins = int(win.sum())
+    losses = int(len(win) - wins)
+    # cumsum sequencial: mesma equity que o laço trade a trade; pico começa em 0
+    eq = np.cumsum(np.where(win, payout_ratio, -1.0))
+    peak = np.maximum.accumulate(np.maximum(eq, 0.0)) if len(eq) else eq
+    max_dd = float(min(0.0, (eq - peak).min())) if len(eq) else 0.0
+    total = wins + losses
+    return {
+        "total_signals": total,
+        "wins": wins,
+        "losses": losses,
+        "winrate": float(wins / total) if total > 0 else 0.0,
+        "equity_final": float(eq[-1]) if len(eq) else 0.0,
+        "max_drawdown": max_dd,
+    }
+
+
 def backtest_signals(df: pd.DataFrame, signals: List[Dict[str, Any]], params: RsiReinforcedParams) -> Dict[str, Any]:
     """Simple directional backtest using horizon candles ahead.
     Win rule: CALL wins if close[i+h] > close[i]; PUT wins if close[i+h] < close[i].
-    Returns metrics including equity curve stats (binary option-like payout for reference).
+    Returns metrics including equity curve stats (binary option-like payout for reference equity).
     """
     if not signals:
         return {"total_signals": 0, "wins": 0, "losses": 0, "winrate": 0.0, "equity_final": 0.0, "max_drawdown": 0.0}
+    idx = np.fromiter((int(s["index"]) for s in signals), dtype=np.int64, count=len(signals))
+    is_call = np.fromiter((s["side"] == "CALL" for s in signals), dtype=bool, count=len(signals))
+    return _outcome_metrics(df["close"].to_numpy(dtype=float), idx, is_call, params.horizon, params.payout_ratio)
 
-    close = df["close"].values
-    h = max(1, int(params.horizon))
-    wins = 0
-    losses = 0
-    equity = []
-    eq = 0.0
-    peak = 0.0
-    max_dd = 0.0
-
-    for s in signals:
-        i = int(s["index"])  # entry at close i
-        if i + h >= len(close):
-            continue
-        entry = close[i]
-        out = close[i + h]
-        if s["side"] == "CALL":
-            win = out > entry
-        else:
-            win = out < entry
-        if win:
-            wins += 1
-            eq += params.payout_ratio
-        else:
-            losses += 1
-            eq -= 1.0
-        peak = max(peak, eq)
-        max_dd = min(max_dd, eq - peak)
-        equity.append(eq)
 
-    total = wins + losses
-    winrate = float(wins / total) if total > 0 else 0.0
-    return {
-        "total_signals": total,
-        "wins": int(wins),
-        "losses": int(losses),
-        "winrate": winrate,
-        "equity_final": float(eq if equity else 0.0),
-        "max_drawdown": float(max_dd),
-    }
+GRID_FIELDS = ("rsi_period", "rsi_bb_length", "rsi_bb_k", "min_bandwidth", "distance_from_mid_min", "horizon")
+# Máscaras de sinal são avaliadas em blocos de no máximo GRID_CHUNK_CELLS (linhas x candles) elementos;
+# GRID_MAX_CELLS limita combinações x candles de uma grade inteira (tempo de CPU do job).
+GRID_CHUNK_CELLS = int(os.environ.get("RSI_GRID_CHUNK_CELLS", "4000000"))
+GRID_MAX_CELLS = int(os.environ.get("RSI_GRID_MAX_CELLS", "100000000"))
+
+
+def grid_backtest(df: pd.DataFrame, params: RsiReinforcedParams, grid: Dict[str, List[Any]],
+                  top: Optional[int] = None, chunk_cells: int = GRID_CHUNK_CELLS) -> List[Dict[str, Any]]:
+    """Backtest of every combination of `grid` (keys from GRID_FIELDS; missing keys use `params`).
+
+    Batched: RSI/HTF RSI are computed once per rsi_period, the RSI Bollinger mean/std once per
+    rsi_bb_length and the bands once per rsi_bb_k; the (min_bandwidth x distance_from_mid_min) signal
+    masks are broadcast in blocks of at most `chunk_cells` (rows x bars), so peak memory does not grow
+    with the grid size. Each horizon reuses the same signals. Each row matches
+    backtest_signals(generate_signals(df, combo)) exactly. Sorted by equity_final, then winrate.
+    """
+    unknown = set(grid) - set(GRID_FIELDS)
+    if unknown:
+        raise ValueError(f"Unsupported grid fields: {sorted(unknown)}")
+    values = {f: list(grid.get(f) or [getattr(params, f)]) for f in GRID_FIELDS}
+    close_s = df["close"].astype(float)
+    close = close_s.to_numpy()
+    ks = np.asarray(values["rsi_bb_k"], dtype=float)
+    bws = np.asarray(values["min_bandwidth"], dtype=float)
+    dists = np.asarray(values["distance_from_mid_min"], dtype=float)
+    htf = _aggregate_htf(df[["open", "high", "low", "close"]], params.higher_tf_factor)
+    pairs = [(bi, di) for bi in range(len(bws)) for di in range(len(dists))]
+    step = max(1, int(chunk_cells) // max(1, len(close)))
+
+    rows: List[Dict[str, Any]] = []
+    for period in values["rsi_period"]:
+        rsi_s = rsi_fn(close_s, int(period))
+        rsi = rsi_s.to_numpy()
+        htf_rsi = rsi_fn(htf["close"], int(period)).reindex(df.index, method="ffill")
+        htf_v = htf_rsi.to_numpy()
+        htf_slope = htf_rsi.diff(params.slope_lookback).to_numpy()
+        for length in values["rsi_bb_length"]:
+            mid_s = rsi_s.rolling(int(length)).mean()
+            sd_s = rsi_s.rolling(int(length)).std()
+            mid = mid_s.to_numpy()
+            for ki, k in enumerate(ks):
+                # mesmas operações de bollinger() (mid + k*sd)
+                up = (mid_s + k * sd_s).to_numpy()
+                lo = (mid_s - k * sd_s).to_numpy()
+                width = up - lo
+                for start in range(0, len(pairs), step):
+                    chunk = pairs[start:start + step]
+                    # (bloco, n): uma linha por (bandwidth, distance)
+                    call, put = _signal_masks(rsi, mid, up, lo, width, htf_v, htf_slope, params,
+                                              min_bandwidth=bws[[bi for bi, _ in chunk]][:, None],
+                                              distance_from_mid_min=dists[[di for _, di in chunk]][:, None])
+                    for j, (bi, di) in enumerate(chunk):
+                        c, p = call[j], put[j]
+                        idx = np.flatnonzero(c | p)
+                        is_call = c[idx]
+                        for horizon in values["horizon"]:
+                            metrics = _outcome_metrics(close, idx, is_call, horizon, params.payout_ratio)
+                            rows.append({
+                                "rsi_period": int(period),
+                                "rsi_bb_length": int(length),
+                                "rsi_bb_k": float(k),
+                                "min_bandwidth": float(bws[bi]),
+                                "distance_from_mid_min": float(dists[di]),
+                                "horizon": int(horizon),
+                                **metrics,
+                            })
+    rows.sort(key=lambda r: (r["equity_final"], r["winrate"]), reverse=True)
+    return rows[:top] if top else rows
@@ -6,12 +6,14 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 import uuid
 from datetime import datetime, date
 import asyncio
 import json
+import pickle
 import time
+from collections import deque
 import numpy as np
 
 # 3rd party realtime
@@ -19,10 +21,17 @@ import websockets
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter
 
 import pandas as pd
-import io
+import itertools
+import functools
 import river_online_model
 import ml_engine
 from ml_stop_loss import MLStopLossPredictor
+from indicator_engine import IndicatorEngine
+from contract_lifecycle import ContractLifecycle
+from history_store import HistoryDownloader
+import jobs
+import model_registry
+from jobs import JobManager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -48,62 +57,11 @@ try:
 except Exception as _de_err:
     deceng = None
 
-# Regime detection and technicals from ml_utils
+# Regime detection from ml_utils (indicadores técnicos: indicator_engine.IndicatorEngine)
 try:
-    from ml_utils import (
-        detect_market_regime,
-        rsi as ta_rsi,
-        macd as ta_macd,
-        bollinger as ta_bollinger,
-        adx as ta_adx,
-        ema as ta_ema,
-        sma as ta_sma,
-    )
+    from ml_utils import detect_market_regime
 except Exception:
     detect_market_regime = None
-    ta_rsi = ta_macd = ta_bollinger = ta_adx = ta_ema = ta_sma = None
-
-# Helper wrappers to use ml_utils (pandas-based) with existing list-based logic
-# These keep our code simple and avoid duplicating indicator implementations
-try:
-    import pandas as _pd
-    def IND_adx_list(high: List[float], low: List[float], close: List[float], period: int = 14):
-        s = ta_adx(_pd.Series(high), _pd.Series(low), _pd.Series(close), period) if ta_adx else _pd.Series([])
-        return s.tolist()
-    def IND_rsi_list(close: List[float], period: int = 14):
-        s = ta_rsi(_pd.Series(close), period) if ta_rsi else _pd.Series([])
-        return s.tolist()
-    def IND_macd_dict_list(close: List[float], fast: int, slow: int, signal: int):
-        if ta_macd:
-            line, sig, hist = ta_macd(_pd.Series(close), fast, slow, signal)
-            return {"line": line.tolist(), "signal": sig.tolist(), "hist": hist.tolist()}
-        return {"line": [], "signal": [], "hist": []}
-    def IND_bollinger_dict(close: List[float], period: int, k: float):
-        if ta_bollinger:
-            mid, up, lo = ta_bollinger(_pd.Series(close), period, k)
-            return {"upper": up.tolist(), "mid": mid.tolist(), "lower": lo.tolist()}
-        return {"upper": [], "mid": [], "lower": []}
-    def IND_sma_last(arr: List[float], n: int) -> Optional[float]:
-        if ta_sma:
-            s = ta_sma(_pd.Series(arr), n)
-            try:
-                v = s.iloc[-1]
-                return float(v) if _pd.notna(v) else None
-            except Exception:
-                return None
-        return None
-except Exception:
-    def IND_adx_list(*args, **kwargs):
-        return []
-    def IND_rsi_list(*args, **kwargs):
-        return []
-    def IND_macd_dict_list(*args, **kwargs):
-        return {"line": [], "signal": [], "hist": []}
-    def IND_bollinger_dict(*args, **kwargs):
-        return {"upper": [], "mid": [], "lower": []}
-    def IND_sma_last(*args, **kwargs):
-        return None
-
 
 # -------------------------------------------------------------
 # Deriv Integration (Demo-ready): WS ticks + proposal/buy + tracking
@@ -168,6 +126,8 @@ class RiskManager:
         self.contracts: Dict[int, Dict[str, Any]] = {}
         self._lock = asyncio.Lock()
         self._selling: set = set()  # Contratos que estão sendo vendidos no momento
+        # contratos abandonados (sem updates) são despejados pelo ciclo de vida do DerivWS
+        deriv.contracts.attach("risk_manager", self.contracts)
 
 
     def _extract_profit(self, poc: Dict[str, Any]) -> float:
@@ -338,7 +298,7 @@ class DerivStatus(BaseModel):
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
-from backtesting_utils import map_timeframe_to_granularity, load_csv_ohlcv, slice_df_date, decision_engine_backtest, append_run_to_results, load_run_from_results
+from backtesting_utils import map_timeframe_to_granularity, load_csv_ohlcv, slice_df_date, decision_engine_backtest, append_run_to_results, load_run_from_results, run_store
 try:
     from optuna_optimizer import optimize_decision_engine
 except Exception:
@@ -404,6 +364,614 @@ class GlobalStats:
 
 _global_stats = GlobalStats()
 
+class CandleStore:
+    """Ring-buffer de candles por (symbol, granularity) compartilhado por todos os consumidores.
+    - Semeado uma única vez via ticks_history (Deriv)
+    - Mantido atualizado com os ticks que chegam em DerivWS._run
+    - Re-semeado apenas quando a série fica sem ticks (ex.: reconexão) ou quando pedem mais candles do que há no buffer
+    """
+    def __init__(self, deriv: "DerivWS", capacity: int = 5000, stale_after: int = 30):
+        self.deriv = deriv
+        self.capacity = capacity
+        self.stale_after = stale_after
+        self.series: Dict[Tuple[str, int], deque] = {}
+        self.last_tick_at: Dict[Tuple[str, int], float] = {}
+        self.seeded_count: Dict[Tuple[str, int], int] = {}
+        self.granularities: Dict[str, set] = {}
+        self._seed_locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "seeds": 0, "ticks": 0}
+
+    async def _fetch_history(self, symbol: str, granularity: int, count: int) -> List[Dict[str, Any]]:
+        return await self.deriv.rpc.ticks_history(symbol, granularity, count)
+
+    def _is_fresh(self, key: Tuple[str, int], count: int) -> bool:
+        dq = self.series.get(key)
+        if dq is None or max(len(dq), self.seeded_count.get(key, 0)) < count:
+            return False
+        last = self.last_tick_at.get(key, 0.0)
+        return (time.time() - last) <= max(self.stale_after, key[1])
+
+    async def get(self, symbol: str, granularity: int, count: int) -> List[Dict[str, Any]]:
+        """Retorna os últimos `count` candles (o último pode estar em formação)."""
+        key = (symbol, int(granularity))
+        if not self._is_fresh(key, count):
+            lock = self._seed_locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                # outro consumidor pode ter semeado enquanto aguardávamos o lock
+                if not self._is_fresh(key, count):
+                    await self._seed(key, count)
+        else:
+            self.stats["hits"] += 1
+        dq = self.series.get(key)
+        if not dq:
+            return []
+        out = list(dq)[-count:] if count < len(dq) else list(dq)
+        # snapshot do candle em formação para que consumidores não vejam mutações posteriores
+        out[-1] = dict(out[-1])
+        return out
+
+    async def _seed(self, key: Tuple[str, int], count: int):
+        symbol, granularity = key
+        current = self.series.get(key)
+        size = max(count, len(current) if current else 0)
+        candles = await self._fetch_history(symbol, granularity, size)
+        self.stats["seeds"] += 1
+        dq: deque = deque(maxlen=max(self.capacity, size))
+        for c in candles:
+            dq.append({
+                "epoch": int(c.get("epoch")),
+                "open": float(c.get("open")),
+                "high": float(c.get("high")),
+                "low": float(c.get("low")),
+                "close": float(c.get("close")),
+            })
+        self.series[key] = dq
+        self.seeded_count[key] = size
+        self.granularities.setdefault(symbol, set()).add(granularity)
+        self.last_tick_at[key] = time.time()
+        try:
+            await self.deriv.ensure_subscribed(symbol)
+        except Exception as e:
+            logger.warning(f"CandleStore: falha ao subscrever ticks de {symbol}: {e}")
+
+    def on_tick(self, symbol: str, epoch: Any, quote: Any):
+        """Atualiza todas as séries do símbolo com um tick (O(1) por granularidade)."""
+        grans = self.granularities.get(symbol)
+        if not grans or epoch is None or quote is None:
+            return
+        ep = int(epoch)
+        price = float(quote)
+        now = time.time()
+        self.stats["ticks"] += 1
+        for g in grans:
+            key = (symbol, g)
+            dq = self.series.get(key)
+            if dq is None:
+                continue
+            bucket = ep - (ep % g)
+            last = dq[-1] if dq else None
+            if last is not None and last["epoch"] == bucket:
+                if price > last["high"]:
+                    last["high"] = price
+                if price < last["low"]:
+                    last["low"] = price
+                last["close"] = price
+            elif last is None or bucket > last["epoch"]:
+                dq.append({"epoch": bucket, "open": price, "high": price, "low": price, "close": price})
+            self.last_tick_at[key] = now
+
+    def invalidate(self):
+        """Marca todas as séries como desatualizadas (ex.: após queda da conexão)."""
+        self.last_tick_at.clear()
+
+
+TICK_POLICIES = ("drop_oldest", "coalesce_latest")
+
+class TickSubscriber:
+    """Fila única (merge de todos os símbolos) de um cliente do hub de ticks.
+    - drop_oldest: buffer FIFO limitado; quando cheio descarta o tick mais antigo
+    - coalesce_latest: mantém apenas o último tick pendente por símbolo
+    """
+    def __init__(self, symbols: List[str], policy: str = "drop_oldest", maxsize: int = 100):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.policy = policy if policy in TICK_POLICIES else "drop_oldest"
+        self.maxsize = max(1, int(maxsize))
+        self._fifo: deque = deque()
+        self._latest: Dict[str, str] = {}
+        self._event = asyncio.Event()
+        self.delivered = 0
+        self.dropped = 0
+
+    def push(self, symbol: str, payload: str):
+        if self.policy == "coalesce_latest":
+            if symbol in self._latest:
+                self.dropped += 1
+            self._latest[symbol] = payload
+        else:
+            if len(self._fifo) >= self.maxsize:
+                self._fifo.popleft()
+                self.dropped += 1
+            self._fifo.append(payload)
+        self._event.set()
+
+    async def next_batch(self, timeout: float) -> List[str]:
+        """Aguarda e drena tudo que estiver pendente (lista vazia em caso de timeout)."""
+        if not self._fifo and not self._latest:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+        if self.policy == "coalesce_latest":
+            batch = list(self._latest.values())
+            self._latest.clear()
+        else:
+            batch = list(self._fifo)
+            self._fifo.clear()
+        self.delivered += len(batch)
+        return batch
+
+
+class TickBroadcastHub:
+    """Barramento de ticks alimentado pelo DerivWS._run (um socket, um json.loads por tick).
+    - clientes WS: cada tick é serializado uma única vez e o texto pré-codificado vai para a fila de cada cliente
+    - listeners in-process (ex.: AutoSelectionBot): callback síncrono com o dict do tick
+    As assinaturas na Deriv são refeitas pelo DerivWS após reconexão."""
+    def __init__(self, deriv: "DerivWS"):
+        self.deriv = deriv
+        self.by_symbol: Dict[str, List[TickSubscriber]] = {}
+        self.listeners: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self.stats: Dict[str, int] = {"published": 0, "fanout": 0, "dropped_departed": 0, "listener_calls": 0, "listener_errors": 0}
+
+    def has_consumers(self, symbol: str) -> bool:
+        return symbol in self.by_symbol or symbol in self.listeners
+
+    async def listen(self, symbols: List[str], callback: Callable[[Dict[str, Any]], None]):
+        for s in dict.fromkeys(symbols):
+            cbs = self.listeners.setdefault(s, [])
+            if callback not in cbs:
+                cbs.append(callback)
+            await self.deriv.ensure_subscribed(s)
+
+    def unlisten(self, symbols: List[str], callback: Callable[[Dict[str, Any]], None]):
+        for s in dict.fromkeys(symbols):
+            cbs = self.listeners.get(s)
+            if not cbs:
+                continue
+            try:
+                cbs.remove(callback)
+            except ValueError:
+                pass
+            if not cbs:
+                self.listeners.pop(s, None)
+
+    async def subscribe(self, symbols: List[str], policy: str = "drop_oldest", maxsize: int = 100) -> TickSubscriber:
+        sub = TickSubscriber(symbols, policy=policy, maxsize=maxsize)
+        for s in sub.symbols:
+            self.by_symbol.setdefault(s, []).append(sub)
+        for s in sub.symbols:
+            await self.deriv.ensure_subscribed(s)
+        return sub
+
+    def unsubscribe(self, sub: TickSubscriber):
+        for s in sub.symbols:
+            subs = self.by_symbol.get(s)
+            if not subs:
+                continue
+            try:
+                subs.remove(sub)
+            except ValueError:
+                pass
+            if not subs:
+                self.by_symbol.pop(s, None)
+        self.stats["dropped_departed"] += sub.dropped
+
+    def publish(self, symbol: str, message: Dict[str, Any]):
+        for cb in list(self.listeners.get(symbol, ())):
+            self.stats["listener_calls"] += 1
+            try:
+                cb(message)
+            except Exception as e:
+                self.stats["listener_errors"] += 1
+                logger.warning(f"Tick listener falhou para {symbol}: {e}")
+        subs = self.by_symbol.get(symbol)
+        if not subs:
+            return
+        payload = json.dumps(message)
+        self.stats["published"] += 1
+        self.stats["fanout"] += len(subs)
+        for sub in subs:
+            sub.push(symbol, payload)
+
+    def snapshot(self) -> Dict[str, Any]:
+        clients = {id(s): s for subs in self.by_symbol.values() for s in subs}.values()
+        return {
+            **self.stats,
+            "clients": len(clients),
+            "symbols": {s: len(v) for s, v in self.by_symbol.items()},
+            "listeners": {s: len(v) for s, v in self.listeners.items()},
+            "dropped_active": sum(c.dropped for c in clients),
+            "policies": {p: sum(1 for c in clients if c.policy == p) for p in TICK_POLICIES},
+        }
+
+class DerivDisconnected(ConnectionError):
+    """Socket da Deriv caiu com a requisição em voo (a resposta nunca chegará)."""
+
+
+class DerivRPC:
+    """Correlação requisição/resposta sobre o socket único do DerivWS.
+    - req_id monotônico por processo: chamadas concorrentes no mesmo milissegundo não colidem em `pending`
+    - deadline por chamada; ao cair o socket os futures órfãos são cancelados na hora (503, sem esperar o timeout)
+    - várias chamadas podem estar em voo ao mesmo tempo (pipeline de proposal/buy/history)"""
+    def __init__(self, deriv: "DerivWS"):
+        self.deriv = deriv
+        self._ids = itertools.count(1)
+        self.last_req_id = 0
+        # req_id -> (tipo da requisição, início, deadline) em time.monotonic()
+        self.inflight: Dict[int, Tuple[str, float, float]] = {}
+        self.stats: Dict[str, int] = {"sent": 0, "completed": 0, "api_errors": 0, "timeouts": 0, "cancelled": 0, "send_failures": 0}
+
+    def next_req_id(self) -> int:
+        self.last_req_id = next(self._ids)
+        return self.last_req_id
+
+    async def call(self, payload: Dict[str, Any], timeout: float = 30.0, what: Optional[str] = None,
+                   error_detail: Optional[str] = None, check: bool = True) -> Dict[str, Any]:
+        """Envia `payload` e aguarda a resposta com o mesmo req_id.
+        HTTPException 503 (desconectado/conexão perdida), 504 (deadline) ou 400 (erro da API, se check)."""
+        what = what or next(iter(payload), "request")
+        if not self.deriv.connected or not self.deriv.ws:
+            raise HTTPException(status_code=503, detail="Deriv not connected")
+        req_id = self.next_req_id()
+        fut = asyncio.get_running_loop().create_future()
+        self.deriv.pending[req_id] = fut
+        started = time.monotonic()
+        self.inflight[req_id] = (what, started, started + timeout)
+        try:
+            try:
+                await self.deriv._send({**payload, "req_id": req_id})
+            except (ConnectionError, websockets.ConnectionClosed) as e:
+                self.stats["send_failures"] += 1
+                raise HTTPException(status_code=503, detail=f"Deriv connection lost sending {what}: {e}")
+            self.stats["sent"] += 1
+            data = await asyncio.wait_for(fut, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HTTPException(status_code=504, detail=f"Timeout waiting for {what}")
+        except DerivDisconnected:
+            raise HTTPException(status_code=503, detail=f"Deriv connection lost waiting for {what}")
+        finally:
+            self.deriv.pending.pop(req_id, None)
+            self.inflight.pop(req_id, None)
+        self.stats["completed"] += 1
+        if data.get("error"):
+            self.stats["api_errors"] += 1
+            if check:
+                raise HTTPException(status_code=400, detail=data["error"].get("message", error_detail or f"{what} error"))
+        return data
+
+    def resolve(self, data: Dict[str, Any]) -> bool:
+        """Chamado pelo loop de leitura: entrega a resposta ao future do req_id (True se consumida)."""
+        req_id = data.get("req_id")
+        if req_id is None:
+            return False
+        fut = self.deriv.pending.pop(req_id, None)
+        if fut is None or fut.done():
+            return False
+        fut.set_result(data)
+        return True
+
+    def cancel_all(self, reason: str = "connection lost"):
+        """Socket caiu: nenhuma resposta pendente chegará pelo novo socket."""
+        pending = list(self.deriv.pending.values())
+        self.deriv.pending.clear()
+        n = 0
+        for fut in pending:
+            if not fut.done():
+                fut.set_exception(DerivDisconnected(reason))
+                n += 1
+        if n:
+            self.stats["cancelled"] += n
+            logger.warning(f"DerivRPC: {n} requisições em voo canceladas ({reason})")
+
+    # ---------------- typed helpers ----------------
+
+    async def ticks_history(self, symbol: str, granularity: int, count: int, timeout: float = 12,
+                            start: int = 1, end: Union[int, str] = "latest", adjust_start_time: int = 1) -> List[Dict[str, Any]]:
+        data = await self.call({
+            "ticks_history": symbol,
+            "adjust_start_time": adjust_start_time,
+            "count": count,
+            "end": end,
+            "start": start,
+            "style": "candles",
+            "granularity": granularity,
+        }, timeout=timeout, what="candles", error_detail="history error")
+        return data.get("candles") or []
+
+    async def contracts_for(self, symbol: str, product_type: Optional[str] = None, currency: Optional[str] = None,
+                            timeout: float = 12) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"contracts_for": symbol}
+        if product_type:
+            payload["product_type"] = product_type
+        if currency:
+            payload["currency"] = currency
+        data = await self.call(payload, timeout=timeout, what="contracts_for")
+        return data.get("contracts_for", {})
+
+    async def proposal(self, payload: Dict[str, Any], timeout: float = 10) -> Dict[str, Any]:
+        data = await self.call({"proposal": 1, **payload}, timeout=timeout, what="proposal")
+        return data.get("proposal", {})
+
+    async def buy(self, proposal_id: str, price: float, timeout: float = 12) -> Dict[str, Any]:
+        data = await self.call({"buy": proposal_id, "price": price}, timeout=timeout, what="buy response", error_detail="buy error")
+        return data.get("buy", {})
+
+    async def sell(self, contract_id: int, price: float = 0, timeout: float = 10) -> Dict[str, Any]:
+        data = await self.call({"sell": contract_id, "price": price}, timeout=timeout, what="sell response", error_detail="Sell error")
+        return data.get("sell", {})
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        by_type: Dict[str, int] = {}
+        for what, _, _ in self.inflight.values():
+            by_type[what] = by_type.get(what, 0) + 1
+        return {
+            **self.stats,
+            "in_flight": len(self.inflight),
+            "in_flight_by_type": by_type,
+            "oldest_in_flight_sec": round(max((now - s for _, s, _ in self.inflight.values()), default=0.0), 3),
+            "past_deadline": sum(1 for _, _, d in self.inflight.values() if now > d),
+            "last_req_id": self.last_req_id,
+        }
+
+
+# 📇 contracts_for muda raramente: cache com TTL (erros da API com TTL curto) e single-flight por chave
+CONTRACTS_FOR_TTL_SEC = float(os.environ.get("CONTRACTS_FOR_TTL_SEC", "3600"))
+CONTRACTS_FOR_ERROR_TTL_SEC = float(os.environ.get("CONTRACTS_FOR_ERROR_TTL_SEC", "60"))
+
+
+class ContractsForCache:
+    """Cache de contracts_for por (symbol, product_type, currency, landing_company).
+    Consultas idênticas concorrentes compartilham uma única requisição à Deriv; rejeições da API (400)
+    também são guardadas (TTL curto) porque os fallbacks do contracts_for_smart as repetem a cada troca de símbolo.
+    Timeouts/desconexão não são cacheados."""
+    def __init__(self, deriv: "DerivWS"):
+        self.deriv = deriv
+        # key -> (expira_em monotonic, contracts_for | HTTPException)
+        self.entries: Dict[Tuple, Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "errors_cached": 0}
+
+    def key_of(self, symbol: str, product_type: Optional[str], currency: Optional[str], landing_company: Optional[str]) -> Tuple:
+        return (symbol, (product_type or "").lower() or None, currency, landing_company or self.deriv.landing_company_name)
+
+    async def _fetch(self, key: Tuple, symbol: str, product_type: Optional[str], currency: Optional[str]) -> Dict[str, Any]:
+        try:
+            cfor = await self.deriv.rpc.contracts_for(symbol, product_type=product_type, currency=currency)
+        except HTTPException as e:
+            if e.status_code == 400:
+                self.entries[key] = (time.monotonic() + CONTRACTS_FOR_ERROR_TTL_SEC, e)
+                self.stats["errors_cached"] += 1
+            raise
+        self.entries[key] = (time.monotonic() + CONTRACTS_FOR_TTL_SEC, cfor)
+        return cfor
+
+    async def get(self, symbol: str, product_type: Optional[str] = None, currency: Optional[str] = None,
+                  landing_company: Optional[str] = None) -> Dict[str, Any]:
+        key = self.key_of(symbol, product_type, currency, landing_company)
+        hit = self.entries.get(key)
+        if hit is not None:
+            if hit[0] > time.monotonic():
+                self.stats["hits"] += 1
+                if isinstance(hit[1], HTTPException):
+                    raise HTTPException(status_code=hit[1].status_code, detail=hit[1].detail)
+                return hit[1]
+            self.entries.pop(key, None)
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.get_running_loop().create_task(self._fetch(key, symbol, product_type, currency))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: um cliente que desiste não cancela a consulta dos demais
+        return await asyncio.shield(task)
+
+    def invalidate(self):
+        """Descarta tudo (ex.: re-authorize em outra conta: landing company/moeda mudaram)."""
+        self.entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "live_entries": sum(1 for exp, _ in self.entries.values() if exp > now),
+            "in_flight": len(self._inflight),
+            "ttl_sec": CONTRACTS_FOR_TTL_SEC,
+        }
+
+
+# ⚡ Proposal pre-fetch: streams de proposal mantidos quentes para o buy não esperar um round-trip
+PROPOSAL_MAX_AGE_SEC = float(os.environ.get("PROPOSAL_MAX_AGE_SEC", "3"))
+PROPOSAL_IDLE_SEC = float(os.environ.get("PROPOSAL_IDLE_SEC", "300"))
+PROPOSAL_MAX_STREAMS = int(os.environ.get("PROPOSAL_MAX_STREAMS", "16"))
+
+
+class ProposalCache:
+    """Streams `proposal` (subscribe=1) por (symbol, contract_type, duration, duration_unit, stake, currency).
+    Cada update do stream traz um id novo; `get` entrega o mais recente ainda fresco (uso único) e só cai para
+    um proposal avulso quando não há id válido. Streams ociosos ou além do limite são esquecidos na Deriv."""
+    def __init__(self, deriv: "DerivWS"):
+        self.deriv = deriv
+        self.entries: Dict[Tuple, Dict[str, Any]] = {}
+        self.by_sub: Dict[str, Tuple] = {}
+        self._warming: Dict[Tuple, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stale": 0, "stream_updates": 0, "subscribes": 0,
+                                      "subscribe_errors": 0, "forgets": 0, "refreshes": 0}
+
+    @staticmethod
+    def key_of(payload: Dict[str, Any]) -> Tuple:
+        return (payload["symbol"], payload["contract_type"], int(payload["duration"]), payload["duration_unit"],
+                float(payload["amount"]), payload["currency"])
+
+    def _store(self, key: Tuple, data: Dict[str, Any]):
+        p = data.get("proposal") or {}
+        if not p.get("id"):
+            return
+        e = self.entries.setdefault(key, {"last_used": time.monotonic()})
+        e["proposal"] = {"id": p.get("id"), "payout": p.get("payout"), "ask_price": p.get("ask_price"), "spot": p.get("spot")}
+        e["received_at"] = time.monotonic()
+        sub_id = (data.get("subscription") or {}).get("id")
+        if sub_id and sub_id != e.get("sub_id"):
+            e["sub_id"] = sub_id
+            self.by_sub[sub_id] = key
+
+    def on_stream(self, data: Dict[str, Any]):
+        """Updates do stream (a primeira resposta já foi entregue ao RPC pelo req_id)."""
+        key = self.by_sub.get((data.get("subscription") or {}).get("id"))
+        if key is None:
+            return
+        if data.get("error"):
+            self._drop(key, forget=False)
+            return
+        self.stats["stream_updates"] += 1
+        self._store(key, data)
+
+    def _drop(self, key: Tuple, forget: bool = True):
+        e = self.entries.pop(key, None) or {}
+        sub_id = e.get("sub_id")
+        if sub_id:
+            self.by_sub.pop(sub_id, None)
+            if forget and self.deriv.connected:
+                self.stats["forgets"] += 1
+                asyncio.get_running_loop().create_task(self._forget(sub_id))
+
+    async def _forget(self, sub_id: str):
+        try:
+            await self.deriv._send({"forget": sub_id})
+        except Exception as e:
+            logger.debug(f"Forget do proposal stream {sub_id} falhou: {e}")
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, e in self.entries.items() if now - e["last_used"] > PROPOSAL_IDLE_SEC]:
+            self._drop(key)
+        if len(self.entries) > PROPOSAL_MAX_STREAMS:
+            lru = sorted(self.entries, key=lambda k: self.entries[k]["last_used"])
+            for key in lru[: len(self.entries) - PROPOSAL_MAX_STREAMS]:
+                self._drop(key)
+
+    async def _subscribe(self, key: Tuple):
+        symbol, contract_type, duration, duration_unit, amount, currency = key
+        self.stats["subscribes"] += 1
+        data = await self.deriv.rpc.call({
+            "proposal": 1,
+            "amount": amount,
+            "basis": "stake",
+            "contract_type": contract_type,
+            "currency": currency,
+            "duration": duration,
+            "duration_unit": duration_unit,
+            "symbol": symbol,
+            "subscribe": 1,
+        }, timeout=10, what="proposal")
+        self._store(key, data)
+        self._evict()
+
+    async def _ensure_stream(self, key: Tuple):
+        e = self.entries.get(key)
+        if e and e.get("sub_id"):
+            return
+        task = self._warming.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._subscribe(key))
+            self._warming[key] = task
+            task.add_done_callback(lambda _t, k=key: self._warming.pop(k, None))
+        await asyncio.shield(task)
+
+    def keep_warm(self, payload: Dict[str, Any]):
+        """Marca a tupla como ativa e abre o stream em background, se ainda não existir."""
+        key = self.key_of(payload)
+        e = self.entries.get(key)
+        if e:
+            e["last_used"] = time.monotonic()
+        if (e and e.get("sub_id")) or key in self._warming or not self.deriv.connected:
+            return
+
+        async def _warm():
+            try:
+                await self._ensure_stream(key)
+            except Exception as ex:
+                self.stats["subscribe_errors"] += 1
+                logger.warning(f"Proposal stream {key} indisponível: {getattr(ex, 'detail', ex)}")
+
+        asyncio.get_running_loop().create_task(_warm())
+
+    def take(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self.key_of(payload)
+        e = self.entries.get(key)
+        if not e:
+            return None
+        now = time.monotonic()
+        e["last_used"] = now
+        p = e.get("proposal")
+        if not p:
+            return None
+        age = now - e["received_at"]
+        if age > PROPOSAL_MAX_AGE_SEC:
+            self.stats["stale"] += 1
+            if age > 10 * PROPOSAL_MAX_AGE_SEC:
+                # stream parou de mandar updates: reabre no próximo uso
+                self._drop(key)
+            return None
+        e["proposal"] = None  # id é de uso único; o próximo update do stream traz outro
+        return p
+
+    async def get(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """(proposal, veio_do_cache). Sem id fresco: abre o stream (a 1ª resposta já serve) ou faz proposal avulso."""
+        p = self.take(payload)
+        if p:
+            self.stats["hits"] += 1
+            return p, True
+        self.stats["misses"] += 1
+        key = self.key_of(payload)
+        e = self.entries.get(key)
+        if not (e and e.get("sub_id")):
+            try:
+                await self._ensure_stream(key)
+                p = self.take(payload)
+                if p:
+                    return p, False
+            except HTTPException as ex:
+                if ex.status_code == 400:
+                    raise
+                self.stats["subscribe_errors"] += 1
+        return await self.deriv.rpc.proposal(payload), False
+
+    def on_disconnect(self):
+        """Streams morrem com o socket."""
+        self.entries.clear()
+        self.by_sub.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "streams": [
+                {"symbol": k[0], "contract_type": k[1], "duration": k[2], "duration_unit": k[3], "stake": k[4], "currency": k[5],
+                 "fresh": bool(e.get("proposal")) and now - e.get("received_at", 0) <= PROPOSAL_MAX_AGE_SEC,
+                 "age_sec": round(now - e["received_at"], 3) if "received_at" in e else None,
+                 "idle_sec": round(now - e["last_used"], 3)}
+                for k, e in self.entries.items()
+            ],
+            "warming": len(self._warming),
+            "max_age_sec": PROPOSAL_MAX_AGE_SEC,
+        }
+
+
 class DerivWS:
     """Minimal Deriv WS manager with auto reconnect, dispatcher, tick and contract broadcasting."""
     def __init__(self, app_id: Optional[str], token: Optional[str], ws_url: str):
@@ -419,21 +987,31 @@ class DerivWS:
         self.queues: Dict[str, List[asyncio.Queue]] = {}
         # contract tracking: contract_id -> list of queues
         self.contract_queues: Dict[int, List[asyncio.Queue]] = {}
-        self.contract_subscribed: Dict[int, bool] = {}
+        # ♻️ Estado por contrato com ciclo de vida (despejo após expiração/TTL, forget da assinatura)
+        self.contracts = ContractLifecycle()
+        self.contracts.attach_queues(self.contract_queues)
+        self.contract_subscribed: Dict[int, bool] = self.contracts.subscribed
         self.last_heartbeat: Optional[int] = None
         self._lock = asyncio.Lock()
-        # pending req_id -> Future
-        self.pending: Dict[str, asyncio.Future] = {}
+        # pending req_id -> Future (req_ids monotônicos alocados pelo DerivRPC)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.rpc = DerivRPC(self)
+        self.proposals = ProposalCache(self)
+        self.contracts_for = ContractsForCache(self)
         # store last authorize details (for landing_company/currency defaults)
         self.last_authorize: Dict[str, Any] = {}
         self.landing_company_name: Optional[str] = None
         self.currency: Optional[str] = None
         # avoid double-learning per contract
-        self._river_learned: Dict[int, bool] = {}
+        self._river_learned: Dict[int, bool] = self.contracts.river_learned
         # avoid double-counting stats per contract
-        self.stats_recorded: Dict[int, bool] = {}
+        self.stats_recorded: Dict[int, bool] = self.contracts.stats_recorded
         # 🛡️ STOP LOSS DINÂMICO: Cache de dados de contratos para monitoramento
-        self.last_contract_data: Dict[int, Dict[str, Any]] = {}
+        self.last_contract_data: Dict[int, Dict[str, Any]] = self.contracts.last_data
+        # candles compartilhados (ring-buffer por símbolo/granularidade) alimentados pelos ticks
+        self.candle_store = CandleStore(self)
+        # hub de broadcast para clientes /api/ws/ticks (serializa cada tick uma única vez)
+        self.tick_hub = TickBroadcastHub(self)
 
     def _build_uri(self) -> str:
         if not self.app_id:
@@ -475,53 +1053,46 @@ class DerivWS:
         """
         if not self.ws or not self.connected:
             return None
-            
-        # Gerar req_id único (inteiro, conforme validação da Deriv)
-        req_id = int(time.time() * 1000)
-        payload["req_id"] = req_id
-        
-        # Criar future para aguardar resposta
-        future = asyncio.Future()
-        self.pending[req_id] = future
-        
         try:
-            await self._send(payload)
-            response = await asyncio.wait_for(future, timeout=timeout)
-            return response
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout aguardando resposta para req_id {req_id}")
+            # respostas com "error" são devolvidas ao chamador (check=False)
+            return await self.rpc.call(payload, timeout=timeout, check=False)
+        except HTTPException as e:
+            logger.warning(f"_send_and_wait: {e.detail}")
             return None
         except Exception as e:
             logger.error(f"Erro em _send_and_wait: {e}")
             return None
-        finally:
-            self.pending.pop(req_id, None)
+
+    def _on_authorize(self, data: Dict[str, Any]):
+        self.authenticated = data.get("error") is None
+        if self.authenticated:
+            auth = data.get("authorize", {})
+            self.last_authorize = auth
+            account = (auth.get("landing_company_name") or auth.get("landing_company_fullname"), auth.get("currency"))
+            if account != (self.landing_company_name, self.currency):
+                # conta mudou: ofertas/erros em cache eram da conta anterior
+                self.contracts_for.invalidate()
+            self.landing_company_name, self.currency = account
+        logger.info(f"Authorize status: {self.authenticated}")
 
     async def _run(self):
         while True:
             try:
                 await self._connect()
+                await self._resubscribe()
                 async for raw in self.ws:
                     data = json.loads(raw)
                     msg_type = data.get("msg_type")
-                    req_id = data.get("req_id")
-                    if req_id is not None and req_id in self.pending:
-                        fut = self.pending.pop(req_id)
-                        if not fut.done():
-                            fut.set_result(data)
-                            continue
+                    if self.rpc.resolve(data):
+                        continue
                     if msg_type == "authorize":
-                        self.authenticated = data.get("error") is None
-                        if self.authenticated:
-                            auth = data.get("authorize", {})
-                            self.last_authorize = auth
-                            self.landing_company_name = auth.get("landing_company_name") or auth.get("landing_company_fullname")
-                            self.currency = auth.get("currency")
-                        logger.info(f"Authorize status: {self.authenticated}")
+                        self._on_authorize(data)
                     elif msg_type == "tick":
                         tick = data.get("tick", {})
                         symbol = tick.get("symbol")
-                        if symbol and symbol in self.queues:
+                        if symbol:
+                            self.candle_store.on_tick(symbol, tick.get("epoch"), tick.get("quote"))
+                        if symbol and (symbol in self.queues or self.tick_hub.has_consumers(symbol)):
                             message = {
                                 "type": "tick",
                                 "symbol": symbol,
@@ -530,6 +1101,7 @@ class DerivWS:
                                 "ask": tick.get("ask"),
                                 "bid": tick.get("bid"),
                             }
+                            self.tick_hub.publish(symbol, message)
                             for q in list(self.queues.get(symbol, [])):
                                 if not q.full():
                                     q.put_nowait(message)
@@ -579,7 +1151,8 @@ class DerivWS:
                                 _strategy._remove_active_contract(cid_int)
                         # Online learning (River) pós-trade: quando expira e ainda não aprendemos
                         try:
-                            if cid_int is not None and bool(poc.get("is_expired")) and not self._river_learned.get(cid_int):
+                            if (cid_int is not None and bool(poc.get("is_expired")) and not self._river_learned.get(cid_int)
+                                    and not self.contracts.is_settled(cid_int)):
                                 # Extrair label a partir do lucro
                                 profit = float(poc.get("profit") or 0.0)
                                 label = 1 if profit > 0 else 0
@@ -594,15 +1167,16 @@ class DerivWS:
                                 v = 0.0
                                 ts = datetime.utcnow().isoformat()
                                 # Atualizar River com (features no momento) + label via next_close
-                                m = _get_river_model()
-                                _ = m.predict_and_update(ts, o, h, low_spot, c, v, next_close=(c + 1e-12 if label == 1 else c - 1e-12))
-                                m.save()
+                                # janela rolante própria do ativo do contrato
+                                _river_learn(ts, o, h, low_spot, c, v, next_close=(c + 1e-12 if label == 1 else c - 1e-12),
+                                             key=poc.get("underlying"))
                                 self._river_learned[cid_int] = True
                         except Exception as le:
                             logger.warning(f"River post-trade learn failed: {le}")
                         # Atualiza estatísticas globais quando contrato expira
                         try:
-                            if cid_int is not None and bool(poc.get("is_expired")) and not self.stats_recorded.get(cid_int):
+                            if (cid_int is not None and bool(poc.get("is_expired")) and not self.stats_recorded.get(cid_int)
+                                    and not self.contracts.is_settled(cid_int)):
                                 profit = float(poc.get("profit") or 0.0)
                                 _global_stats.add_contract_result(cid_int, profit)
                                 self.stats_recorded[cid_int] = True
@@ -619,7 +1193,23 @@ class DerivWS:
                                 await _risk.on_contract_update(cid_int, poc)
                         except Exception as re:
                             logger.error(f"❌ RiskManager update erro para contrato {cid_int}: {re}", exc_info=True)
-
+                        # ♻️ Ciclo de vida: marca fim do contrato, esquece a assinatura e despeja estado antigo
+                        try:
+                            forgets: List[str] = []
+                            if cid_int is not None:
+                                self.contracts.touch(cid_int, (data.get("subscription") or {}).get("id"))
+                                if bool(poc.get("is_expired")) or bool(poc.get("is_sold")):
+                                    sub_id = self.contracts.finish(cid_int)
+                                    if sub_id:
+                                        forgets.append(sub_id)
+                            forgets.extend(self.contracts.sweep())
+                            for sub_id in forgets:
+                                await self._send({"forget": sub_id})
+                        except Exception as ce:
+                            logger.warning(f"Contract lifecycle erro para contrato {cid_int}: {ce}")
+
+                    elif msg_type == "proposal":
+                        self.proposals.on_stream(data)
                     elif msg_type == "heartbeat":
                         self.last_heartbeat = int(time.time())
                     elif msg_type == "error":
@@ -628,14 +1218,29 @@ class DerivWS:
                 logger.warning(f"WS loop error, will reconnect: {e}")
                 self.connected = False
                 self.authenticated = False
+                self.candle_store.invalidate()
+                self.contracts.on_disconnect()
                 await asyncio.sleep(2)
             finally:
+                # respostas a requisições do socket antigo nunca chegarão
+                self.rpc.cancel_all()
+                self.proposals.on_disconnect()
                 try:
                     if self.ws:
                         await self.ws.close()
                 except Exception:
                     pass
 
+    async def _resubscribe(self):
+        """Após (re)conexão: as assinaturas antigas morreram com o socket; refaz todas as de ticks."""
+        async with self._lock:
+            symbols = list(self.subscribed_symbols)
+            self.subscribed_symbols.clear()
+        for s in symbols:
+            await self.ensure_subscribed(s)
+        if symbols:
+            logger.info(f"Ticks re-subscritos após conexão: {symbols}")
+
     async def ensure_subscribed(self, symbol: str):
         if symbol not in SUPPORTED_SYMBOLS:
             # Allow dynamic, but log
@@ -680,22 +1285,58 @@ class DerivWS:
                 self.contract_queues[contract_id].remove(q)
             except ValueError:
                 pass
+            self.contracts.drop_queue_if_empty(contract_id)
 
 # Single global instance
 _deriv = DerivWS(DERIV_APP_ID, DERIV_API_TOKEN, DERIV_WS_URL)
 
 # 🤖 ML Stop Loss Predictor - Instância global
 _ml_stop_loss = MLStopLossPredictor()
+_deriv.contracts.attach("ml_stop_loss_history", _ml_stop_loss.contract_history)
+# dedupe de resultados do GlobalStats: despejado junto com o contrato (a lápide evita recontagem)
+_deriv.contracts.attach("global_stats_recorded", _global_stats._recorded_contracts)
+
+# 📚 Histórico paginado e persistido (treino/backtests): só o que falta no store é baixado a cada chamada
+async def _fetch_history_page(symbol: str, granularity: int, start: Optional[int], end: int, count: int) -> List[Dict[str, Any]]:
+    # start=1: os últimos `count` candles até end (como o ticks_history count=N end=latest original)
+    return await _deriv.rpc.ticks_history(symbol, granularity, count, timeout=30, start=start or 1, end=end, adjust_start_time=0)
+
+_history = HistoryDownloader(_fetch_history_page)
+
+# ⚙️ Jobs pesados (treino/backtest) em ProcessPoolExecutor, fora do event loop do DerivWS
+_jobs = JobManager()
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+
+async def _run_job(kind: str, fn, *args, background: bool = False, on_result=None, meta: Optional[Dict[str, Any]] = None):
+    """Executa fn(*args) no pool de processos.
+    background=True retorna imediatamente {job_id, kind, status}; caso contrário aguarda o resultado
+    sem bloquear o event loop (tick fan-out, RiskManager e contratos seguem rodando)."""
+    job_id = _jobs.submit(kind, fn, *args, on_result=on_result, meta=meta)
+    if background:
+        return JobSubmitted(job_id=job_id, kind=kind, status="queued")
+    return await _jobs.wait(job_id)
 
 @app.on_event("startup")
 async def _startup():
     await _deriv.start()
+    try:
+        n = _ml_registry.scan()
+        if n:
+            logger.info(f"ML Engine registry: {n} artefatos indexados")
+    except Exception as e:
+        logger.warning(f"ML Engine registry scan falhou: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     if client:
         client.close()
     await _deriv.stop()
+    _jobs.shutdown()
+    _river_persistence.stop(flush=True)
 
 # ------------------- Public API -----------------------------
 @api_router.get("/")
@@ -724,27 +1365,9 @@ async def deriv_status():
 async def deriv_contracts_for(symbol: str, currency: Optional[str] = None, product_type: Optional[str] = None, landing_company: Optional[str] = None):
     """Wrapper para Deriv contracts_for: retorna apenas lista de contract_types.
     Aceita product_type opcional (basic/multipliers/turbos/accumulator). Muitas contas DEMO aceitam apenas 'basic'.
+    Respostas ficam em cache (TTL) e consultas idênticas simultâneas são coalescidas.
     """
-    req_id = int(time.time() * 1000)
-    fut = asyncio.get_running_loop().create_future()
-    _deriv.pending[req_id] = fut
-    payload = {
-        "contracts_for": symbol,
-        "req_id": req_id,
-    }
-    if product_type:
-        payload["product_type"] = product_type
-    if currency:
-        payload["currency"] = currency
-    await _deriv._send(payload)
-    try:
-        data = await asyncio.wait_for(fut, timeout=12)
-    except asyncio.TimeoutError:
-        _deriv.pending.pop(req_id, None)
-        raise HTTPException(status_code=504, detail="Timeout waiting for contracts_for")
-    if data.get("error"):
-        raise HTTPException(status_code=400, detail=data["error"].get("message", "contracts_for error"))
-    cfor = data.get("contracts_for", {})
+    cfor = await _deriv.contracts_for.get(symbol, product_type=product_type, currency=currency, landing_company=landing_company)
     types: List[str] = []
     for item in (cfor.get("available") or []):
         for t in (item.get("contract_types") or []):
@@ -762,8 +1385,10 @@ async def deriv_contracts_for_smart(symbol: str, currency: Optional[str] = None,
     """Smart helper: tenta com o product_type pedido; se rejeitado ou sem tipos esperados,
     faz fallback automático para 'basic' e/ou para o alias _1HZ do símbolo.
     Retorna estrutura com tried, first_supported e results.
+    As sondagens rodam em paralelo (com cache); a precedência entre elas é a mesma da versão sequencial.
     """
     desired = (product_type or "basic").lower()
+    advanced = desired in {"accumulator", "turbos", "multipliers"}
 
     def types_match_for_product(res: Dict[str, Any]) -> bool:
         if not isinstance(res, dict):
@@ -792,32 +1417,41 @@ async def deriv_contracts_for_smart(symbol: str, currency: Optional[str] = None,
         except HTTPException as e:
             return {"error": e.detail}
 
+    alt = f"{symbol}_1HZ" if symbol.startswith("R_") and not symbol.endswith("_1HZ") else None
+    probes: Dict[str, Any] = {symbol: query(symbol)}
+    if advanced:
+        probes[symbol + "#basic"] = query_basic(symbol)
+    if alt:
+        probes[alt] = query(alt)
+        if advanced:
+            probes[alt + "#basic"] = query_basic(alt)
+    answers = dict(zip(probes, await asyncio.gather(*probes.values())))
+
     tried: List[str] = []
     results: Dict[str, Any] = {}
 
     # 1) símbolo solicitado
-    res0 = await query(symbol)
+    res0 = answers[symbol]
     tried.append(symbol)
     results[symbol] = res0
     chosen_symbol: Optional[str] = symbol if types_match_for_product(res0) else None
 
     # 2) fallback: basic
-    if chosen_symbol is None and desired in {"accumulator", "turbos", "multipliers"}:
-        res_basic = await query_basic(symbol)
+    if chosen_symbol is None and advanced:
+        res_basic = answers[symbol + "#basic"]
         results[symbol + "#basic"] = res_basic
         if types_match_for_product(res_basic):
             chosen_symbol = symbol
 
     # 3) fallback: _1HZ
-    if chosen_symbol is None and symbol.startswith("R_") and not symbol.endswith("_1HZ"):
-        alt = f"{symbol}_1HZ"
-        res_alt = await query(alt)
+    if chosen_symbol is None and alt:
+        res_alt = answers[alt]
         tried.append(alt)
         results[alt] = res_alt
         if types_match_for_product(res_alt):
             chosen_symbol = alt
-        elif desired in {"accumulator", "turbos", "multipliers"}:
-            res_alt_basic = await query_basic(alt)
+        elif advanced:
+            res_alt_basic = answers[alt + "#basic"]
             results[alt + "#basic"] = res_alt_basic
             if types_match_for_product(res_alt_basic):
                 chosen_symbol = alt
@@ -848,7 +1482,7 @@ class StrategyAuditResponse(BaseModel):
 
 @api_router.post("/strategies/audit")
 async def strategies_audit(req: StrategyAuditRequest):
-    """Executa um audit/backtest simples usando dados locais CSV (se existir) e salva métricas em backtests/results.json.
+    """Executa um audit/backtest simples usando dados locais CSV (se existir) e salva métricas em backtests/runs.jsonl.
     Para decision_engine, usa WeightedVotingDecisionEngine com pesos de config atual.
     """
     # 1) Tentar CSV local
@@ -857,7 +1491,7 @@ async def strategies_audit(req: StrategyAuditRequest):
         # fallback: obter candles via Deriv para permitir teste rápido mesmo sem CSVs
         try:
             gran = map_timeframe_to_granularity(req.timeframe)
-            candles = await _strategy._get_candles(req.symbol, gran, 1200)
+            candles = await _history.get(req.symbol, gran, 1200)
             if not candles or len(candles) < 100:
                 raise HTTPException(status_code=400, detail="Dados insuficientes para audit")
             df = pd.DataFrame(candles)
@@ -878,8 +1512,10 @@ async def strategies_audit(req: StrategyAuditRequest):
         if deceng is None:
             raise HTTPException(status_code=500, detail="Decision engine indisponível")
         cfg = deceng.load_config()
+        # um engine para o backtest inteiro (estratégias construídas uma vez)
+        engine = deceng.WeightedVotingDecisionEngine(cfg)
         def make_engine(_cfg=None):
-            return deceng.WeightedVotingDecisionEngine(cfg)
+            return engine
     else:
         raise HTTPException(status_code=400, detail=f"Estratégia não suportada: {req.strategyId}")
     # 4) Rodar backtest
@@ -910,35 +1546,29 @@ async def strategies_audit(req: StrategyAuditRequest):
         symbol=req.symbol,
         timeframe=req.timeframe,
         metrics=record["metrics"],
-        saved_to=str(Path(__file__).parent / "backtests" / "results.json"),
+        saved_to=str(run_store().path),
         created_at=record["created_at"],
     )
 
 @api_router.get("/strategies/report")
-async def strategies_report(id: Optional[str] = None):
-    """Retorna relatório consolidado. Se id for fornecido, retorna o run específico; caso contrário, todos os runs."""
+async def strategies_report(id: Optional[str] = None, offset: int = 0, limit: int = 100):
+    """Retorna relatório consolidado. Se id for fornecido, retorna o run específico; caso contrário,
+    uma página dos runs (mais recentes primeiro) com o total armazenado."""
     if id:
         run = load_run_from_results(id)
         if not run:
             raise HTTPException(status_code=404, detail="Run não encontrado")
         return run
-    # retornar tudo
+    limit = max(1, min(int(limit), 1000))
+    offset = max(0, int(offset))
     try:
-        import json
-        p = Path(__file__).parent / "backtests" / "results.json"
-        return json.loads(p.read_text())
+        store = run_store()
+        return {"runs": store.list_runs(offset=offset, limit=limit), "total": store.count(), "offset": offset, "limit": limit}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao ler resultados: {e}")
 
-@api_router.post("/deriv/proposal")
-async def deriv_proposal(req: BuyRequest):
-    if not _deriv.connected:
-        raise HTTPException(status_code=503, detail="Deriv not connected")
-    req_id = int(time.time() * 1000)
-    fut = asyncio.get_running_loop().create_future()
-    _deriv.pending[req_id] = fut
-    payload = {
-        "proposal": 1,
+def _proposal_payload(req: BuyRequest) -> Dict[str, Any]:
+    return {
         "amount": req.stake,
         "basis": "stake",
         "contract_type": req.contract_type or ("CALL" if (req.extra or {}).get("side") == "RISE" else "PUT"),
@@ -946,17 +1576,13 @@ async def deriv_proposal(req: BuyRequest):
         "duration": req.duration,
         "duration_unit": req.duration_unit or "t",
         "symbol": req.symbol,
-        "req_id": req_id,
     }
-    await _deriv._send(payload)
-    try:
-        data = await asyncio.wait_for(fut, timeout=10)
-    except asyncio.TimeoutError:
-        _deriv.pending.pop(req_id, None)
-        raise HTTPException(status_code=504, detail="Timeout waiting for proposal")
-    if data.get("error"):
-        raise HTTPException(status_code=400, detail=data["error"].get("message", "proposal error"))
-    p = data.get("proposal", {})
+
+@api_router.post("/deriv/proposal")
+async def deriv_proposal(req: BuyRequest):
+    if not _deriv.connected:
+        raise HTTPException(status_code=503, detail="Deriv not connected")
+    p = await _deriv.rpc.proposal(_proposal_payload(req))
     return {
         "id": p.get("id"),
         "payout": p.get("payout"),
@@ -968,27 +1594,23 @@ async def deriv_proposal(req: BuyRequest):
 async def deriv_buy(req: BuyRequest):
     if not _deriv.connected:
         raise HTTPException(status_code=503, detail="Deriv not connected")
-    # 1) proposal primeiro para obter id
-    prop = await deriv_proposal(req)
+    # 1) proposal: id mais recente do stream pré-assinado (sem round-trip) ou proposal novo
+    prop, cached = await _deriv.proposals.get(_proposal_payload(req))
     if not prop.get("id"):
         raise HTTPException(status_code=400, detail="No proposal id")
     # 2) buy
-    req_id = int(time.time() * 1000)
-    fut = asyncio.get_running_loop().create_future()
-    _deriv.pending[req_id] = fut
-    await _deriv._send({
-        "buy": prop["id"],
-        "price": req.stake,
-        "req_id": req_id,
-    })
     try:
-        data = await asyncio.wait_for(fut, timeout=12)
-    except asyncio.TimeoutError:
-        _deriv.pending.pop(req_id, None)
-        raise HTTPException(status_code=504, detail="Timeout waiting for buy response")
-    if data.get("error"):
-        raise HTTPException(status_code=400, detail=data["error"].get("message", "buy error"))
-    b = data.get("buy", {})
+        b = await _deriv.rpc.buy(prop["id"], req.stake)
+    except HTTPException as e:
+        if not cached or e.status_code != 400:
+            raise
+        # id do stream pode ter vencido entre o update e o buy: refaz com proposal novo
+        _deriv.proposals.stats["refreshes"] += 1
+        logger.info(f"Proposal em cache recusado ({e.detail}); refazendo com proposal novo")
+        prop = await deriv_proposal(req)
+        if not prop.get("id"):
+            raise HTTPException(status_code=400, detail="No proposal id")
+        b = await _deriv.rpc.buy(prop["id"], req.stake)
     cid = b.get("contract_id")
     # Garante que começaremos a acompanhar o contrato para emitir sinais de expiração/profit
     try:
@@ -1017,22 +1639,7 @@ async def deriv_buy(req: BuyRequest):
 async def deriv_sell(req: SellRequest):
     if not _deriv.connected:
         raise HTTPException(status_code=503, detail="Deriv not connected")
-    req_id = int(time.time() * 1000)
-    fut = asyncio.get_running_loop().create_future()
-    _deriv.pending[req_id] = fut
-    await _deriv._send({
-        "sell": req.contract_id,
-        "price": req.price or 0,
-        "req_id": req_id,
-    })
-    try:
-        data = await asyncio.wait_for(fut, timeout=10)
-    except asyncio.TimeoutError:
-        _deriv.pending.pop(req_id, None)
-        raise HTTPException(status_code=504, detail="Timeout waiting for sell response")
-    if data.get("error"):
-        raise HTTPException(status_code=400, detail=data["error"].get("message", "Sell error"))
-    s = data.get("sell", {})
+    s = await _deriv.rpc.sell(req.contract_id, req.price or 0)
     return {"message": "sold", "contract_id": s.get("contract_id"), "sold_for": s.get("sold_for")}
 
 # -------------------- Strategy Runner (Paper/Live) -----------------------
@@ -1096,168 +1703,6 @@ class StrategyStatus(BaseModel):
     win_rate: float = 0.0
     global_daily_pnl: float = 0.0
 
-# ---- indicator helpers (python versions) ----
-
-def _sma(arr: List[float], n: int, i: Optional[int] = None) -> Optional[float]:
-    if i is None:
-        i = len(arr)
-    if i - n < 0:
-        return None
-    seg = arr[i - n:i]
-    return sum(seg) / n if seg else None
-
-
-def _ema(arr: List[float], period: int) -> Optional[float]:
-    """Calculate EMA and return the last value"""
-    if len(arr) < period:
-        return None
-    ema_series = _ema_series(arr, period)
-    return next((x for x in reversed(ema_series) if x is not None), None)
-
-
-def _ema_series(arr: List[float], period: int) -> List[Optional[float]]:
-    if len(arr) == 0:
-        return []
-    k = 2 / (period + 1)
-    out: List[Optional[float]] = [None] * len(arr)
-    if len(arr) < period:
-        return out
-    ema = sum(arr[:period]) / period
-    out[period - 1] = ema
-    for i in range(period, len(arr)):
-        ema = arr[i] * k + ema * (1 - k)
-        out[i] = ema
-    return out
-
-
-def _rsi(close: List[float], period: int = 14) -> List[Optional[float]]:
-    n = len(close)
-    out: List[Optional[float]] = [None] * n
-    if n <= period:
-        return out
-    gains = 0.0
-    losses = 0.0
-    for i in range(1, period + 1):
-        ch = close[i] - close[i - 1]
-        if ch >= 0:
-            gains += ch
-        else:
-            losses -= ch
-    avg_g = gains / period
-    avg_l = losses / period
-    rs = 100 if avg_l == 0 else (avg_g / avg_l)
-    out[period] = 100 - (100 / (1 + rs))
-    for i in range(period + 1, n):
-        ch = close[i] - close[i - 1]
-        avg_g = (avg_g * (period - 1) + max(ch, 0)) / period
-        avg_l = (avg_l * (period - 1) + max(-ch, 0)) / period
-        rs = 100 if avg_l == 0 else (avg_g / avg_l)
-        out[i] = 100 - (100 / (1 + rs))
-    return out
-
-
-def _ema_series_from_list(arr: List[Optional[float]], period: int) -> List[Optional[float]]:
-    # helper for MACD when there are None values
-    clean = [x if x is not None else 0.0 for x in arr]
-    return _ema_series(clean, period)
-
-
-def _macd(close: List[float], f: int, s: int, sig: int):
-    emaF = _ema_series(close, f)
-    emaS = _ema_series(close, s)
-    line: List[Optional[float]] = []
-    for i in range(len(close)):
-        a = emaF[i] if i < len(emaF) else None
-        b = emaS[i] if i < len(emaS) else None
-        line.append((a - b) if (a is not None and b is not None) else None)
-    # replace None with 0 for signal EMA input
-    line_for_sig = [x if x is not None else 0.0 for x in line]
-    sigSeries = _ema_series(line_for_sig, sig)
-    hist: List[Optional[float]] = []
-    for i in range(len(line)):
-        s_v = sigSeries[i] if i < len(sigSeries) else None
-        hist.append((line[i] - s_v) if (line[i] is not None and s_v is not None) else None)
-    return {"line": line, "signal": sigSeries, "hist": hist}
-
-
-def _bollinger(close: List[float], period: int = 20, k: float = 2.0):
-    n = len(close)
-    mid: List[Optional[float]] = [None] * n
-    upper: List[Optional[float]] = [None] * n
-    lower: List[Optional[float]] = [None] * n
-    for i in range(period - 1, n):
-        seg = close[i - period + 1:i + 1]
-        m = sum(seg) / period
-        var = sum((x - m) ** 2 for x in seg) / period
-        sd = var ** 0.5
-        mid[i] = m
-        upper[i] = m + k * sd
-        lower[i] = m - k * sd
-    return {"upper": upper, "mid": mid, "lower": lower}
-
-
-def _true_range(h: float, low: float, pc: float) -> float:
-    return max(h - low, abs(h - pc), abs(low - pc))
-
-
-def _rma(arr: List[float], p: int) -> List[Optional[float]]:
-    if len(arr) == 0:
-        return []
-    out: List[Optional[float]] = [None] * len(arr)
-    if len(arr) < p:
-        return out
-    a = sum(arr[:p])
-    prev = a
-    out[p - 1] = a / p
-    for i in range(p, len(arr)):
-        prev = prev - prev / p + arr[i]
-        out[i] = prev / p
-    return out
-
-
-def _adx(high: List[float], low: List[float], close: List[float], period: int = 14) -> List[Optional[float]]:
-    if len(high) <= period:
-        return [None] * len(high)
-    tr: List[float] = []
-    plusDM: List[float] = []
-    minusDM: List[float] = []
-    for i in range(1, len(high)):
-        tr.append(_true_range(high[i], low[i], close[i - 1]))
-        up = high[i] - high[i - 1]
-        dn = low[i - 1] - low[i]
-        plusDM.append(up if (up > dn and up > 0) else 0.0)
-        minusDM.append(dn if (dn > up and dn > 0) else 0.0)
-    trR = _rma(tr, period)
-    plusR = _rma(plusDM, period)
-    minusR = _rma(minusDM, period)
-    plusDI: List[Optional[float]] = []
-    minusDI: List[Optional[float]] = []
-    for i in range(len(trR)):
-        if trR[i] is not None and plusR[i] is not None:
-            plusDI.append(100 * (plusR[i] / trR[i]))
-        else:
-            plusDI.append(None)
-        if trR[i] is not None and minusR[i] is not None:
-            minusDI.append(100 * (minusR[i] / trR[i]))
-        else:
-            minusDI.append(None)
-    dx: List[Optional[float]] = []
-    for i in range(len(plusDI)):
-        p = plusDI[i]
-        m = minusDI[i]
-        if p is not None and m is not None and (p + m) != 0:
-            dx.append(100 * (abs(p - m) / (p + m)))
-        else:
-            dx.append(None)
-    # shift dx by 1 like JS code and compute rma
-    dx_clean = [x for x in dx[1:] if x is not None]
-    adxR = _rma(dx_clean, period)
-    # pad to align with close length
-    pad_len = len(close) - len(adxR)
-    if pad_len < 0:
-        pad_len = 0
-    return [None] * pad_len + adxR
-
 class StrategyRunner:
     def __init__(self):
         self.task: Optional[asyncio.Task] = None
@@ -1274,10 +1719,31 @@ class StrategyRunner:
         self.consecutive_losses: int = 0
         self.last_loss_time: Optional[int] = None
         self.current_position: Optional[Dict[str, Any]] = None
+        # 📈 Engines de indicadores incrementais por (symbol, granularity, config)
+        self._indicator_engines: Dict[Tuple, IndicatorEngine] = {}
         # 🛡️ STOP LOSS DINÂMICO: Rastreamento de contratos ativos
         self.active_contracts: Dict[int, Dict[str, Any]] = {}  # contract_id -> {stake, start_time, contract_data}
         self.stop_loss_task: Optional[asyncio.Task] = None
         
+    def _indicators(self, candles: List[Dict[str, Any]], macd: Optional[Tuple[int, int, int]] = None) -> IndicatorEngine:
+        """
+        📈 Engine de indicadores incremental para (symbol, granularity) atual.
+        Aplica apenas os candles novos (o candle em formação é revisado), evitando recalcular
+        RSI/MACD/Bollinger/ADX sobre toda a janela a cada iteração.
+        """
+        fast, slow, sig = macd or (self.params.macd_fast, self.params.macd_slow, self.params.macd_sig)
+        key = (self.params.symbol, int(self.params.granularity), int(fast), int(slow), int(sig),
+               float(self.params.bbands_k), int(self.params.fast_ma), int(self.params.slow_ma))
+        engine = self._indicator_engines.get(key)
+        if engine is None:
+            if len(self._indicator_engines) >= 16:
+                self._indicator_engines.clear()
+            engine = IndicatorEngine(macd_fast=fast, macd_slow=slow, macd_signal=sig, bb_k=self.params.bbands_k,
+                                     sma_periods=(self.params.fast_ma, self.params.slow_ma))
+            self._indicator_engines[key] = engine
+        engine.sync(candles)
+        return engine
+
     def _check_technical_stop_loss(self, candles: List[Dict[str, Any]]) -> bool:
         """
         🎯 SISTEMA DE STOP LOSS TÉCNICO AVANÇADO
@@ -1289,27 +1755,25 @@ class StrategyRunner:
             
         try:
             close = [float(c["close"]) for c in candles]
-            high = [float(c["high"]) for c in candles]
-            low = [float(c["low"]) for c in candles]
+            # 📈 Indicadores incrementais (MACD 12/26/9, RSI 14, ADX 14)
+            ind = self._indicators(candles, macd=(12, 26, 9))
+            snap = ind.snapshot()
             
             # 🎯 STOP LOSS 1: ADX muito fraco (sem tendência)
-            adx_values = IND_adx_list(high, low, close, 14)
-            last_adx = adx_values[-1] if adx_values else None
+            last_adx = snap.get("adx")
             if last_adx is not None and last_adx < self.params.min_adx_for_trade:
                 return True  # Bloquear: ADX muito fraco
                 
             # 🎯 STOP LOSS 2: RSI overextended (mercado sobrecomprado/sobrevendido)
             if self.params.rsi_overextended_stop:
-                rsi_values = IND_rsi_list(close, 14)
-                last_rsi = next((x for x in reversed(rsi_values) if x is not None), None)
+                last_rsi = snap.get("rsi")
                 if last_rsi is not None and (last_rsi > 85 or last_rsi < 15):  # Condições extremas
                     return True  # Bloquear: RSI overextended
                         
             # 🎯 STOP LOSS 3: Divergência MACD (sinal de reversão)
             if self.params.macd_divergence_stop and len(close) >= 35:
-                # Usar implementação MACD do ml_utils para obter linha e sinal
-                macd_res = IND_macd_dict_list(close, 12, 26, 9)
-                macd_signal_series = macd_res.get("signal") or []
+                # Últimos valores do sinal MACD mantidos pelo engine incremental
+                macd_signal_series = [h.get("macd_signal") for h in ind.history()]
                 # Verificar divergência (MACD caindo enquanto preço sobe ou vice-versa)
                 if len(macd_signal_series) >= 5:
                     recent_macd = [x for x in macd_signal_series[-5:] if x is not None]
@@ -1635,8 +2099,8 @@ class StrategyRunner:
         Obtém candles recentes para análise ML
         """
         try:
-            # Usar método existente para obter candles
-            candles = await self._get_candles(symbol=symbol, timeframe="1m", count=count)
+            # Ler do CandleStore compartilhado (1m) em vez de um novo ticks_history
+            candles = await self._get_candles(symbol, 60, count)
             return candles if candles else []
         except Exception as e:
             logger.warning(f"Erro obtendo candles para ML: {e}")
@@ -1669,19 +2133,16 @@ class StrategyRunner:
                 opens = [float(c.get("open", 0)) for c in candles]
                 volumes = [float(c.get("volume", 0)) for c in candles]
 
-                # indicadores principais
-                rsi_series = IND_rsi_list(closes)
-                last_rsi = next((x for x in reversed(rsi_series) if x is not None), None)
-                macd_res = IND_macd_dict_list(closes, self.params.macd_fast, self.params.macd_slow, self.params.macd_sig)
-                last_macd = next((x for x in reversed(macd_res["line"]) if x is not None), None)
-                last_macd_sig = next((x for x in reversed(macd_res["signal"]) if x is not None), None)
-                bb = IND_bollinger_dict(closes, 20, self.params.bbands_k)
-                last_bb_up = next((x for x in reversed(bb["upper"]) if x is not None), None)
-                last_bb_dn = next((x for x in reversed(bb["lower"]) if x is not None), None)
-                adx_arr = IND_adx_list(highs, lows, closes)
-                last_adx = next((x for x in reversed(adx_arr) if x is not None), None)
-                ma_fast = IND_sma_last(closes, self.params.fast_ma)
-                ma_slow = IND_sma_last(closes, self.params.slow_ma)
+                # indicadores principais (engine incremental por símbolo/granularidade)
+                snap = self._indicators(candles).snapshot()
+                last_rsi = snap.get("rsi")
+                last_macd = snap.get("macd")
+                last_macd_sig = snap.get("macd_signal")
+                last_bb_up = snap.get("bb_upper")
+                last_bb_dn = snap.get("bb_lower")
+                last_adx = snap.get("adx")
+                ma_fast = snap.get(f"sma_{self.params.fast_ma}")
+                ma_slow = snap.get(f"sma_{self.params.slow_ma}")
 
                 prices = {
                     "open": opens,
@@ -1759,15 +2220,16 @@ class StrategyRunner:
             if isinstance(timestamp, (int, float)):
                 timestamp = datetime.fromtimestamp(float(timestamp)).isoformat()
                 
-            # Fazer predição River (sem atualizar modelo)
-            river_info = river_model.predict_and_update(
+            # Fazer predição River (sem atualizar modelo): janela = candles anteriores deste símbolo
+            river_info = river_model.predict(
                 timestamp=timestamp,
                 o=float(last_candle.get("open", 0)),
                 h=float(last_candle.get("high", 0)),
                 l=float(last_candle.get("low", 0)),
                 c=float(last_candle.get("close", 0)),
                 v=float(last_candle.get("volume", 0)),
-                next_close=None  # Não atualizar, apenas predizer
+                key=self.params.symbol,
+                history=[(float(x.get("close", 0)), float(x.get("volume", 0))) for x in candles[-river_online_model.ROLLING_WINDOW:-1]],
             )
             
             prob_up = float(river_info.get("prob_up", 0.5))
@@ -1791,28 +2253,25 @@ class StrategyRunner:
             return None
         
         # === PASSO 2: VERIFICAR INDICADORES TÉCNICOS (CONFIRMAÇÃO) ===
-        close = [float(c.get("close")) for c in candles]
-        high = [float(c.get("high")) for c in candles]
-        low = [float(c.get("low")) for c in candles]
+        ind = self._indicators(candles)
+        snap = ind.snapshot()
+        hist = ind.history()
+        prev = hist[-2] if len(hist) >= 2 else {}
 
-        adx_arr = IND_adx_list(high, low, close)
-        last_adx = next((x for x in reversed(adx_arr) if x is not None), None)
+        last_adx = snap.get("adx")
 
-        ma_fast = IND_sma_last(close, self.params.fast_ma)
-        ma_slow = IND_sma_last(close, self.params.slow_ma)
-        prev_fast = IND_sma_last(close[:-1], self.params.fast_ma)
-        prev_slow = IND_sma_last(close[:-1], self.params.slow_ma)
+        ma_fast = snap.get(f"sma_{self.params.fast_ma}")
+        ma_slow = snap.get(f"sma_{self.params.slow_ma}")
+        prev_fast = prev.get(f"sma_{self.params.fast_ma}")
+        prev_slow = prev.get(f"sma_{self.params.slow_ma}")
 
-        macd_res = IND_macd_dict_list(close, self.params.macd_fast, self.params.macd_slow, self.params.macd_sig)
-        last_macd = next((x for x in reversed(macd_res["line"]) if x is not None), None)
-        last_sig = next((x for x in reversed(macd_res["signal"]) if x is not None), None)
+        last_macd = snap.get("macd")
+        last_sig = snap.get("macd_signal")
 
-        rsi_arr = IND_rsi_list(close)
-        last_rsi = next((x for x in reversed(rsi_arr) if x is not None), None)
-        bb = IND_bollinger_dict(close, 20, self.params.bbands_k)
-        last_price = close[-1]
-        last_upper = next((x for x in reversed(bb["upper"]) if x is not None), None)
-        last_lower = next((x for x in reversed(bb["lower"]) if x is not None), None)
+        last_rsi = snap.get("rsi")
+        last_price = float(candles[-1].get("close"))
+        last_upper = snap.get("bb_upper")
+        last_lower = snap.get("bb_lower")
 
         trending = (last_adx is not None) and (last_adx >= self.params.adx_trend)
 
@@ -1885,29 +2344,8 @@ class StrategyRunner:
         return None
 
     async def _get_candles(self, symbol: str, granularity: int, count: int) -> List[Dict[str, Any]]:
-        if not _deriv.connected:
-            raise HTTPException(status_code=503, detail="Deriv not connected")
-        req_id = int(time.time() * 1000)
-        fut = asyncio.get_running_loop().create_future()
-        _deriv.pending[req_id] = fut
-        await _deriv._send({
-            "ticks_history": symbol,
-            "adjust_start_time": 1,
-            "count": count,
-            "end": "latest",
-            "start": 1,
-            "style": "candles",
-            "granularity": granularity,
-            "req_id": req_id,
-        })
-        try:
-            data = await asyncio.wait_for(fut, timeout=12)
-        except asyncio.TimeoutError:
-            _deriv.pending.pop(req_id, None)
-            raise HTTPException(status_code=504, detail="Timeout waiting for candles")
-        if data.get("error"):
-            raise HTTPException(status_code=400, detail=data["error"].get("message", "history error"))
-        return data.get("candles") or []
+        """Candles do CandleStore compartilhado (semeado via ticks_history e atualizado por ticks)."""
+        return await _deriv.candle_store.get(symbol, granularity, count)
 
     async def _paper_trade(self, symbol: str, side: str, duration_ticks: int, stake: float) -> float:
         """
@@ -2079,6 +2517,12 @@ class StrategyRunner:
                     break
                 candles = await self._get_candles(self.params.symbol, self.params.granularity, self.params.candle_len)
                 self.last_run_at = int(time.time())
+                if self.params.mode != "paper":
+                    # ⚡ mantém os proposals CALL/PUT quentes para o buy sair sem esperar proposal
+                    for ct in ("CALL", "PUT"):
+                        _deriv.proposals.keep_warm(_proposal_payload(BuyRequest(
+                            symbol=self.params.symbol, contract_type=ct, duration=self.params.duration,
+                            duration_unit="t", stake=self.params.stake, currency="USD")))
 
                 # Bloqueio por janela de não-operação (spike de volatilidade) e cooldown adaptativo
                 if block_until_iter > 0:
@@ -2119,7 +2563,7 @@ class StrategyRunner:
                 signal = None
                 if deceng is not None:
                     try:
-                        engine = deceng.WeightedVotingDecisionEngine()
+                        engine = deceng.get_engine()
                         ctx = deceng.StrategyContext(symbol=self.params.symbol, timeframe=f"{self.params.granularity}s", regime=regime)
                         res = engine.evaluate(df, ctx)
                         if res.get('decision') in ('RISE','FALL'):
@@ -2143,20 +2587,20 @@ class StrategyRunner:
                 # Opcional: confirmar com MLEngine se habilitado
                 if self.params.ml_gate:
                     try:
-                        # Preparar DataFrame do último trecho para predição
-                        df = pd.DataFrame(candles)
-                        if 'timestamp' in df.columns:
-                            df.index = pd.to_datetime(df['timestamp'], unit='s')
-                        elif 'epoch' in df.columns:
-                            df.index = pd.to_datetime(df['epoch'], unit='s')
-                        else:
-                            df.index = pd.date_range(start='2024-01-01', periods=len(df), freq='1min')
-                        # Usar modelos já treinados em memória (se houver) para o mesmo símbolo
-                        available_models = [k for k in _ml_engine_models.keys() if k.startswith(self.params.symbol)]
-                        if available_models:
-                            model_key = available_models[-1]
-                            trained_models = _ml_engine_models[model_key]
-                            pred = ml_engine.predict_from_models(df.tail(_ml_engine_config.seq_len + 10), trained_models, _ml_engine_config)
+                        # Modelo ativo do registry (símbolo/timeframe/horizon; fallback: último do símbolo)
+                        g = int(self.params.granularity)
+                        tf = f"{g // 60}m" if g % 60 == 0 else f"{g}s"
+                        trained_models = await _ml_registry.aget(_ml_registry.resolve(self.params.symbol, tf, 3))
+                        if trained_models is not None:
+                            # DataFrame apenas do trecho usado pela inferência (última janela + warmup)
+                            df = pd.DataFrame(candles[-(_ml_engine_config.seq_len + ml_engine.FEATURE_WARMUP):])
+                            if 'timestamp' in df.columns:
+                                df.index = pd.to_datetime(df['timestamp'], unit='s')
+                            elif 'epoch' in df.columns:
+                                df.index = pd.to_datetime(df['epoch'], unit='s')
+                            else:
+                                df.index = pd.date_range(start='2024-01-01', periods=len(df), freq='1min')
+                            pred = ml_engine.predict_from_models(df, trained_models, _ml_engine_config)
                             prob = float(pred.get('prob', 0.5))
                             conf = float(pred.get('conf', 0.0))
                             direction = str(pred.get('direction'))
@@ -2165,11 +2609,7 @@ class StrategyRunner:
                             # Threshold dinâmico por regime ADX (mesma lógica do filtro River):
                             # ADX < 20 já bloqueado anteriormente; 20-25 => 0.60, >=25 => 0.55
                             try:
-                                closes_g = [float(c.get('close')) for c in candles]
-                                highs_g = [float(c.get('high')) for c in candles]
-                                lows_g = [float(c.get('low')) for c in candles]
-                                adx_vals_g = IND_adx_list(highs_g, lows_g, closes_g)
-                                last_adx_g = next((x for x in reversed(adx_vals_g) if x is not None), None)
+                                last_adx_g = self._indicators(candles).snapshot().get("adx")
                             except Exception:
                                 last_adx_g = None
                             dyn_thr = self.params.ml_prob_threshold
@@ -2310,11 +2750,18 @@ async def strategy_status():
 # WebSocket endpoint to push ticks to clients (suporta querystring symbols=R_100,R_75 ou payload inicial JSON)
 @app.websocket("/api/ws/ticks")
 async def ws_ticks(websocket: WebSocket):
+    """Ticks em tempo real via hub de broadcast.
+    Query opcional: policy=drop_oldest|coalesce_latest (backpressure) e maxsize (buffer do cliente)."""
     await websocket.accept()
-    queues: Dict[str, asyncio.Queue] = {}
+    sub: Optional[TickSubscriber] = None
     try:
         # 1) Primeiro tenta via querystring (?symbols=A,B,C)
         symbols_qs = websocket.query_params.get("symbols") if hasattr(websocket, "query_params") else None
+        policy = websocket.query_params.get("policy") or "drop_oldest"
+        try:
+            maxsize = int(websocket.query_params.get("maxsize") or 100)
+        except ValueError:
+            maxsize = 100
         symbols: List[str] = []
         if symbols_qs:
             symbols = [s.strip() for s in symbols_qs.split(",") if s.strip()]
@@ -2325,6 +2772,7 @@ async def ws_ticks(websocket: WebSocket):
                 try:
                     msg = json.loads(init)
                     symbols = msg.get("symbols") or []
+                    policy = msg.get("policy") or policy
                 except json.JSONDecodeError:
                     pass
             except asyncio.TimeoutError:
@@ -2333,41 +2781,66 @@ async def ws_ticks(websocket: WebSocket):
             await websocket.send_text(json.dumps({"type": "error", "message": "No symbols provided"}))
             await websocket.close()
             return
-        # Add queues per symbol
-        for s in symbols:
-            q = await _deriv.add_queue(s)
-            queues[s] = q
-        await websocket.send_text(json.dumps({"type": "subscribed", "symbols": list(queues.keys())}))
-        # Fan-out loop
+        # Fila única (merge de todos os símbolos) no hub
+        sub = await _deriv.tick_hub.subscribe(symbols, policy=policy, maxsize=maxsize)
+        await websocket.send_text(json.dumps({"type": "subscribed", "symbols": sub.symbols, "policy": sub.policy}))
+        # Fan-out loop: payloads já serializados pelo hub
         while True:
-            # multiplex: get from any queue with timeout to also handle pings
-            get_tasks = [asyncio.create_task(q.get()) for q in queues.values()]
-            done, pending = await asyncio.wait(get_tasks, return_when=asyncio.FIRST_COMPLETED, timeout=15)
-            for p in pending:
-                p.cancel()
-            if not done:
+            batch = await sub.next_batch(timeout=15)
+            if not batch:
                 # heartbeat
-                await websocket.send_text(json.dumps({"type": "ping", "symbols": list(queues.keys())}))
+                await websocket.send_text(json.dumps({"type": "ping", "symbols": sub.symbols}))
                 continue
-            for d in done:
-                try:
-                    data = d.result()
-                    await websocket.send_text(json.dumps(data))
-                except Exception:
-                    pass
+            for payload in batch:
+                await websocket.send_text(payload)
     except WebSocketDisconnect:
         pass
     except Exception as e:
         logger.warning(f"Client WS error: {e}")
     finally:
         # cleanup
-        for s, q in queues.items():
-            _deriv.remove_queue(s, q)
+        if sub is not None:
+            _deriv.tick_hub.unsubscribe(sub)
         try:
             await websocket.close()
         except Exception:
             pass
 
+@api_router.get("/deriv/ticks/hub")
+async def deriv_ticks_hub():
+    """Métricas do hub de broadcast de ticks (clientes, fan-out e descartes por backpressure)."""
+    return _deriv.tick_hub.snapshot()
+
+@api_router.get("/deriv/rpc")
+async def deriv_rpc_metrics():
+    """Requisições em voo na Deriv (por tipo, idade da mais antiga, vencidas) e contadores do cliente RPC."""
+    return _deriv.rpc.snapshot()
+
+@api_router.get("/deriv/proposals")
+async def deriv_proposals_cache():
+    """Streams de proposal pré-assinados (frescor, ociosidade) e hits/misses/refreshes do cache."""
+    return _deriv.proposals.snapshot()
+
+@api_router.get("/deriv/contracts_for_cache")
+async def deriv_contracts_for_cache():
+    """Hits/misses/coalescidas e entradas do cache de contracts_for."""
+    return _deriv.contracts_for.snapshot()
+
+@api_router.get("/deriv/history")
+async def deriv_history_store():
+    """Séries de histórico persistidas (linhas e faixa coberta) e contadores de páginas baixadas."""
+    return _history.snapshot()
+
+@api_router.get("/deriv/contracts/lifecycle")
+async def deriv_contracts_lifecycle():
+    """Contratos vivos/finalizados, tamanho e memória aproximada dos mapas por contrato e contadores de despejo."""
+    for sub_id in _deriv.contracts.sweep():
+        try:
+            await _deriv._send({"forget": sub_id})
+        except Exception as e:
+            logger.warning(f"Forget de assinatura {sub_id} falhou: {e}")
+    return _deriv.contracts.snapshot()
+
 # WebSocket endpoint to track a contract lifecycle
 @app.websocket("/api/ws/contract/{contract_id}")
 async def ws_contract(websocket: WebSocket, contract_id: int):
@@ -2405,6 +2878,8 @@ class RiverPredictCandle(BaseModel):
     volume: float
 
 _river_model: Optional[river_online_model.RiverOnlineCandleModel] = None
+# 💾 Salva o modelo River fora do event loop (snapshot + escrita atômica + rotação de backups)
+_river_persistence = river_online_model.RiverPersistence()
 
 def _get_river_model() -> river_online_model.RiverOnlineCandleModel:
     global _river_model
@@ -2427,32 +2902,71 @@ async def river_status():
             "acc": float(m.metric_acc.get()) if getattr(m, "sample_count", 0) > 0 else None,
             "logloss": float(m.metric_logloss.get()) if getattr(m, "sample_count", 0) > 0 else None,
             "model_path": river_online_model.MODEL_SAVE_PATH,
+            "persistence": _river_persistence.snapshot(),
         }
     except Exception as e:
         return {"initialized": False, "error": str(e)}
 
+# 📝 Learns pós-trade recentes (seq, args, kwargs): reaplicados no modelo devolvido por um treino CSV,
+# que partiu de um snapshot anterior a eles
+RIVER_LEARN_LOG_MAX = int(os.environ.get("RIVER_LEARN_LOG_MAX", "10000"))
+_river_learn_log: deque = deque(maxlen=RIVER_LEARN_LOG_MAX)
+_river_learn_seq = 0
+
+def _river_learn(*args, **kwargs):
+    """learn() no singleton sob o lock da persistência, registrando a chamada para replay."""
+    global _river_learn_seq
+    m = _get_river_model()
+    with _river_persistence.lock:
+        out = m.learn(*args, **kwargs)
+        _river_learn_seq += 1
+        _river_learn_log.append((_river_learn_seq, args, kwargs))
+    # 💾 Persistência em background (debounce por intervalo / N updates)
+    _river_persistence.mark_dirty(m)
+    return out
+
+def _river_snapshot() -> Tuple[bytes, int]:
+    """Modelo serializado + seq do último learn já contido nele."""
+    with _river_persistence.lock:
+        return pickle.dumps(_get_river_model()), _river_learn_seq
+
+def _river_train_result(since_seq: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Troca o singleton pelo modelo treinado no worker, reaplicando os learns feitos durante o treino."""
+    global _river_model
+    model = result["model"]
+    with _river_persistence.lock:
+        if _river_learn_log and _river_learn_log[0][0] > since_seq + 1:
+            logger.warning(f"River: log de learns estourou durante o treino; {_river_learn_log[0][0] - since_seq - 1} learns perdidos")
+        replayed = 0
+        for seq, args, kwargs in _river_learn_log:
+            if seq > since_seq:
+                model.learn(*args, **kwargs)
+                replayed += 1
+        _river_model = model
+    # snapshot pendente passa a ser o do modelo novo (nada é descartado); o worker não grava no disco,
+    # então um job cancelado nunca sobrescreve o modelo salvo
+    _river_persistence.mark_dirty(model, immediate=True)
+    return {**result["summary"], "replayed_learns": replayed}
+
+async def _river_train_job(csv_text: str, background: bool):
+    blob, since_seq = _river_snapshot()
+    return await _run_job("river_train_csv", jobs.river_train_csv_task, csv_text, blob,
+                          background=background, on_result=functools.partial(_river_train_result, since_seq))
+
 @api_router.post("/ml/river/train_csv")
-async def river_train_csv(csv_text: str = Body(..., embed=True)):
+async def river_train_csv(csv_text: str = Body(..., embed=True), background: bool = False):
     """Treina/Atualiza o modelo online processando um CSV (texto)."""
     try:
-        df = pd.read_csv(io.StringIO(csv_text))
-        result = river_online_model.run_on_dataframe(df, _get_river_model())
-        # Persist updated singleton
-        result["model"].save(river_online_model.MODEL_SAVE_PATH)
-        return result["summary"]
+        return await _river_train_job(csv_text, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no processamento do CSV: {e}")
 
 @api_router.post("/ml/river/train_csv_upload")
-async def river_train_csv_upload(file: UploadFile = File(...)):
+async def river_train_csv_upload(file: UploadFile = File(...), background: bool = False):
     """Treina/Atualiza o modelo online enviando arquivo CSV (multipart/form-data)."""
     try:
         content = (await file.read()).decode("utf-8")
-        df = pd.read_csv(io.StringIO(content))
-        result = river_online_model.run_on_dataframe(df, _get_river_model())
-        # Persist updated singleton
-        result["model"].save(river_online_model.MODEL_SAVE_PATH)
-        return result["summary"]
+        return await _river_train_job(content, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no upload do CSV: {e}")
 
@@ -2461,16 +2975,15 @@ async def river_predict(candle: RiverPredictCandle):
     """Predição online para um candle (sem atualizar o modelo)."""
     try:
         m = _get_river_model()
-        info = m.predict_and_update(
+        info = m.predict(
             candle.datetime or datetime.utcnow().isoformat(),
             candle.open,
             candle.high,
             candle.low,
             candle.close,
             candle.volume,
-            next_close=None,
         )
-        # not learning since next_close is None
+        # predict é puro: nem o modelo nem a janela rolante mudam
         return {
             "prob_up": info["prob_up"],
             "pred_class": info["pred_class"],
@@ -2495,14 +3008,14 @@ async def river_decide_trade(req: RiverDecideTradeRequest):
     Requer DERIV_API_TOKEN configurado e WS conectado para execução real.
     """
     m = _get_river_model()
-    info = m.predict_and_update(
+    info = m.predict(
         req.candle.datetime or datetime.utcnow().isoformat(),
         req.candle.open,
         req.candle.high,
         req.candle.low,
         req.candle.close,
         req.candle.volume,
-        next_close=None,
+        key=req.symbol,
     )
     action = "CALL" if info["pred_class"] == 1 else "PUT"
 
@@ -2565,8 +3078,11 @@ async def river_restore_backup(request: Dict[str, Any]):
         if not success:
             raise HTTPException(status_code=500, detail="Falha ao restaurar backup")
         
-        # Verificar modelo restaurado
+        # Verificar modelo restaurado (e descartar snapshot pendente para não sobrescrever o backup)
         restored_model = river_online_model.RiverOnlineCandleModel.load()
+        global _river_model
+        _river_persistence.discard()
+        _river_model = restored_model
         
         return {
             "success": True,
@@ -2624,6 +3140,7 @@ class RiverPerformanceMetrics(BaseModel):
     expected_value: float
     max_drawdown: float
     sharpe_ratio: Optional[float] = None
+    sortino_ratio: Optional[float] = None
 
 @api_router.get("/strategy/river/config")
 async def get_river_config():
@@ -2673,7 +3190,7 @@ async def river_tune(request: RiverTuneRequest):
         thresholds=thresholds,
     )
     bt_res = await river_backtest_run(bt_req)
-    results = bt_res.get("results", [])
+    results = [r.dict() if isinstance(r, BaseModel) else r for r in bt_res.get("results", [])]
     if not results:
         raise HTTPException(status_code=400, detail="Backtest sem resultados")
     # escolher melhor pelo mesmo score
@@ -2703,7 +3220,7 @@ async def river_tune(request: RiverTuneRequest):
     }
 
 @api_router.post("/strategy/river/backtest_run")
-async def river_backtest_run(request: RiverBacktestRequest):
+async def river_backtest_run(request: RiverBacktestRequest, background: bool = False):
     """
     Backtesting rápido para diferentes river_thresholds
     Simula como diferentes thresholds afetariam a performance
@@ -2711,164 +3228,54 @@ async def river_backtest_run(request: RiverBacktestRequest):
     try:
         # Buscar dados históricos usando o método existente do StrategyRunner
         granularity = 60 if request.timeframe == "1m" else 180  # granularity em segundos
-        candles_data = await _strategy._get_candles(request.symbol, granularity, request.lookback_candles)
+        candles_data = await _history.get(request.symbol, granularity, request.lookback_candles)
         
         if not candles_data or len(candles_data) < 100:
             raise HTTPException(status_code=400, detail="Dados insuficientes para backtesting")
         
-        # Calcular indicadores técnicos para todos os candles
-        close_prices = [float(c["close"]) for c in candles_data]
-        high_prices = [float(c["high"]) for c in candles_data]
-        low_prices = [float(c["low"]) for c in candles_data]
-        
-        adx_values = IND_adx_list(high_prices, low_prices, close_prices)
-        rsi_values = IND_rsi_list(close_prices)
-        bb_values = IND_bollinger_dict(close_prices, 20, 2.0)
+        n_candles = len(candles_data)
         
-        results = []
-        
-        # Testar cada threshold
-        for threshold in request.thresholds:
-            trades = []
-            current_pos = None
-            
-            # Simular River predictions (simplified)
-            for i in range(50, len(candles_data) - 1):  # Skip first 50 for indicators
-                try:
-                    # Simular probabilidade River (simplified - na prática usaria modelo treinado)
-                    current_close = float(candles_data[i]["close"])
-                    prev_close = float(candles_data[i-1]["close"])
-                    next_close = float(candles_data[i+1]["close"])
-                    
-                    # Simulated probability based on price momentum
-                    momentum = (current_close - prev_close) / prev_close
-                    prob_up = 0.5 + (momentum * 2)  # Simple momentum-based probability
-                    prob_up = max(0.1, min(0.9, prob_up))  # Clamp between 0.1 and 0.9
-                    
-                    # Verificar se River dá sinal
-                    river_signal = None
-                    if prob_up >= threshold:
-                        river_signal = "RISE"
-                    elif prob_up <= (1.0 - threshold):
-                        river_signal = "FALL"
-                    
-                    if river_signal is None:
-                        continue
-                        
-                    # Verificar indicadores técnicos
-                    if i < len(adx_values) and i < len(rsi_values):
-                        adx = adx_values[i]
-                        rsi = rsi_values[i]
-                        
-                        if adx is None or rsi is None:
-                            continue
-                            
-                        # Lógica de confirmação (simplificada)
-                        technical_signal = None
-                        if river_signal == "RISE" and rsi < 70 and adx > 22:
-                            technical_signal = "CALL"
-                        elif river_signal == "FALL" and rsi > 30 and adx > 22:
-                            technical_signal = "PUT"
-                            
-                        if technical_signal:
-                            # Simular trade
-                            entry_price = current_close
-                            exit_price = next_close
-                            
-                            if technical_signal == "CALL":
-                                pnl = 0.95 if exit_price > entry_price else -1.0
-                            else:  # PUT
-                                pnl = 0.95 if exit_price < entry_price else -1.0
-                                
-                            trades.append({
-                                "entry_time": candles_data[i]["timestamp"],
-                                "entry_price": entry_price,
-                                "exit_price": exit_price,
-                                "type": technical_signal,
-                                "pnl": pnl,
-                                "river_prob": prob_up
-                            })
-                            
-                except Exception:
-                    continue
-            
-            # Calcular métricas
-            if len(trades) > 0:
-                wins = len([t for t in trades if t["pnl"] > 0])
-                win_rate = wins / len(trades)
-                total_pnl = sum(t["pnl"] for t in trades)
-                expected_value = total_pnl / len(trades)
-                
-                # Calcular drawdown
-                cumulative_pnl = 0
-                peak = 0
-                max_dd = 0
-                for trade in trades:
-                    cumulative_pnl += trade["pnl"]
-                    if cumulative_pnl > peak:
-                        peak = cumulative_pnl
-                    drawdown = peak - cumulative_pnl
-                    if drawdown > max_dd:
-                        max_dd = drawdown
-
-                # Sharpe e Sortino simples por trade
-                pnls = [t["pnl"] for t in trades]
-                sharpe = None
-                sortino = None
-                try:
-                    import math
-                    m = sum(pnls) / len(pnls)
-                    sd = (sum((x - m)**2 for x in pnls) / max(len(pnls)-1,1)) ** 0.5
-                    if sd > 0:
-                        sharpe = m / sd
-                    downside = [min(0.0, x - m) for x in pnls]
-                    dd = (sum(d**2 for d in downside) / max(len(pnls)-1,1)) ** 0.5
-                    if dd > 0:
-                        sortino = m / dd
-                except Exception:
-                    pass
-                
-                # Estimar trades por dia (assume 1 minuto candles)
-                time_span_hours = (len(candles_data) * (60 if request.timeframe == "1m" else 180)) / 3600
-                trades_per_day = len(trades) / (time_span_hours / 24) if time_span_hours > 0 else 0
-                
+        def _on_sweep(sweep: List[Dict[str, Any]]) -> Dict[str, Any]:
+            # Estimar trades por dia (assume 1 minuto candles)
+            time_span_hours = (n_candles * (60 if request.timeframe == "1m" else 180)) / 3600
+            results = []
+            for row in sweep:
+                trades_per_day = row["trades"] / (time_span_hours / 24) if time_span_hours > 0 else 0
                 results.append(RiverPerformanceMetrics(
-                    threshold=threshold,
-                    win_rate=win_rate,
-                    total_trades=len(trades),
-                    avg_trades_per_day=trades_per_day,
-                    expected_value=expected_value,
-                    max_drawdown=max_dd,
-                    sharpe_ratio=sharpe
+                    threshold=row["threshold"],
+                    win_rate=row["win_rate"],
+                    total_trades=row["trades"],
+                    avg_trades_per_day=trades_per_day if row["trades"] > 0 else 0.0,
+                    expected_value=row["expected_value"],
+                    max_drawdown=row["max_drawdown"],
+                    sharpe_ratio=row["sharpe"],
+                    sortino_ratio=row["sortino"],
                 ))
-            else:
-                results.append(RiverPerformanceMetrics(
-                    threshold=threshold,
-                    win_rate=0.0,
-                    total_trades=0,
-                    avg_trades_per_day=0.0,
-                    expected_value=0.0,
-                    max_drawdown=0.0
-                ))
-        
-        # Encontrar melhor threshold: expected value ajustado por drawdown (penalização)
-        def score(x: RiverPerformanceMetrics) -> float:
-            return float(x.expected_value) - 0.1 * float(x.max_drawdown)
-        best_result = max(results, key=lambda x: score(x)) if results else None
-        
-        return {
-            "symbol": request.symbol,
-            "timeframe": request.timeframe,
-            "candles_analyzed": len(candles_data),
-            "results": results,
-            "best_threshold": best_result.threshold if best_result else None,
-            "current_threshold": _strategy.params.river_threshold,
-            "recommendation": {
-                "suggested_threshold": best_result.threshold if best_result else 0.53,
-                "score": score(best_result) if best_result else 0.0,
-                "rationale": f"Threshold {best_result.threshold:.2f} EV={best_result.expected_value:.3f}, MDD={best_result.max_drawdown:.3f}, trades={best_result.total_trades}" if best_result else "Dados insuficientes"
+            
+            # Encontrar melhor threshold: expected value ajustado por drawdown (penalização)
+            def score(x: RiverPerformanceMetrics) -> float:
+                return float(x.expected_value) - 0.1 * float(x.max_drawdown)
+            best_result = max(results, key=lambda x: score(x)) if results else None
+            
+            return {
+                "symbol": request.symbol,
+                "timeframe": request.timeframe,
+                "candles_analyzed": n_candles,
+                "results": results,
+                "best_threshold": best_result.threshold if best_result else None,
+                "current_threshold": _strategy.params.river_threshold,
+                "recommendation": {
+                    "suggested_threshold": best_result.threshold if best_result else 0.53,
+                    "score": score(best_result) if best_result else 0.0,
+                    "rationale": f"Threshold {best_result.threshold:.2f} EV={best_result.expected_value:.3f}, MDD={best_result.max_drawdown:.3f}, trades={best_result.total_trades}" if best_result else "Dados insuficientes"
+                }
             }
-        }
+        
+        # ⚡ Indicadores incrementais + sweep vetorizado (threshold x candle) em processo separado
+        return await _run_job(
+            "river_backtest", jobs.river_backtest_task, candles_data, list(request.thresholds),
+            background=background, on_result=_on_sweep, meta={"symbol": request.symbol, "timeframe": request.timeframe},
+        )
         
     except Exception as e:
         logger.error(f"Erro no backtesting River: {e}")
@@ -3086,14 +3493,14 @@ async def backtest_optimizations():
                         if isinstance(timestamp, (int, float)):
                             timestamp = datetime.fromtimestamp(float(timestamp)).isoformat()
                             
-                        river_info = river_model.predict_and_update(
+                        river_info = river_model.predict(
                             timestamp=timestamp,
                             o=float(last_candle.get("open", 0)),
                             h=float(last_candle.get("high", 0)),
                             l=float(last_candle.get("low", 0)),
                             c=float(last_candle.get("close", 0)),
                             v=float(last_candle.get("volume", 0)),
-                            next_close=None
+                            history=[(float(x.get("close", 0)), float(x.get("volume", 0))) for x in candles_subset[:-1]],
                         )
                         
                         prob_up = float(river_info.get("prob_up", 0.5))
@@ -3326,7 +3733,7 @@ async def test_ml_stop_loss_prediction():
 # AUTO SELECTION BOT ENDPOINTS
 # =============================================
 
-from auto_selection_bot import auto_bot, AutoBotConfig, AutoBotStatus, AutoBotResults
+from auto_selection_bot import auto_bot, AutoBotConfig, AutoBotStatus, AutoBotResults, AutoBotGridRequest
 
 @api_router.get("/auto-bot/status", response_model=AutoBotStatus)
 async def get_auto_bot_status():
@@ -3386,6 +3793,15 @@ async def get_auto_bot_results():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/auto-bot/simulate-grid")
+async def simulate_auto_bot_grid(request: AutoBotGridRequest):
+    """Ranking vetorizado de ma_short/ma_long/expiry para todos os símbolos/timeframes da janela atual"""
+    try:
+        ranking = auto_bot.simulate_grid(request.ma_short, request.ma_long, request.expiry, top=request.top)
+        return {"count": len(ranking), "results": ranking, "timestamp": datetime.utcnow().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/auto-bot/ticks/{symbol}")
 async def get_symbol_ticks(symbol: str, limit: int = 100):
     """Retorna últimos ticks de um símbolo específico"""
@@ -3395,14 +3811,14 @@ async def get_symbol_ticks(symbol: str, limit: int = 100):
         if symbol not in ticks_store:
             raise HTTPException(status_code=404, detail=f"Símbolo {symbol} não encontrado")
         
-        ticks = list(ticks_store[symbol])
-        recent_ticks = ticks[-limit:] if len(ticks) > limit else ticks
+        ring = ticks_store[symbol]
+        ts, prices = ring.last(limit)
         
         return {
             "symbol": symbol,
-            "total_ticks": len(ticks),
-            "recent_ticks": [{"timestamp": ts, "price": price} for ts, price in recent_ticks],
-            "count": len(recent_ticks)
+            "total_ticks": len(ring),
+            "recent_ticks": [{"timestamp": t, "price": p} for t, p in zip(ts.tolist(), prices.tolist())],
+            "count": len(ts)
         }
     except HTTPException:
         raise
@@ -3450,22 +3866,22 @@ class MLEngineDecisionRequest(BaseModel):
     min_conf: float = 0.2
     bankroll: float = 1000.0
 
-# Global ML Engine model storage
-_ml_engine_models: Dict[str, ml_engine.TrainedModels] = {}
+# Global ML Engine model registry (versão ativa por símbolo/timeframe/horizon, LRU em memória)
 _ml_engine_config = ml_engine.MLConfig()
+_ml_registry = model_registry.ModelRegistry(cfg=_ml_engine_config)
 
 @api_router.get("/ml/engine/status")
 async def ml_engine_status() -> MLEngineStatus:
     """Status do ML Engine (Transformer + LGB)"""
     try:
-        models_available = len(_ml_engine_models) > 0
-        last_model_key = list(_ml_engine_models.keys())[-1] if models_available else None
-        last_model = _ml_engine_models.get(last_model_key) if last_model_key else None
+        last_key = _ml_registry.last_key
+        models_available = last_key is not None
+        last_model = await _ml_registry.aget(last_key) if last_key else None
         
         return MLEngineStatus(
             initialized=True,
             models_trained=models_available,
-            symbol=last_model_key.split("_")[0] if last_model_key else None,
+            symbol=last_key[0] if last_key else None,
             seq_len=_ml_engine_config.seq_len,
             features_count=len(last_model.features) if last_model and last_model.features else None,
             last_training=datetime.utcnow().isoformat() if models_available else None,
@@ -3482,15 +3898,40 @@ async def ml_engine_status() -> MLEngineStatus:
             lgb_available=False
         )
 
+class MLEnginePinRequest(BaseModel):
+    symbol: str = "R_10"
+    timeframe: str = "1m"
+    horizon: int = 3
+    version: Optional[int] = None  # None = versão ativa atual
+    pin: bool = True  # False remove o pin e volta para a versão mais nova
+
+@api_router.get("/ml/engine/models")
+async def ml_engine_models():
+    """Registry do ML Engine: versões por símbolo/timeframe/horizon, versão ativa e modelos residentes"""
+    return _ml_registry.snapshot()
+
+@api_router.post("/ml/engine/models/pin")
+async def ml_engine_models_pin(request: MLEnginePinRequest):
+    """Fixa (ou libera) a versão ativa de um modelo do ML Engine"""
+    key = (request.symbol, request.timeframe, int(request.horizon))
+    try:
+        if request.pin:
+            active = _ml_registry.pin(key, request.version)
+        else:
+            active = _ml_registry.unpin(key)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"model_key": model_registry.key_name(key), "active_version": active, "pinned": request.pin}
+
 @api_router.post("/ml/engine/train")
-async def ml_engine_train(request: MLEngineTrainRequest):
+async def ml_engine_train(request: MLEngineTrainRequest, background: bool = False):
     """Treina modelos ML Engine (Transformer + LGB) usando dados da Deriv"""
     try:
         logging.info(f"Iniciando treinamento ML Engine para {request.symbol}")
         
         # Buscar dados históricos da Deriv
         granularity = 60 if request.timeframe == "1m" else (300 if request.timeframe == "5m" else 900)
-        candles_data = await _strategy._get_candles(request.symbol, granularity, request.count)
+        candles_data = await _history.get(request.symbol, granularity, request.count)
         
         if not candles_data or len(candles_data) < request.seq_len * 2:
             raise HTTPException(status_code=400, detail=f"Dados insuficientes. Precisa de pelo menos {request.seq_len * 2} candles, obteve {len(candles_data) if candles_data else 0}")
@@ -3516,54 +3957,52 @@ async def ml_engine_train(request: MLEngineTrainRequest):
         else:
             df.index = pd.date_range(start='2024-01-01', periods=len(df), freq='1min')
         
-        # Atualizar config para este treinamento
-        config = ml_engine.MLConfig()
-        config.seq_len = request.seq_len
-        
-        logging.info(f"Treinando com {len(df)} candles, seq_len={config.seq_len}")
-        
-        # Treinar modelos
-        trained_models = ml_engine.fit_models_from_candles(
-            df, config, horizon=request.horizon,
-            use_transformer=bool(request.use_transformer),
-            transformer_epochs=int(max(1, min(request.epochs, 10))),
-            transformer_batch=int(max(16, min(request.batch_size, 256))),
-            calibrate=str(request.calibrate or "sigmoid").lower()
-        )
-        
-        # Armazenar modelos treinados
-        model_key = f"{request.symbol}_{request.timeframe}_h{request.horizon}"
-        _ml_engine_models[model_key] = trained_models
+        logging.info(f"Treinando com {len(df)} candles, seq_len={request.seq_len}")
         
-        # Salvar modelos no disco
-        model_path = f"/app/backend/ml_models/ml_engine_{model_key}"
-        ml_engine.save_trained_models(trained_models, model_path)
+        registry_key = (request.symbol, request.timeframe, int(request.horizon))
+        model_key = model_registry.key_name(registry_key)
+        version = int(time.time() * 1000)
+        model_path = _ml_registry.artifact_path(registry_key, version)
+        staging_path = _ml_registry.staging_path(registry_key, version)
         
-        # Teste rápido de predição
-        test_pred = ml_engine.predict_from_models(df.tail(config.seq_len + 10), trained_models, config)
-        
-        logging.info(f"Treinamento ML Engine concluído para {model_key}")
+        def _on_trained(out: Dict[str, Any]) -> Dict[str, Any]:
+            # O worker gravou no staging; só um job não cancelado promove os artefatos e registra a versão
+            _ml_registry.promote(staging_path, model_path)
+            # hot-swap se a key não estiver fixada
+            trained_models = out["models"]
+            test_pred = out["test_pred"]
+            activated = _ml_registry.register(registry_key, version, model_path, trained_models)
+            logging.info(f"Treinamento ML Engine concluído para {model_key} v{version} (ativo={activated})")
+            return {
+                "success": True,
+                "model_key": model_key,
+                "version": version,
+                "activated": activated,
+                "candles_used": out["candles_used"],
+                "features_count": len(trained_models.features) if trained_models.features else 0,
+                "seq_len": out["seq_len"],
+                "horizon": request.horizon,
+                "transformer_trained": trained_models.transformer is not None,
+                "lgb_trained": trained_models.lgb_model is not None,
+                "test_prediction": {
+                    "prob": test_pred["prob"],
+                    "prob_transformer": test_pred["prob_trans"],
+                    "prob_lgb": test_pred["prob_lgb"],
+                    "confidence": test_pred["conf"],
+                    "direction": test_pred["direction"]
+                },
+                "shap_top20": trained_models.shap_top20,
+                "calibration": request.calibrate,
+                "saved_path": model_path
+            }
         
-        return {
-            "success": True,
-            "model_key": model_key,
-            "candles_used": len(df),
-            "features_count": len(trained_models.features) if trained_models.features else 0,
-            "seq_len": config.seq_len,
-            "horizon": request.horizon,
-            "transformer_trained": trained_models.transformer is not None,
-            "lgb_trained": trained_models.lgb_model is not None,
-            "test_prediction": {
-                "prob": test_pred["prob"],
-                "prob_transformer": test_pred["prob_trans"],
-                "prob_lgb": test_pred["prob_lgb"],
-                "confidence": test_pred["conf"],
-                "direction": test_pred["direction"]
-            },
-            "shap_top20": trained_models.shap_top20,
-            "calibration": request.calibrate,
-            "saved_path": model_path
-        }
+        # Treinar modelos em processo separado (LightGBM/SHAP/transformer fora do event loop)
+        return await _run_job(
+            "ml_engine_train", jobs.ml_engine_train_task,
+            df, request.seq_len, request.horizon, request.use_transformer, request.epochs,
+            request.batch_size, request.calibrate, staging_path,
+            background=background, on_result=_on_trained, meta={"model_key": model_key},
+        )
         
     except HTTPException:
         raise
@@ -3575,14 +4014,12 @@ async def ml_engine_train(request: MLEngineTrainRequest):
 async def ml_engine_predict(request: MLEnginePredictRequest):
     """Faz predição usando ML Engine treinado"""
     try:
-        # Encontrar modelo treinado para o símbolo
-        available_models = [k for k in _ml_engine_models.keys() if k.startswith(request.symbol)]
-        if not available_models:
+        # Modelo ativo mais recente do símbolo (registry)
+        registry_key = _ml_registry.resolve(request.symbol)
+        trained_models = await _ml_registry.aget(registry_key)
+        if trained_models is None:
             raise HTTPException(status_code=404, detail=f"Nenhum modelo ML Engine treinado encontrado para {request.symbol}")
-        
-        # Usar o modelo mais recente
-        model_key = available_models[-1]
-        trained_models = _ml_engine_models[model_key]
+        model_key = model_registry.key_name(registry_key)
         
         # Buscar dados recentes da Deriv
         granularity = 60  # 1 minuto por padrão
@@ -3641,12 +4078,11 @@ async def ml_engine_decide_trade(request: MLEngineDecisionRequest):
         pred_data = prediction["prediction"]
         
         # Calcular decisão de trade usando Kelly e confidence
-        available_models = [k for k in _ml_engine_models.keys() if k.startswith(request.symbol)]
-        if not available_models:
+        registry_key = _ml_registry.resolve(request.symbol)
+        trained_models = await _ml_registry.aget(registry_key)
+        if trained_models is None:
             raise HTTPException(status_code=404, detail=f"Modelo não encontrado para {request.symbol}")
-        
-        model_key = available_models[-1]
-        trained_models = _ml_engine_models[model_key]
+        model_key = model_registry.key_name(registry_key)
         
         # Buscar dados para decisão
         candles_data = await _strategy._get_candles(request.symbol, 60, request.count)
@@ -3719,12 +4155,14 @@ async def ml_engine_decide_trade(request: MLEngineDecisionRequest):
         raise HTTPException(status_code=500, detail=f"Erro na decisão de trade ML Engine: {str(e)}")
 
 @api_router.post("/ml/engine/backtest")
-async def ml_engine_backtest(request: MLEngineTrainRequest):
-    """Executa backtest walk-forward usando ML Engine"""
+async def ml_engine_backtest(request: MLEngineTrainRequest, background: bool = False,
+                             train_window_sec: int = 600, test_window_sec: int = 120, step_sec: int = 120,
+                             compute_shap: bool = False, fold_workers: Optional[int] = None):
+    """Executa backtest walk-forward usando ML Engine (featuriza uma vez; folds em paralelo)"""
     try:
         # Buscar dados históricos
         granularity = 60 if request.timeframe == "1m" else (300 if request.timeframe == "5m" else 900)
-        candles_data = await _strategy._get_candles(request.symbol, granularity, request.count)
+        candles_data = await _history.get(request.symbol, granularity, request.count)
         
         if not candles_data or len(candles_data) < 1000:
             raise HTTPException(status_code=400, detail="Dados insuficientes para backtest (mínimo 1000 candles)")
@@ -3745,39 +4183,49 @@ async def ml_engine_backtest(request: MLEngineTrainRequest):
         else:
             df.index = pd.date_range(start='2024-01-01', periods=len(df), freq='1min')
         
-        # Configurar backtest
-        config = ml_engine.MLConfig()
-        config.seq_len = request.seq_len
-        
         logging.info(f"Iniciando backtest walk-forward para {request.symbol} com {len(df)} candles")
+        # processos de fold dentro de um job: os JOB_WORKERS jobs dividem as CPUs (sem oversubscription)
+        fold_budget = max(1, (os.cpu_count() or 1) // jobs.JOB_WORKERS)
+        workers = max(1, min(fold_workers or fold_budget, fold_budget))
         
-        # Executar walk-forward backtest
-        backtest_results = ml_engine.walk_forward_backtest(
-            df, 
-            train_window_sec=600,  # 10 minutos de treino
-            test_window_sec=120,   # 2 minutos de teste
-            step_sec=120,          # Passo de 2 minutos
-            cfg=config
-        )
+        def _on_backtest(backtest_results: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                "symbol": request.symbol,
+                "timeframe": request.timeframe,
+                "total_candles": len(df),
+                "backtest_results": {
+                    "net_pnl": backtest_results["net"],
+                    "total_trades": backtest_results["trades"],
+                    "win_rate": backtest_results["winrate"],
+                    "avg_pnl_per_trade": backtest_results["net"] / backtest_results["trades"] if backtest_results["trades"] > 0 else 0
+                },
+                "folds": backtest_results.get("folds", []),
+                "timing": {
+                    "featurize_sec": backtest_results.get("featurize_sec"),
+                    "elapsed_sec": backtest_results.get("elapsed_sec"),
+                },
+                "config": {
+                    "seq_len": request.seq_len,
+                    "train_window_sec": train_window_sec,
+                    "test_window_sec": test_window_sec,
+                    "step_sec": step_sec,
+                    "use_transformer": request.use_transformer,
+                    "calibrate": request.calibrate,
+                    "compute_shap": compute_shap,
+                    "fold_workers": workers,
+                },
+                "timestamp": datetime.utcnow().isoformat()
+            }
         
-        return {
-            "symbol": request.symbol,
-            "timeframe": request.timeframe,
-            "total_candles": len(df),
-            "backtest_results": {
-                "net_pnl": backtest_results["net"],
-                "total_trades": backtest_results["trades"],
-                "win_rate": backtest_results["winrate"],
-                "avg_pnl_per_trade": backtest_results["net"] / backtest_results["trades"] if backtest_results["trades"] > 0 else 0
-            },
-            "config": {
-                "seq_len": config.seq_len,
-                "train_window_sec": 600,
-                "test_window_sec": 120,
-                "step_sec": 120
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        # Executar walk-forward backtest em processo separado
+        # (padrão: 10 minutos de treino, 2 minutos de teste, passo de 2 minutos)
+        return await _run_job(
+            "ml_engine_backtest", jobs.ml_engine_backtest_task,
+            df, request.seq_len, train_window_sec, test_window_sec, step_sec,
+            request.horizon, request.use_transformer, request.epochs, request.batch_size,
+            request.calibrate, compute_shap, workers,
+            background=background, on_result=_on_backtest, meta={"symbol": request.symbol},
+        )
         
     except HTTPException:
         raise
@@ -3790,7 +4238,15 @@ async def ml_engine_backtest(request: MLEngineTrainRequest):
 # -------------------------------------------------------------
 # RSI Reforçado (RSI + Bandas de Bollinger no RSI + Confirmação Multi-timeframe)
 # -------------------------------------------------------------
-from rsi_reinforced import RsiReinforcedParams, generate_signals, backtest_signals
+from rsi_reinforced import RsiReinforcedParams, GRID_MAX_CELLS
+
+class RsiReinforcedGrid(BaseModel):
+    rsi_period: Optional[List[int]] = None
+    rsi_bb_length: Optional[List[int]] = None
+    rsi_bb_k: Optional[List[float]] = None
+    min_bandwidth: Optional[List[float]] = None
+    distance_from_mid_min: Optional[List[float]] = None
+    horizon: Optional[List[int]] = None
 
 class RsiReinforcedRequest(BaseModel):
     symbol: str
@@ -3809,6 +4265,18 @@ class RsiReinforcedRequest(BaseModel):
     distance_from_mid_min: float = 8.0
     horizon: int = 3
     payout_ratio: float = 0.95
+    # Modo grade: listas de valores por parâmetro (os ausentes usam o valor escalar acima)
+    grid: Optional[RsiReinforcedGrid] = None
+    top: int = 20
+
+class RsiReinforcedGridResponse(BaseModel):
+    symbol: str
+    granularity: int
+    count: int
+    params: Dict[str, Any]
+    grid: Dict[str, List[Any]]
+    combinations: int
+    results: List[Dict[str, Any]]
 
 class RsiReinforcedResponse(BaseModel):
     symbol: str
@@ -3822,10 +4290,12 @@ class RsiReinforcedResponse(BaseModel):
     equity_final: float
     max_drawdown: float
 
-@api_router.post("/indicators/rsi_reinforced/backtest", response_model=RsiReinforcedResponse)
-async def rsi_reinforced_backtest(req: RsiReinforcedRequest):
+@api_router.post("/indicators/rsi_reinforced/backtest", response_model=Union[RsiReinforcedResponse, RsiReinforcedGridResponse, JobSubmitted])
+async def rsi_reinforced_backtest(req: RsiReinforcedRequest, background: bool = False):
+    """Backtest do RSI reforçado. Com `grid`, avalia todas as combinações numa passada vetorizada
+    (indicadores por período/janela, máscaras de bandwidth x distância em blocos por k, vetores de resultado por horizon)."""
     # 1) obter candles via Deriv
-    candles = await _strategy._get_candles(req.symbol, req.granularity, req.count)
+    candles = await _history.get(req.symbol, req.granularity, req.count)
     if not candles:
         raise HTTPException(status_code=400, detail="No candles returned")
     df = pd.DataFrame(candles)
@@ -3856,22 +4326,86 @@ async def rsi_reinforced_backtest(req: RsiReinforcedRequest):
         payout_ratio=req.payout_ratio,
     )
 
-    df2, signals = generate_signals(df, params)
-    metrics = backtest_signals(df2, signals, params)
+    def _on_result(out: Dict[str, Any]) -> RsiReinforcedResponse:
+        metrics = out['metrics']
+        return RsiReinforcedResponse(
+            symbol=req.symbol,
+            granularity=req.granularity,
+            count=out['count'],
+            params=params.__dict__,
+            total_signals=metrics['total_signals'],
+            wins=metrics['wins'],
+            losses=metrics['losses'],
+            winrate=metrics['winrate'],
+            equity_final=metrics['equity_final'],
+            max_drawdown=metrics['max_drawdown'],
+        )
 
-    return RsiReinforcedResponse(
-        symbol=req.symbol,
-        granularity=req.granularity,
-        count=len(df2),
-        params=params.__dict__,
-        total_signals=metrics['total_signals'],
-        wins=metrics['wins'],
-        losses=metrics['losses'],
-        winrate=metrics['winrate'],
-        equity_final=metrics['equity_final'],
-        max_drawdown=metrics['max_drawdown'],
+    if req.grid is not None:
+        grid = {k: v for k, v in req.grid.dict().items() if v}
+        combos = 1
+        for v in grid.values():
+            combos *= len(v)
+        if combos > 5000:
+            raise HTTPException(status_code=400, detail=f"Grade grande demais ({combos} combinações, máx 5000)")
+        if combos * len(df) > GRID_MAX_CELLS:
+            raise HTTPException(status_code=400, detail=f"Grade grande demais para {len(df)} candles ({combos} combinações, máx {GRID_MAX_CELLS // max(1, len(df))})")
+        top = max(1, min(int(req.top), 1000))
+
+        def _on_grid(out: Dict[str, Any]) -> RsiReinforcedGridResponse:
+            return RsiReinforcedGridResponse(
+                symbol=req.symbol,
+                granularity=req.granularity,
+                count=out['count'],
+                params=params.__dict__,
+                grid=grid,
+                combinations=out['combinations'],
+                results=out['results'],
+            )
+
+        return await _run_job(
+            "rsi_reinforced_grid", jobs.rsi_reinforced_grid_task, df, params, grid, top,
+            background=background, on_result=_on_grid, meta={"symbol": req.symbol, "granularity": req.granularity},
+        )
+
+    # generate_signals + backtest_signals em processo separado
+    return await _run_job(
+        "rsi_reinforced_backtest", jobs.rsi_reinforced_backtest_task, df, params,
+        background=background, on_result=_on_result, meta={"symbol": req.symbol, "granularity": req.granularity},
     )
 
+# -------------------------------------------------------------
+# Jobs (ProcessPoolExecutor): status, resultado e cancelamento
+# -------------------------------------------------------------
+@api_router.get("/jobs")
+async def jobs_list(limit: int = 50):
+    return {"jobs": _jobs.list(limit)}
+
+@api_router.get("/jobs/{job_id}")
+async def jobs_status(job_id: str):
+    info = _jobs.info(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return info
+
+@api_router.get("/jobs/{job_id}/result")
+async def jobs_result(job_id: str):
+    info = _jobs.info(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if info["status"] in ("queued", "running"):
+        return {**info, "result": None}
+    if info["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job {info['status']}: {info.get('error') or ''}".strip())
+    return {**info, "result": _jobs.result(job_id)}
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def jobs_cancel(job_id: str):
+    res = _jobs.cancel(job_id)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return res
+
 app.include_router(api_router)
 
 app.add_middleware(
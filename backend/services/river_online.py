@@ -55,14 +55,16 @@ class RiverOnlineService:
             }
         last = candles[-1]
         ts = last.get("epoch") or last.get("timestamp") or datetime.utcnow().timestamp()
-        info = model.predict_and_update(
+        # predição pura: janela = candles anteriores do próprio símbolo (o modelo não é alterado)
+        info = model.predict(
             timestamp=ts,
             o=float(last.get("open", 0.0)),
             h=float(last.get("high", 0.0)),
             l=float(last.get("low", 0.0)),
             c=float(last.get("close", 0.0)),
             v=float(last.get("volume", 0.0)),
-            next_close=None,
+            key=symbol,
+            history=[(float(x.get("close", 0.0)), float(x.get("volume", 0.0))) for x in candles[:-1]],
         )
         return {
             "symbol": symbol,
@@ -1,4 +1,5 @@
 from .base import BaseStrategy, StrategyContext, StrategyDecision
+from .features import CandleFeatures
 from .rsi_reinforced_strategy import RSIReinforcedStrategy
 from .ma_crossover import MACrossoverStrategy
 from .river_strategy import RiverStrategy
@@ -9,6 +10,7 @@ __all__ = [
     "BaseStrategy",
     "StrategyContext",
     "StrategyDecision",
+    "CandleFeatures",
     "RSIReinforcedStrategy",
     "MACrossoverStrategy",
     "RiverStrategy",
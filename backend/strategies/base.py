@@ -1,5 +1,5 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional, Dict, Any
 import pandas as pd
 
@@ -20,6 +20,8 @@ class StrategyContext:
     regime: Optional[Dict[str, Any]] = None
     # any config overrides
     config: Optional[Dict[str, Any]] = None
+    # indicadores compartilhados do candle atual (strategies.features.CandleFeatures), preenchido pelo DecisionEngine
+    features: Optional[Any] = None
 
 
 class BaseStrategy:
@@ -27,3 +29,19 @@ class BaseStrategy:
 
     def decide(self, df: pd.DataFrame, ctx: StrategyContext) -> StrategyDecision:
         raise NotImplementedError
+
+    # ---------------- streaming (backtest) ----------------
+    # start_stream(df, features) prepara o frame inteiro uma vez; update(bar) avança para a posição `bar`
+    # e decide_current(ctx) retorna o mesmo que decide(df.iloc[:bar + 1], ctx).
+    # O default é o caminho lento (fatia por barra); as estratégias do registry sobrescrevem com O(1) por barra.
+
+    def start_stream(self, df: pd.DataFrame, features: Any) -> None:
+        self._stream_df = df
+        self._bar = -1
+
+    def update(self, bar: int) -> None:
+        self._bar = int(bar)
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        # features do frame inteiro não valem para a fatia; decide() recalcula sobre o prefixo
+        return self.decide(self._stream_df.iloc[: self._bar + 1], replace(ctx, features=None))
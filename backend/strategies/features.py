@@ -0,0 +1,63 @@
+from __future__ import annotations
+from functools import cached_property
+from typing import Any, Callable, Dict, Tuple
+import pandas as pd
+from ml_utils import ema, rsi as rsi_fn, bollinger as bb_fn
+
+
+class CandleFeatures:
+    """Indicadores do DataFrame de candles calculados uma vez e compartilhados entre as estratégias.
+
+    Cada série é calculada sob demanda (na primeira estratégia que a usa) e reaproveitada pelas demais;
+    o DecisionEngine guarda a instância enquanto o último candle não mudar (ver `key`).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.close: pd.Series = df["close"]
+        self._memo: Dict[str, Any] = {}
+
+    def memo(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Resultado derivado só do candle (ex.: sinais do RSI reforçado), calculado uma vez por candle."""
+        if name not in self._memo:
+            self._memo[name] = fn()
+        return self._memo[name]
+
+    @staticmethod
+    def key_of(df: pd.DataFrame) -> Tuple[Any, ...]:
+        if df.empty:
+            return (0,)
+        close = df["close"]
+        return (len(df), df.index[0], df.index[-1], float(close.iat[0]), float(close.iat[-1]))
+
+    @cached_property
+    def key(self) -> Tuple[Any, ...]:
+        return self.key_of(self.df)
+
+    # ---------------- EMAs / MACD ----------------
+
+    @cached_property
+    def ema_fast(self) -> pd.Series:
+        return ema(self.close, 9)
+
+    @cached_property
+    def ema_slow(self) -> pd.Series:
+        return ema(self.close, 21)
+
+    @cached_property
+    def macd_line(self) -> pd.Series:
+        return ema(self.close, 12) - ema(self.close, 26)
+
+    @cached_property
+    def macd_sig(self) -> pd.Series:
+        return ema(self.macd_line, 9)
+
+    # ---------------- RSI / Bollinger ----------------
+
+    @cached_property
+    def rsi(self) -> pd.Series:
+        return rsi_fn(self.close, 14)
+
+    @cached_property
+    def bollinger(self) -> Tuple[pd.Series, pd.Series, pd.Series]:
+        return bb_fn(self.close, 20, 2.0)
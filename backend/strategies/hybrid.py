@@ -13,9 +13,29 @@ class HybridStrategy(BaseStrategy):
         self.ma = MACrossoverStrategy()
         self.rsi = RSIReinforcedStrategy()
 
-    def decide(self, df: pd.DataFrame, ctx: StrategyContext) -> StrategyDecision:
+    def _chooser(self, ctx: StrategyContext) -> BaseStrategy:
         reg = ctx.regime or {}
         # choose sub-strategy based on regime: trend -> MA; range -> RSI
-        chooser = self.ma if reg.get("trend_strength") in {"trend", "strong_trend"} else self.rsi
-        d = chooser.decide(df, ctx)
+        return self.ma if reg.get("trend_strength") in {"trend", "strong_trend"} else self.rsi
+
+    @staticmethod
+    def _wrap(chooser: BaseStrategy, d: StrategyDecision) -> StrategyDecision:
         return StrategyDecision(d.signal, min(1.0, d.confidence + 0.05), f"Hybrid→{chooser.name}: {d.reason}", d.meta)
+
+    def decide(self, df: pd.DataFrame, ctx: StrategyContext) -> StrategyDecision:
+        chooser = self._chooser(ctx)
+        return self._wrap(chooser, chooser.decide(df, ctx))
+
+    def start_stream(self, df: pd.DataFrame, features: Any) -> None:
+        super().start_stream(df, features)
+        self.ma.start_stream(df, features)
+        self.rsi.start_stream(df, features)
+
+    def update(self, bar: int) -> None:
+        super().update(bar)
+        self.ma.update(bar)
+        self.rsi.update(bar)
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        chooser = self._chooser(ctx)
+        return self._wrap(chooser, chooser.decide_current(ctx))
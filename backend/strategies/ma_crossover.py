@@ -2,21 +2,33 @@ from __future__ import annotations
 from typing import Dict, Any
 import pandas as pd
 from .base import BaseStrategy, StrategyContext, StrategyDecision
+from .features import CandleFeatures
 
 
 class MACrossoverStrategy(BaseStrategy):
     name = "ma_crossover"
 
     def decide(self, df: pd.DataFrame, ctx: StrategyContext) -> StrategyDecision:
-        c = df.copy()
-        if c.empty or len(c) < 25:
+        if df.empty or len(df) < 25:
             return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
-        c["ema_fast"] = c["close"].ewm(span=9, adjust=False).mean()
-        c["ema_slow"] = c["close"].ewm(span=21, adjust=False).mean()
-        c["macd_line"] = c["close"].ewm(span=12, adjust=False).mean() - c["close"].ewm(span=26, adjust=False).mean()
-        c["macd_sig"] = c["macd_line"].ewm(span=9, adjust=False).mean()
-        last = c.iloc[-1]
-        prev = c.iloc[-2]
+        feats = ctx.features if ctx.features is not None else CandleFeatures(df)
+        return self._decide_at(feats, len(df) - 1, ctx)
+
+    def start_stream(self, df: pd.DataFrame, features: CandleFeatures) -> None:
+        super().start_stream(df, features)
+        self._stream_features = features
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        # EMAs/MACD são causais: o valor do frame inteiro na barra i é o mesmo do prefixo df[:i+1]
+        if self._bar + 1 < 25:
+            return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
+        return self._decide_at(self._stream_features, self._bar, ctx)
+
+    def _decide_at(self, feats: CandleFeatures, i: int, ctx: StrategyContext) -> StrategyDecision:
+        ema_fast, ema_slow = feats.ema_fast.values, feats.ema_slow.values
+        macd_line, macd_sig = feats.macd_line.values, feats.macd_sig.values
+        last = {"ema_fast": ema_fast[i], "ema_slow": ema_slow[i], "macd_line": macd_line[i], "macd_sig": macd_sig[i]}
+        prev = {"ema_fast": ema_fast[i - 1], "ema_slow": ema_slow[i - 1]}
         reason = ""
         signal = "NEUTRAL"
         conf = 0.0
@@ -34,3 +34,10 @@ class MLEngineStrategy(BaseStrategy):
             return StrategyDecision(side, conf, "ML Engine ensemble", {"prob": float(pred.get("prob", 0.5))})
         except Exception as e:
             return StrategyDecision("NEUTRAL", 0.0, f"ml_engine erro: {e}", {})
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        # decide() só usa o comprimento e a cauda (seq_len + 10) do frame
+        n = self._bar + 1
+        if n < (self._cfg.seq_len + 10):
+            return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
+        return self.decide(self._stream_df.iloc[n - (self._cfg.seq_len + 10): n], ctx)
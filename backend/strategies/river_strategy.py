@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import Dict, Any
+import os
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from .base import BaseStrategy, StrategyContext, StrategyDecision
 # Load river model directly to avoid circular imports with server
@@ -9,27 +11,72 @@ import river_online_model
 class RiverStrategy(BaseStrategy):
     name = "river"
 
-    def __init__(self):
+    def __init__(self, path: str = river_online_model.MODEL_SAVE_PATH):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self.model = river_online_model.RiverOnlineCandleModel()
+        self._refresh_model()
+
+    def _refresh_model(self):
+        """Recarrega o modelo persistido apenas quando o arquivo muda (mtime), em vez de a cada decisão."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
         try:
-            self.model = river_online_model.RiverOnlineCandleModel.load()
+            self.model = river_online_model.RiverOnlineCandleModel.load(self.path)
+            self._mtime = mtime
         except Exception:
-            self.model = river_online_model.RiverOnlineCandleModel()
+            pass
 
     def decide(self, df: pd.DataFrame, ctx: StrategyContext) -> StrategyDecision:
         if df.empty:
             return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
         last = df.iloc[-1]
-        ts = str(last.name) if df.index.name is not None else None
         try:
-            info = self.model.predict_and_update(
-                ts or (df.index[-1].isoformat() if hasattr(df.index, 'isoformat') else None) or "",
-                float(last.get("open", last["close"])),
-                float(last.get("high", last["close"])),
-                float(last.get("low", last["close"])),
-                float(last.get("close")),
-                float(last.get("volume", 0.0)),
-                next_close=None,
-            )
+            bar = (float(last.get("open", last["close"])),
+                   float(last.get("high", last["close"])),
+                   float(last.get("low", last["close"])),
+                   float(last.get("close")),
+                   float(last.get("volume", 0.0)))
+        except Exception as e:
+            return StrategyDecision("NEUTRAL", 0.0, f"river erro: {e}", {})
+        # janela = candles anteriores do próprio df (como o StrategyRunner), nunca a janela rolante compartilhada
+        prev = df.iloc[-river_online_model.ROLLING_WINDOW:-1]
+        volume = prev["volume"] if "volume" in prev.columns else np.zeros(len(prev))
+        history = list(zip(prev["close"].to_numpy(dtype=float).tolist(), np.asarray(volume, dtype=float).tolist()))
+        return self._predict(self._timestamp_at(df, len(df) - 1), *bar, history=history)
+
+    def start_stream(self, df: pd.DataFrame, features: Any) -> None:
+        super().start_stream(df, features)
+        close = df["close"].to_numpy(dtype=float)
+        self._stream_cols = tuple(
+            df[c].to_numpy(dtype=float) if c in df.columns else (close if c != "volume" else np.zeros(len(df)))
+            for c in ("open", "high", "low", "close", "volume"))
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        # cada decisão vê o modelo persistido + o candle atual e os anteriores da própria série
+        if self._bar < 0:
+            return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
+        i = self._bar
+        o, h, l, c, v = (float(col[i]) for col in self._stream_cols)
+        lo = max(0, i - (river_online_model.ROLLING_WINDOW - 1))
+        history = list(zip(self._stream_cols[3][lo:i].tolist(), self._stream_cols[4][lo:i].tolist()))
+        return self._predict(self._timestamp_at(self._stream_df, i), o, h, l, c, v, history=history)
+
+    @staticmethod
+    def _timestamp_at(df: pd.DataFrame, i: int) -> str:
+        ts = str(df.index[i]) if df.index.name is not None else None
+        return ts or (df.index[i].isoformat() if hasattr(df.index, 'isoformat') else None) or ""
+
+    def _predict(self, ts: str, o: float, h: float, l: float, c: float, v: float,
+                 history: List[Tuple[float, float]]) -> StrategyDecision:
+        self._refresh_model()
+        # predict não altera o estado rolante: cada decisão vê o modelo persistido + os candles anteriores do símbolo
+        try:
+            info = self.model.predict(ts, o, h, l, c, v, history=history)
             prob_up = float(info.get("prob_up", 0.5))
             if prob_up >= 0.5:
                 return StrategyDecision("RISE", prob_up, "River prob_up", {"prob_up": prob_up})
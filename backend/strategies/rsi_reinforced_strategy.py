@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import Dict, Any, List
 import pandas as pd
 from .base import BaseStrategy, StrategyContext, StrategyDecision
-from rsi_reinforced import RsiReinforcedParams, generate_signals
+from rsi_reinforced import RsiReinforcedParams, generate_signals, prefix_signals
 
 
 class RSIReinforcedStrategy(BaseStrategy):
@@ -12,20 +12,45 @@ class RSIReinforcedStrategy(BaseStrategy):
         if df.empty or len(df) < 60:
             return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
         params = RsiReinforcedParams()
-        cdf, signals = generate_signals(df, params)
+        if ctx.features is not None:
+            # RSI(14) e sinais vêm do cache do candle (compartilhado com a Hybrid e entre chamadas)
+            feats = ctx.features
+            cdf, signals = feats.memo("rsi_reinforced", lambda: generate_signals(
+                df, params, rsi=feats.rsi if params.rsi_period == 14 else None))
+        else:
+            cdf, signals = generate_signals(df, params)
         # take latest signal if any
         if not signals:
             return StrategyDecision("NEUTRAL", 0.0, "sem sinal RSI reforçado", {})
         last_sig = signals[-1]
-        idx = int(last_sig["index"]) if isinstance(last_sig.get("index"), (int, float)) else None
+        return self._decide_signal(cdf, last_sig.get("index"), last_sig["side"], ctx)
+
+    def start_stream(self, df: pd.DataFrame, features: Any) -> None:
+        super().start_stream(df, features)
+        params = RsiReinforcedParams()
+        # último sinal visível em cada prefixo, calculado uma vez para o frame inteiro (compartilhado com a Hybrid)
+        self._stream_signals = features.memo("rsi_reinforced_prefix", lambda: prefix_signals(
+            df, params, rsi=features.rsi if params.rsi_period == 14 else None))
+
+    def decide_current(self, ctx: StrategyContext) -> StrategyDecision:
+        if self._bar + 1 < 60:
+            return StrategyDecision("NEUTRAL", 0.0, "dados insuficientes", {})
+        cdf, last_index, last_side = self._stream_signals
+        idx = int(last_index[self._bar])
+        if idx < 0:
+            return StrategyDecision("NEUTRAL", 0.0, "sem sinal RSI reforçado", {})
+        return self._decide_signal(cdf, idx, "CALL" if last_side[self._bar] > 0 else "PUT", ctx)
+
+    def _decide_signal(self, cdf: pd.DataFrame, index: Any, sig_side: str, ctx: StrategyContext) -> StrategyDecision:
+        idx = int(index) if isinstance(index, (int, float)) else None
         conf = 0.55
         reason = "Reentrada nas bandas RSI"
         # confidence from RSI distance from midline and band width
         try:
             if idx is not None:
-                rsi = float(cdf.iloc[idx]["rsi"])
-                mid = float(cdf.iloc[idx]["rsi_bb_mid"])
-                width = float(cdf.iloc[idx]["rsi_bb_width"])
+                rsi = float(cdf["rsi"].iat[idx])
+                mid = float(cdf["rsi_bb_mid"].iat[idx])
+                width = float(cdf["rsi_bb_width"].iat[idx])
                 dist = abs(rsi - mid)
                 # normalize
                 conf = max(0.5, min(0.9, 0.5 + (dist/20.0) + (min(width, 30.0)/100.0)))
@@ -39,5 +64,5 @@ class RSIReinforcedStrategy(BaseStrategy):
         elif reg.get("trend_strength") == "strong_trend":
             conf -= 0.05
         conf = max(0.0, min(1.0, conf))
-        side = "RISE" if last_sig["side"] == "CALL" else "FALL"
-        return StrategyDecision(side, conf, reason, {"index": last_sig.get("index")})
+        side = "RISE" if sig_side == "CALL" else "FALL"
+        return StrategyDecision(side, conf, reason, {"index": index})
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from auto_selection_bot import simulate_strategy_grid  # noqa: E402
+
+
+def _loop(closes, ma_short, ma_long, expiry, stake=1.0):
+    """_simulate_simple_strategy original: rolling(min_periods=1) + laço candle a candle."""
+    if len(closes) < max(ma_long, ma_short) + 1:
+        return 0, 0, 0.0
+    c = pd.Series(closes, dtype=float)
+    ma_diff = (c.rolling(ma_short, min_periods=1).mean() - c.rolling(ma_long, min_periods=1).mean()).values
+    trades = wins = 0
+    net = 0.0
+    for i in range(len(closes) - expiry):
+        signal = np.sign(ma_diff[i])
+        if signal == 0:
+            continue
+        trades += 1
+        if np.sign(closes[i + expiry] - closes[i]) == signal:
+            wins += 1
+            net += 0.8 * stake
+        else:
+            net -= stake
+    return trades, wins, net
+
+
+def test_grid_matches_per_series_loop():
+    rng = np.random.default_rng(13)
+    series = {
+        ("R_10", "s", 60): 6000 + np.cumsum(rng.normal(0, 0.9, 240)),
+        ("R_10", "m", 2): 6000 + np.cumsum(rng.normal(0, 1.3, 120)),
+        ("R_25", "ticks", 5): 900 + np.cumsum(rng.normal(0, 0.2, 60)),
+        ("R_50", "s", 30): 300 + np.cumsum(rng.normal(0, 0.1, 8)),  # curta: sem trades para ma_long >= 8
+    }
+    shorts, longs, expiries = [2, 3, 5], [5, 10, 20], [1, 3, 7]
+    table = simulate_strategy_grid(series, shorts, longs, expiries, stake=2.0)
+    assert len(table) == len(series) * 8 * len(expiries)  # (5, 5) é ignorado
+    for row in table.itertuples():
+        trades, wins, net = _loop(series[row.key], row.ma_short, row.ma_long, row.expiry, stake=2.0)
+        assert (row.trades, row.wins, row.losses) == (trades, wins, trades - wins), row
+        assert abs(row.net - net) < 1e-9
+    nets = table["net"].to_numpy()
+    assert np.all(nets[:-1] >= nets[1:])
+
+
+def test_flat_market_has_no_signal():
+    table = simulate_strategy_grid({"flat": np.full(50, 1234.56)}, [3], [10], [2])
+    assert table.loc[0, "trades"] == 0 and np.isnan(table.loc[0, "winrate"])
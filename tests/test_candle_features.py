@@ -0,0 +1,94 @@
+import dataclasses
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import decision_engine  # noqa: E402
+import ml_utils  # noqa: E402
+from river_online_model import RiverOnlineCandleModel  # noqa: E402
+from strategies import CandleFeatures, StrategyContext  # noqa: E402
+from strategies.river_strategy import RiverStrategy  # noqa: E402
+
+CONFIG = {
+    "weights": {"river": 0.35, "ma_crossover": 0.2, "rsi_reinforced": 0.2, "ml_engine": 0.25, "hybrid": 0.2},
+    "decision_threshold": 0.2,
+    "min_strategies_agree": 1,
+}
+
+
+def _frame(n=400, seed=8):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.6, n))
+    open_ = close + rng.normal(0, 0.2, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.3, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.3, n),
+        "close": close,
+        "volume": rng.uniform(1, 50, n),
+    }, index=pd.date_range("2024-05-01", periods=n, freq="1min", name="ts"))
+
+
+def _engine(tmp_path, df):
+    model = RiverOnlineCandleModel()
+    closes = df["close"].to_numpy()
+    for i in range(100):
+        row = df.iloc[i]
+        model.predict_and_update(str(df.index[i]), row["open"], row["high"], row["low"], row["close"], row["volume"],
+                                 next_close=float(closes[i + 1]))
+    path = tmp_path / "river.pkl"
+    path.write_bytes(pickle.dumps(model))
+    engine = decision_engine.WeightedVotingDecisionEngine(CONFIG)
+    engine.strategies["river"] = RiverStrategy(str(path))
+    return engine
+
+
+def test_cached_series_match_direct_computation():
+    df = _frame()
+    close = df["close"]
+    f = CandleFeatures(df)
+    # fórmulas das estratégias antes do cache (ewm adjust=False; RSI/Bollinger do ml_utils)
+    pd.testing.assert_series_equal(f.ema_fast, close.ewm(span=9, adjust=False).mean(), check_names=False)
+    pd.testing.assert_series_equal(f.ema_slow, close.ewm(span=21, adjust=False).mean(), check_names=False)
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    pd.testing.assert_series_equal(f.macd_line, macd, check_names=False)
+    pd.testing.assert_series_equal(f.macd_sig, macd.ewm(span=9, adjust=False).mean(), check_names=False)
+    pd.testing.assert_series_equal(f.rsi, ml_utils.rsi(close, 14), check_names=False)
+    for got, want in zip(f.bollinger, ml_utils.bollinger(close, 20, 2.0)):
+        pd.testing.assert_series_equal(got, want, check_names=False)
+    calls = []
+    assert f.memo("x", lambda: calls.append(1) or 42) == 42 and f.memo("x", lambda: calls.append(1)) == 42
+    assert calls == [1]
+
+
+def test_strategies_decide_the_same_with_and_without_shared_features(tmp_path):
+    df = _frame()
+    engine = _engine(tmp_path, df)
+    seen = set()
+    for end in range(30, len(df) + 1, 7):
+        window = df.iloc[:end]
+        for regime in (None, {"trend_strength": "strong_trend"}):
+            base = StrategyContext(regime=regime)
+            shared = dataclasses.replace(base, features=engine.features_for(window))
+            for name, strat in engine.strategies.items():
+                cached = strat.decide(window, shared)
+                fresh = strat.decide(window, base)
+                assert cached == fresh, (name, end)
+                seen.add((name, cached.signal))
+    assert {s for _, s in seen} >= {"RISE", "FALL"}
+
+
+def test_engine_reuses_features_only_for_the_same_candle(tmp_path):
+    df = _frame()
+    engine = _engine(tmp_path, df)
+    first = engine.evaluate(df.iloc[:300])
+    feats = engine._features
+    again = engine.evaluate(df.iloc[:300].copy())  # outro objeto, mesmo candle final
+    assert again == first and engine._features is feats and engine.stats["feature_hits"] == 1
+    engine.evaluate(df.iloc[:301])
+    assert engine._features is not feats and engine.stats["feature_hits"] == 1
@@ -0,0 +1,73 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from contract_lifecycle import ContractLifecycle  # noqa: E402
+
+
+def _lifecycle(**kw):
+    return ContractLifecycle(grace_sec=10, idle_ttl_sec=100, sweep_interval_sec=5, **kw)
+
+
+def test_finished_contract_is_forgotten_once_and_evicted_after_grace():
+    lc = _lifecycle()
+    recorded = {}
+    lc.attach("global_stats_recorded", recorded)
+    lc.touch(1, "sub-1", now=0)
+    lc.subscribed[1] = True
+    lc.river_learned[1] = True
+    recorded[1] = True
+
+    assert lc.finish(1, now=1) == "sub-1"
+    assert lc.finish(1, now=2) is None
+    assert not lc.subscribed and not lc.is_live(1)
+
+    assert lc.sweep(now=5) == [] and 1 in lc.river_learned  # ainda dentro da graça
+    lc.sweep(now=11)
+    assert 1 not in lc.river_learned and 1 not in recorded and 1 not in lc.last_seen
+    assert lc.is_settled(1) and lc.stats["evicted_finished"] == 1
+
+
+def test_tombstone_survives_resubscription_and_is_bounded():
+    lc = _lifecycle(max_tombstones=2)
+    for cid in (1, 2, 3):
+        lc.touch(cid, f"sub-{cid}", now=0)
+        lc.finish(cid, now=0)
+    lc.sweep(now=20)
+    assert not lc.is_settled(1) and lc.is_settled(2) and lc.is_settled(3)
+
+    # reassinatura tardia: mapas vazios, mas a lápide continua valendo
+    lc.touch(3, "sub-3b", now=30)
+    assert not lc.river_learned.get(3) and lc.is_settled(3)
+    assert lc.finish(3, now=31) == "sub-3b"
+    lc.sweep(now=50)
+    assert lc.is_settled(3) and list(lc.tombstones) == [2, 3]
+
+
+def test_idle_contracts_are_evicted_unless_a_client_still_watches():
+    lc = _lifecycle()
+    queues = {1: [], 2: ["ws-client"]}
+    lc.attach_queues(queues)
+    lc.touch(1, "sub-1", now=0)
+    lc.touch(2, "sub-2", now=0)
+    lc.last_data[1] = {"profit": 1.0}
+
+    assert sorted(lc.sweep(now=100)) == ["sub-1"]
+    assert 1 not in lc.last_data and 1 not in queues and not lc.is_settled(1)
+    assert lc.is_live(2) and queues[2] == ["ws-client"]
+
+
+def test_sweep_is_rate_limited_and_disconnect_drops_subscriptions():
+    lc = _lifecycle()
+    lc.touch(1, "sub-1", now=0)
+    lc.finish(1, now=0)
+    lc.sweep(now=6)
+    assert lc.sweep(now=10) == [] and 1 in lc.finished_at  # < sweep_interval desde a última
+    lc.sweep(now=10, force=True)
+    assert 1 not in lc.finished_at
+
+    lc.touch(2, "sub-2", now=20)
+    lc.subscribed[2] = True
+    lc.on_disconnect()
+    assert not lc.subscribed and not lc.subscription_ids and lc.is_live(2)
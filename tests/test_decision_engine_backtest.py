@@ -0,0 +1,81 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import decision_engine  # noqa: E402
+from backtesting_utils import decision_engine_backtest  # noqa: E402
+from river_online_model import RiverOnlineCandleModel  # noqa: E402
+from strategies import StrategyContext  # noqa: E402
+from strategies.river_strategy import RiverStrategy  # noqa: E402
+
+CONFIG = {
+    "weights": {"river": 0.35, "ma_crossover": 0.2, "rsi_reinforced": 0.2, "ml_engine": 0.25, "hybrid": 0.2},
+    "decision_threshold": 0.2,
+    "min_strategies_agree": 1,
+}
+
+
+def _frame(n=500, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.6, n))
+    open_ = close + rng.normal(0, 0.2, n)
+    index = pd.date_range("2024-05-01", periods=n, freq="1min", name="ts")
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.3, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.3, n),
+        "close": close,
+        "volume": rng.uniform(1, 50, n),
+    }, index=index)
+
+
+def _river_file(tmp_path, df):
+    model = RiverOnlineCandleModel()
+    closes = df["close"].to_numpy()
+    for i in range(120):
+        row = df.iloc[i]
+        model.predict_and_update(str(df.index[i]), row["open"], row["high"], row["low"], row["close"], row["volume"],
+                                 next_close=float(closes[i + 1]))
+    path = tmp_path / "river.pkl"
+    path.write_bytes(pickle.dumps(model))
+    return str(path)
+
+
+def _make_engine(river_path):
+    def make(cfg=None):
+        engine = decision_engine.WeightedVotingDecisionEngine(cfg or CONFIG)
+        engine.strategies["river"] = RiverStrategy(river_path)
+        return engine
+    return make
+
+
+def test_step_matches_evaluate_on_prefix(tmp_path):
+    df = _frame()
+    make = _make_engine(_river_file(tmp_path, df))
+    stream, ref = make(), make()
+    stream.start_stream(df)
+    signals = set()
+    for regime in (None, {"trend_strength": "strong_trend"}, {"trend_strength": "range"}):
+        ctx = StrategyContext(regime=regime)
+        for i in range(0, len(df), 3):
+            fast = stream.step(i, ctx)
+            slow = ref.evaluate(df.iloc[: i + 1], ctx)
+            assert fast == slow
+            signals.update((d["strategy"], d["decision"]["signal"]) for d in fast["details"] if "decision" in d)
+    # a comparação cobre sinais de todas as estratégias com sinal, não só NEUTRAL
+    assert {("ma_crossover", "RISE"), ("ma_crossover", "FALL"), ("river", "RISE")} <= signals
+    assert signals & {("rsi_reinforced", "RISE"), ("rsi_reinforced", "FALL")}
+
+
+def test_streaming_backtest_matches_slow_path(tmp_path):
+    df = _frame(400, seed=4)
+    make = _make_engine(_river_file(tmp_path, df))
+    fast = decision_engine_backtest(df, make, CONFIG)
+    slow = decision_engine_backtest(df, make, CONFIG, streaming=False)
+    assert fast == slow
+    assert fast["trades"] > 0
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from history_store import CandleHistoryStore, HistoryDownloader  # noqa: E402
+
+G = 60
+
+
+class FakeDeriv:
+    """ticks_history determinístico: candle de epoch e tem close = e / G; nada dentro de `closed` (mercado fechado)."""
+
+    def __init__(self, closed=()):
+        self.calls = []
+        self.fail = False
+        self.closed = closed
+
+    async def fetch(self, symbol, granularity, start, end, count):
+        if self.fail:
+            raise ConnectionError("offline")
+        self.calls.append((start, end))
+        first = end - 30 * 86400 if start is None else start - start % granularity
+        epochs = [e for e in range(first, end + 1, granularity) if not any(a <= e <= b for a, b in self.closed)]
+        return [{"epoch": e, "open": e / G, "high": e / G + 1, "low": e / G - 1, "close": e / G} for e in epochs][-count:]
+
+
+def test_pages_backwards_and_fetches_only_missing_tail(tmp_path):
+    deriv = FakeDeriv()
+    dl = HistoryDownloader(deriv.fetch, CandleHistoryStore(tmp_path), page_size=100, rate_per_sec=0)
+    now = 1_700_000_000
+    last_closed = (now // G) * G - G
+
+    first = asyncio.run(dl.get("R_10", G, 450, now=now))
+    assert len(first) == 450 and len(deriv.calls) == 5
+    assert deriv.calls[:2] == [(None, last_closed), (None, last_closed - 100 * G)]
+    assert [c["epoch"] for c in first] == list(range(last_closed - 449 * G, last_closed + 1, G))
+    assert all(c["close"] == c["epoch"] / G for c in first)
+
+    deriv.calls.clear()
+    again = asyncio.run(dl.get("R_10", G, 450, now=now + 30))
+    assert again == first and deriv.calls == []
+
+    later = asyncio.run(dl.get("R_10", G, 450, now=now + 10 * G))
+    assert deriv.calls == [(last_closed + G, last_closed + 10 * G)]
+    assert later[-1]["epoch"] == last_closed + 10 * G and len(later) == 450
+
+    # a 1ª carga trouxe 5 páginas inteiras (500 candles): só falta uma página para 600
+    deriv.calls.clear()
+    longer = asyncio.run(dl.get("R_10", G, 600, now=now + 10 * G))
+    assert deriv.calls == [(None, last_closed - 500 * G)] and len(longer) == 600
+    assert longer[-450:] == later
+
+
+def test_falls_back_to_store_when_download_fails(tmp_path):
+    deriv = FakeDeriv()
+    dl = HistoryDownloader(deriv.fetch, CandleHistoryStore(tmp_path), page_size=1000, rate_per_sec=0)
+    now = 1_700_000_000
+    stored = asyncio.run(dl.get("R_10", G, 300, now=now))
+    deriv.fail = True
+    assert asyncio.run(dl.get("R_10", G, 300, now=now + 5 * G)) == stored
+
+
+def test_downloads_only_the_requested_window_and_tracks_holes(tmp_path):
+    deriv = FakeDeriv()
+    store = CandleHistoryStore(tmp_path)
+    dl = HistoryDownloader(deriv.fetch, store, page_size=1000, rate_per_sec=0)
+    now = 1_700_000_000
+    last_closed = (now // G) * G - G
+    asyncio.run(dl.get("R_10", G, 100, now=now))
+    assert store.coverage("R_10", G) == [(last_closed - 999 * G, last_closed)]
+
+    # dias depois: uma página acima do topo, não o buraco inteiro desde a última chamada
+    later_now = now + 3 * 86400
+    later_closed = (later_now // G) * G - G
+    deriv.calls.clear()
+    recent = asyncio.run(dl.get("R_10", G, 100, now=later_now))
+    assert deriv.calls == [(later_closed - 999 * G, later_closed)]
+    assert [c["epoch"] for c in recent] == list(range(later_closed - 99 * G, later_closed + 1, G))
+    assert store.coverage("R_10", G) == [(last_closed - 999 * G, last_closed), (later_closed - 999 * G, later_closed)]
+
+    # janela que atravessa o buraco: baixa só o que falta entre as duas faixas, em janelas de page_size
+    deriv.calls.clear()
+    span = (later_closed - last_closed) // G + 150
+    longer = asyncio.run(dl.get("R_10", G, span, now=later_now))
+    assert [c["epoch"] for c in longer] == list(range(later_closed - (span - 1) * G, later_closed + 1, G))
+    assert all(s is not None for s, _ in deriv.calls)
+    assert min(s for s, _ in deriv.calls) == last_closed + G and max(e for _, e in deriv.calls) == later_closed - 1000 * G
+    assert store.coverage("R_10", G) == [(last_closed - 999 * G, later_closed)]
+
+
+def test_closed_market_gap_is_paged_by_candle_count(tmp_path):
+    now = 1_700_000_000
+    last_closed = (now // G) * G - G
+    # fim de semana: mercado fechado nas últimas 48h até agora
+    weekend = (last_closed - 48 * 3600 + G, last_closed + 10 * 86400)
+    deriv = FakeDeriv(closed=[weekend])
+    store = CandleHistoryStore(tmp_path)
+    dl = HistoryDownloader(deriv.fetch, store, page_size=300, rate_per_sec=0)
+
+    candles = asyncio.run(dl.get("frxEURUSD", G, 1000, now=now))
+    friday = weekend[0] - G
+    assert [c["epoch"] for c in candles] == list(range(friday - 999 * G, friday + 1, G))
+    assert len(deriv.calls) == 4 and deriv.calls[0] == (None, last_closed)
+    assert store.coverage("frxEURUSD", G) == [(friday - 1199 * G, last_closed)]
+
+    # ainda fechado: nada a baixar, mesma resposta
+    deriv.calls.clear()
+    assert asyncio.run(dl.get("frxEURUSD", G, 1000, now=now + 10)) == candles and deriv.calls == []
+
+    # mercado reabre: só a janela nova é buscada e a resposta atravessa o buraco com `count` candles reais
+    deriv.closed = [(weekend[0], last_closed + 20 * G)]
+    deriv.calls.clear()
+    reopened = asyncio.run(dl.get("frxEURUSD", G, 1000, now=now + 30 * G))
+    new_closed = last_closed + 30 * G
+    assert deriv.calls == [(last_closed + G, new_closed)]
+    assert len(reopened) == 1000 and reopened[-1]["epoch"] == new_closed
+    assert [c["epoch"] for c in reopened[-11:]] == [friday] + list(range(last_closed + 21 * G, new_closed + 1, G))
+
+
+def test_legacy_meta_without_ranges_is_read_as_one_range(tmp_path):
+    import json
+
+    store = CandleHistoryStore(tmp_path)
+    store.merge("R_10", G, [{"epoch": e, "open": 1, "high": 1, "low": 1, "close": 1} for e in range(0, 10 * G, G)], [(0, 9 * G)])
+    meta_path = tmp_path / f"R_10_{G}" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    del meta["ranges"]
+    meta_path.write_text(json.dumps(meta))
+    assert store.coverage("R_10", G) == [(0, 9 * G)]
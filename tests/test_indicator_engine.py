@@ -0,0 +1,90 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import ml_utils  # noqa: E402
+from indicator_engine import IndicatorEngine  # noqa: E402
+
+
+def _series(n=400, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 6000 + np.cumsum(rng.normal(0, 0.8, n))
+    high = close + rng.uniform(0, 0.6, n)
+    low = close - rng.uniform(0, 0.6, n)
+    return high, low, close
+
+
+def _close(a, b, tol=1e-6):
+    if b is None or (isinstance(b, float) and math.isnan(b)):
+        return a is None
+    return a is not None and abs(a - b) <= tol * max(1.0, abs(b))
+
+
+def test_parity_with_ml_utils_each_step():
+    high, low, close = _series()
+    h, lo, c = pd.Series(high), pd.Series(low), pd.Series(close)
+    rsi = ml_utils.rsi(c, 14).tolist()
+    line, sig, hist = (s.tolist() for s in ml_utils.macd(c, 12, 26, 9))
+    mid, up, dn = (s.tolist() for s in ml_utils.bollinger(c, 20, 2.0))
+    adx = ml_utils.adx(h, lo, c, 14).tolist()
+    atr = ml_utils.atr(h, lo, c, 14).tolist()
+    sma9 = ml_utils.sma(c, 9).tolist()
+    sma21 = ml_utils.sma(c, 21).tolist()
+
+    eng = IndicatorEngine()
+    for i in range(len(close)):
+        eng.update(high[i], low[i], close[i], epoch=i * 60)
+        s = eng.snapshot()
+        assert _close(s["rsi"], rsi[i]), ("rsi", i)
+        assert _close(s["macd"], line[i]), ("macd", i)
+        assert _close(s["macd_signal"], sig[i]), ("macd_signal", i)
+        assert _close(s["macd_hist"], hist[i]), ("macd_hist", i)
+        assert _close(s["bb_mid"], mid[i]), ("bb_mid", i)
+        assert _close(s["bb_upper"], up[i]), ("bb_upper", i)
+        assert _close(s["bb_lower"], dn[i]), ("bb_lower", i)
+        assert _close(s["adx"], adx[i]), ("adx", i)
+        assert _close(s["atr"], atr[i]), ("atr", i)
+        assert _close(s["sma_9"], sma9[i]), ("sma_9", i)
+        assert _close(s["sma_21"], sma21[i]), ("sma_21", i)
+
+
+def test_revise_matches_final_candle():
+    high, low, close = _series(120, seed=3)
+    ref = IndicatorEngine()
+    live = IndicatorEngine()
+    for i in range(len(close)):
+        ref.update(high[i], low[i], close[i], epoch=i)
+        # forming candle: several intermediate revisions before the final values
+        live.update(close[i - 1] if i else close[0], close[i - 1] if i else close[0],
+                    close[i - 1] if i else close[0], epoch=i)
+        live.revise(high[i] - 0.1, low[i] + 0.1, (high[i] + low[i]) / 2)
+        live.revise(high[i], low[i], close[i])
+        a, b = live.snapshot(), ref.snapshot()
+        for k in b:
+            assert _close(a[k], b[k], 1e-9), (k, i)
+    assert len(live.history()) == 5
+
+
+def test_sync_incremental_equals_full_replay():
+    high, low, close = _series(300, seed=11)
+    candles = [{"epoch": i * 60, "high": high[i], "low": low[i], "close": close[i]} for i in range(len(close))]
+    eng = IndicatorEngine()
+    eng.sync(candles[:200])
+    # window slides forward, last candle still forming and then finalized
+    forming = dict(candles[200], close=candles[199]["close"])
+    eng.sync(candles[1:200] + [forming])
+    snap = eng.sync(candles[50:250])
+    full = IndicatorEngine()
+    for c in candles[:250]:
+        full.update(c["high"], c["low"], c["close"], c["epoch"])
+    for k, v in full.snapshot().items():
+        assert _close(snap[k], v, 1e-9), k
+    assert eng.count == 250
+    # unrelated window forces a replay from that window only
+    eng.sync(candles[280:300])
+    assert eng.count == 20
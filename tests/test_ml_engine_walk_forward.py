@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import ml_engine  # noqa: E402
+
+
+def _candles(n=700, seed=9):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    open_ = close + rng.normal(0, 0.01, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.02, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.02, n),
+        "close": close,
+        "volume": rng.uniform(1, 10, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="1min"))
+
+
+def _cfg():
+    cfg = ml_engine.MLConfig()
+    cfg.seq_len = 16
+    cfg.lgb_params = dict(cfg.lgb_params, n_estimators=40, n_jobs=1)
+    return cfg
+
+
+def test_walk_forward_fold_matches_per_window_inference():
+    df = _candles()
+    cfg = _cfg()
+    horizon = 3
+    # janela de treino cobre o warmup da inferência: a partir dela as features do prefixo = as da série toda
+    folds = ml_engine._walk_forward_folds(df, train_window_sec=400 * 60, test_window_sec=120 * 60, step_sec=300 * 60,
+                                          cfg=cfg, horizon=horizon, use_transformer=False, calibrate="none")
+    assert len(folds) == 1
+    fold = folds[0]
+    res = ml_engine._walk_forward_fold(fold)
+
+    tm = ml_engine.fit_models_from_dataset(fold["X_train"], None, fold["y_train"], fold["features"], cfg,
+                                           use_transformer=False, calibrate="none", compute_shap=False)
+    prob_lgb, _ = ml_engine.predict_batch(fold["X_test"], None, tm, cfg)
+    c, d = fold["test_index"]
+    close = df["close"].to_numpy()
+    ref_probs, wins, net = [], 0, 0.0
+    for t in range(c, d):
+        pred = ml_engine.predict_from_models(df.iloc[:t + 1], tm, cfg)
+        ref_probs.append(pred["prob_lgb"])
+        win = close[t + horizon] > close[t] if pred["direction"] == "CALL" else close[t + horizon] < close[t]
+        wins += int(win)
+        net += 0.8 if win else -1.0
+
+    assert np.allclose(prob_lgb, ref_probs, atol=1e-9)
+    assert res["trades"] == d - c and res["wins"] == wins
+    assert abs(res["net"] - net) < 1e-9
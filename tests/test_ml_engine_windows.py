@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import ml_engine  # noqa: E402
+
+
+def _candles(n=600, seed=21):
+    rng = np.random.default_rng(seed)
+    close = 2500 + np.cumsum(rng.normal(0, 0.7, n))
+    open_ = close + rng.normal(0, 0.2, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.3, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.3, n),
+        "close": close,
+        "volume": rng.uniform(1, 20, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="1min"))
+
+
+def _naive_aggregates(arr, seq_len):
+    """Laço da versão original: mean/std/last de cada janela materializada."""
+    rows = []
+    for i in range(len(arr) - seq_len + 1):
+        w = arr[i:i + seq_len]
+        rows.append(np.concatenate([w.mean(axis=0), w.std(axis=0), w[-1]]))
+    return np.vstack(rows)
+
+
+def test_window_aggregates_match_materialized_windows():
+    rng = np.random.default_rng(2)
+    arr = np.column_stack([
+        rng.normal(0, 1, 300),
+        1e6 + rng.normal(0, 1e-3, 300),  # offset grande, variância pequena
+        np.full(300, 7.5),  # coluna constante: std exatamente 0
+        np.cumsum(rng.normal(0, 1, 300)),
+    ])
+    for seq_len in (1, 5, 32, 300):
+        got = ml_engine.window_aggregates(arr, seq_len)
+        want = _naive_aggregates(arr, seq_len)
+        assert got.shape == want.shape
+        assert np.allclose(got, want, rtol=1e-7, atol=1e-9)
+        assert np.all(got[:, 4 + 2] == 0.0)
+    assert ml_engine.window_aggregates(arr[:3], 5).shape == (0, 12)
+
+
+def test_sequence_windows_are_the_sliding_windows():
+    arr = np.arange(40, dtype=float).reshape(10, 4)
+    got = ml_engine.sequence_windows(arr, 3)
+    assert got.shape == (8, 3, 4)
+    assert np.array_equal(got, np.stack([arr[i:i + 3] for i in range(8)]))
+
+
+def test_inference_window_matches_full_history_features():
+    df = _candles()
+    seq_len = 32
+    feat = ml_engine.multi_scale_features(df.copy(), ml_engine.CFG.feat_freqs)
+    features = list(feat.columns)
+    full = feat[features].to_numpy(dtype=float)
+    x_lgb, x_seq = ml_engine.build_inference_window(df, seq_len, features)
+    assert x_seq.shape == (1, seq_len, len(features))
+    # só seq_len + FEATURE_WARMUP linhas featurizadas: mesmos valores (EMA convergida) que a série inteira
+    assert np.allclose(x_seq[0], full[-seq_len:], rtol=1e-8, atol=1e-8)
+    assert np.allclose(x_lgb, _naive_aggregates(full[-seq_len:], seq_len), rtol=1e-7, atol=1e-8)
+
+
+def test_supervised_dataset_matches_original_window_loop():
+    df = _candles(300)
+    seq_len, horizon = 16, 3
+    X_lgb, X_seq, y, features = ml_engine.build_supervised_dataset(df, seq_len=seq_len, horizon=horizon)
+
+    ref = ml_engine.multi_scale_features(df.copy(), ml_engine.CFG.feat_freqs)
+    ref["future_close"] = ref["close"].shift(-horizon)
+    ref["target"] = (ref["future_close"] > ref["close"]).astype(int)
+    ref = ref.dropna()
+    arr = ref[features].to_numpy(dtype=float)
+    windows = np.stack([arr[i:i + seq_len] for i in range(len(arr) - seq_len + 1)])
+    assert np.array_equal(X_seq, windows)
+    assert np.array_equal(y, ref["target"].values[seq_len - 1:])
+    assert np.allclose(X_lgb, _naive_aggregates(arr, seq_len), rtol=1e-7, atol=1e-9)
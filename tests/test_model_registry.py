@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import ml_engine  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+KEY = ("R_10", "1m", 3)
+
+
+def _models(tag, transformer=None):
+    # qualquer objeto serializável serve de "LGB" para o registry (predição não é exercitada aqui)
+    tm = ml_engine.TrainedModels(lgb_model={"tag": tag}, features=["f"], lgb_feat_dim=1)
+    tm.transformer = transformer
+    return tm
+
+
+def _train(reg, key, version, tag=None, transformer=None):
+    tm = _models(tag or f"{key[0]}-{version}", transformer)
+    path = reg.artifact_path(key, version)
+    ml_engine.save_trained_models(tm, path)
+    return reg.register(key, version, path, tm), tm
+
+
+def test_register_hot_swaps_unless_pinned(tmp_path):
+    reg = ModelRegistry(models_dir=str(tmp_path), keep_versions=2)
+    assert _train(reg, KEY, 1)[0] and reg.active[KEY] == 1
+    assert _train(reg, KEY, 2)[0] and reg.active[KEY] == 2
+    assert reg.pin(KEY) == 2
+    swapped, _ = _train(reg, KEY, 3)
+    assert not swapped and reg.active[KEY] == 2
+    assert reg.unpin(KEY) == 3
+    # keep_versions=2: v1 saiu do índice e do disco
+    assert sorted(reg.versions[KEY]) == [2, 3]
+    assert not (tmp_path / "ml_engine_R_10_1m_h3_v1_meta.pkl").exists()
+
+
+def test_resolve_falls_back_to_latest_key_of_symbol(tmp_path):
+    reg = ModelRegistry(models_dir=str(tmp_path))
+    _train(reg, ("R_10", "1m", 3), 1)
+    _train(reg, ("R_10", "5m", 5), 2)
+    assert reg.resolve("R_10", "1m", 3) == ("R_10", "1m", 3)
+    assert reg.resolve("R_10", "15m", 3) == ("R_10", "5m", 5)
+    assert reg.resolve("R_25") is None
+
+
+def test_lru_evicts_and_reloads_off_the_event_loop(tmp_path):
+    reg = ModelRegistry(models_dir=str(tmp_path), max_resident=1)
+    k1, k2 = ("R_10", "1m", 3), ("R_25", "1m", 3)
+    _, tm1 = _train(reg, k1, 1)
+    _train(reg, k2, 2)
+    assert (k1, 1) not in reg.resident and reg.stats["evictions"] == 1
+
+    loaded = asyncio.run(reg.aget(k1))
+    assert loaded is not tm1 and loaded.lgb_model == {"tag": "R_10-1"}
+    assert reg.stats["loads"] == 1 and list(reg.resident) == [(k1, 1)]
+    assert asyncio.run(reg.aget(k1)) is loaded and reg.stats["hits"] == 1
+
+    # scan de um registry novo indexa os mesmos artefatos sem carregar
+    fresh = ModelRegistry(models_dir=str(tmp_path))
+    assert fresh.scan() == 2 and not fresh.resident
+    assert fresh.get(k2).lgb_model == {"tag": "R_25-2"}
+
+
+def test_versions_with_unreloadable_transformer_stay_resident(tmp_path):
+    reg = ModelRegistry(models_dir=str(tmp_path), max_resident=1)
+    k1, k2 = ("R_10", "1m", 3), ("R_25", "1m", 3)
+    trans = object()  # sem input_dim gravado no meta: load_trained_models não o reconstruiria
+    _, tm1 = _train(reg, k1, 1, transformer=trans)
+    _train(reg, k2, 2)
+    assert reg.resident[(k1, 1)] is tm1
+    assert asyncio.run(reg.aget(k1)).transformer is trans
+
+
+def test_transformer_round_trips_through_artifacts(tmp_path):
+    torch = pytest.importorskip("torch")
+    trans = ml_engine.SeqTransformer(input_dim=4).eval()
+    tm = _models("t", transformer=trans)
+    prefix = str(tmp_path / "ml_engine_R_10_1m_h3_v1")
+    ml_engine.save_trained_models(tm, prefix)
+    assert ml_engine.can_reload_transformer(prefix)
+    loaded = ml_engine.load_trained_models(prefix, ml_engine.MLConfig())
+    x = torch.randn(2, 8, 4)
+    with torch.no_grad():
+        assert torch.allclose(loaded.transformer(x), trans(x))
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import backtesting_utils  # noqa: E402
+from backtesting_utils import load_csv_ohlcv  # noqa: E402
+
+
+def _write_csv(path, n=500, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    pd.DataFrame({
+        "epoch": 1_700_000_000 + 60 * np.arange(n),
+        "Open": close + rng.normal(0, 0.1, n),
+        "High": close + 1.0,
+        "Low": close - 1.0,
+        "Close": close,
+        "symbol": "R_10",
+    }).to_csv(path, index=False)
+
+
+def _setup(tmp_path, monkeypatch):
+    csv = tmp_path / "R_10_1m.csv"
+    monkeypatch.setattr(backtesting_utils, "OHLCV_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(backtesting_utils, "_candidate_csv_paths", lambda symbol, timeframe: [csv])
+    return csv
+
+
+def _assert_matches_plain_parse(df, csv):
+    """Cache devolve as colunas numéricas do parse direto do CSV, em float64, com o mesmo índice."""
+    ref = backtesting_utils._read_csv_ohlcv(csv)
+    numeric = [c for c in ref.columns if np.issubdtype(ref[c].dtype, np.number)]
+    assert list(df.columns) == numeric
+    assert df.index.equals(ref.index) and df.index.name == ref.index.name
+    np.testing.assert_array_equal(df.to_numpy(), ref[numeric].to_numpy(dtype=np.float64))
+
+
+def test_memmap_cache_matches_plain_csv_parse(tmp_path, monkeypatch):
+    csv = _setup(tmp_path, monkeypatch)
+    _write_csv(csv)
+
+    first = load_csv_ohlcv("R_10", "1m")
+    meta_path, values_path, _ = backtesting_utils._ohlcv_cache_files("R_10", "1m")
+    assert meta_path.exists() and values_path.exists()
+    _assert_matches_plain_parse(first, csv)
+
+    # segunda carga vem do .npy memory-mapped, sem reparse
+    parses = []
+    read_csv = backtesting_utils._read_csv_ohlcv
+    monkeypatch.setattr(backtesting_utils, "_read_csv_ohlcv", lambda p: parses.append(p) or read_csv(p))
+    second = load_csv_ohlcv("R_10", "1m")
+    assert parses == []
+    monkeypatch.setattr(backtesting_utils, "_read_csv_ohlcv", read_csv)
+    _assert_matches_plain_parse(second, csv)
+
+    uncached = load_csv_ohlcv("R_10", "1m", use_cache=False)
+    assert "symbol" in uncached.columns
+    pd.testing.assert_frame_equal(second, uncached[list(second.columns)].astype(np.float64), check_freq=False)
+
+
+def test_cache_is_invalidated_when_csv_changes(tmp_path, monkeypatch):
+    csv = _setup(tmp_path, monkeypatch)
+    _write_csv(csv, n=300)
+    assert len(load_csv_ohlcv("R_10", "1m")) == 300
+
+    _write_csv(csv, n=420, seed=9)
+    reloaded = load_csv_ohlcv("R_10", "1m")
+    assert len(reloaded) == 420
+    _assert_matches_plain_parse(reloaded, csv)
@@ -0,0 +1,139 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import river_online_model  # noqa: E402
+from river_online_model import RiverOnlineCandleModel  # noqa: E402
+from strategies.base import StrategyContext  # noqa: E402
+from strategies.river_strategy import RiverStrategy  # noqa: E402
+
+
+def _frame(n=600, seed=5, start="2024-03-01 23:30:00"):
+    rng = np.random.default_rng(seed)
+    close = 1000 + np.cumsum(rng.normal(0, 1.5, n))
+    open_ = close + rng.normal(0, 0.5, n)
+    return pd.DataFrame({
+        "datetime": pd.date_range(start, periods=n, freq="1min").strftime("%Y-%m-%d %H:%M:%S"),
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 1, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 1, n),
+        "close": close,
+        "volume": rng.uniform(1, 100, n),
+    })
+
+
+def _per_candle(model, df):
+    feats, logs = [], []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        nxt = float(df.iloc[i + 1]["close"]) if i + 1 < len(df) else None
+        info = model.predict_and_update(row["datetime"], float(row["open"]), float(row["high"]), float(row["low"]),
+                                        float(row["close"]), float(row["volume"]), next_close=nxt)
+        feats.append(info["features"])
+        if i % 100 == 0:
+            logs.append({"i": i, "prob_up": round(info["prob_up"], 4), "pred": int(info["pred_class"]), "label": info.get("label")})
+    return feats, logs
+
+
+def _batch(model, df):
+    closes = df["close"].to_numpy(dtype=float)
+    xs = model.make_features_many(df["datetime"].tolist(), df["open"].to_numpy(), df["high"].to_numpy(),
+                                  df["low"].to_numpy(), closes, df["volume"].to_numpy())
+    logs = model.predict_and_update_many(xs, closes[1:].tolist() + [None])
+    return xs, logs
+
+
+def _same_state(a, b):
+    assert a.sample_count == b.sample_count
+    assert a.metric_acc.get() == b.metric_acc.get()
+    assert a.metric_logloss.get() == b.metric_logloss.get()
+    assert list(a.closes) == list(b.closes)
+    assert list(a.vols) == list(b.vols)
+    lr_a, lr_b = a.model["LogisticRegression"], b.model["LogisticRegression"]
+    assert dict(lr_a.weights) == dict(lr_b.weights)
+    assert lr_a.intercept == lr_b.intercept
+
+
+def test_batch_matches_per_candle_path():
+    df = _frame()
+    slow, fast = RiverOnlineCandleModel(), RiverOnlineCandleModel()
+    feats_slow, logs_slow = _per_candle(slow, df)
+    feats_fast, logs_fast = _batch(fast, df)
+    assert feats_slow == feats_fast
+    assert logs_slow == logs_fast
+    _same_state(slow, fast)
+
+
+def test_batch_continues_existing_rolling_state():
+    df = _frame(300, seed=9)
+    slow, fast = RiverOnlineCandleModel(), RiverOnlineCandleModel()
+    # estado parcial (menos que ROLLING_WINDOW) antes do lote
+    _per_candle(slow, df.iloc[:20])
+    _per_candle(fast, df.iloc[:20])
+    feats_slow, _ = _per_candle(slow, df.iloc[20:])
+    feats_fast, _ = _batch(fast, df.iloc[20:])
+    assert feats_slow == feats_fast
+    _same_state(slow, fast)
+
+
+def test_run_on_dataframe_uses_batch_path(monkeypatch, tmp_path):
+    saves = []
+    monkeypatch.setattr(RiverOnlineCandleModel, "save", lambda self, path=None: saves.append(path))
+    df = _frame(250, seed=2)
+    res = river_online_model.run_on_dataframe(df.sample(frac=1.0, random_state=0), RiverOnlineCandleModel(), save=False)
+    assert saves == []
+    ref = RiverOnlineCandleModel()
+    _, logs = _per_candle(ref, df)
+    assert res["summary"]["samples"] == len(df) - 1
+    assert res["summary"]["logs"] == logs[-5:]
+    _same_state(res["model"], ref)
+
+
+def test_predict_is_side_effect_free_and_matches_update_path():
+    import copy
+    import pickle
+
+    df = _frame(300)
+    model = RiverOnlineCandleModel()
+    _per_candle(model, df.iloc[:250])
+    frozen = pickle.dumps(model)
+    ref = copy.deepcopy(model)
+    for i in range(250, 260):
+        row = df.iloc[i]
+        args = (row["datetime"], float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"]), float(row["volume"]))
+        expected = copy.deepcopy(ref).predict_and_update(*args, next_close=None)
+        assert model.predict(*args) == expected
+        history = list(zip(df["close"].iloc[i - 49:i].astype(float), df["volume"].iloc[i - 49:i].astype(float)))
+        assert model.predict(*args, history=history)["features"] == _per_candle(copy.deepcopy(RiverOnlineCandleModel()), df.iloc[i - 49:i + 1])[0][-1]
+    assert pickle.dumps(model) == frozen
+
+    # learn avança só a janela da chave, uma vez por candle
+    row = df.iloc[260]
+    args = (row["datetime"], float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"]), float(row["volume"]))
+    model.learn(*args, next_close=float(df.iloc[261]["close"]), key="R_10")
+    model.learn(*args, next_close=float(df.iloc[261]["close"]), key="R_10")
+    assert len(model.windows["R_10"][0]) == 1 and model.sample_count == ref.sample_count + 1
+    assert list(model.closes) == list(ref.closes)
+
+
+def test_unknown_key_and_strategy_never_use_the_shared_default_window():
+    df = _frame(300)
+    other = _frame(300, seed=9)
+    model = RiverOnlineCandleModel()
+    _per_candle(model, other.iloc[:100])  # janela padrão cheia com candles de outro símbolo
+    row = df.iloc[200]
+    args = (row["datetime"], float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"]), float(row["volume"]))
+    assert model.predict(*args, key="R_25") == model.predict(*args, history=[])
+    assert model.predict(*args, key="R_25")["features"] != model.predict(*args)["features"]
+
+    strat = RiverStrategy(path=os.devnull)
+    strat.model = model
+    cdf = df.iloc[:201].set_index(pd.DatetimeIndex(pd.to_datetime(df["datetime"].iloc[:201]), name="timestamp"))
+    prev = df.iloc[201 - river_online_model.ROLLING_WINDOW:200]
+    expected = model.predict(str(cdf.index[-1]), *args[1:], history=list(zip(prev["close"], prev["volume"])))
+    decision = strat.decide(cdf, StrategyContext(symbol="R_10"))
+    assert decision.meta["prob_up"] == expected["prob_up"] != model.predict(str(cdf.index[-1]), *args[1:])["prob_up"]
@@ -0,0 +1,81 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from backtesting_utils import river_threshold_sweep  # noqa: E402
+
+
+def _inputs(n=800, seed=4):
+    rng = np.random.default_rng(seed)
+    close = 500 + np.cumsum(rng.normal(0, 15.0, n))
+    adx = rng.uniform(10, 40, n)
+    rsi = rng.uniform(15, 85, n)
+    adx[:30] = np.nan  # warmup dos indicadores
+    rsi[rng.choice(n, 20, replace=False)] = np.nan
+    return close, adx, rsi
+
+
+def _loop(close, adx, rsi, threshold, warmup=50, payout=0.95):
+    """Laço por threshold/candle do river_backtest_run original (sem o KeyError de 'timestamp')."""
+    pnls = []
+    for i in range(warmup, len(close) - 1):
+        momentum = (close[i] - close[i - 1]) / close[i - 1]
+        prob_up = max(0.1, min(0.9, 0.5 + momentum * 2))
+        signal = "RISE" if prob_up >= threshold else ("FALL" if prob_up <= 1.0 - threshold else None)
+        if signal is None or math.isnan(adx[i]) or math.isnan(rsi[i]):
+            continue
+        if signal == "RISE" and rsi[i] < 70 and adx[i] > 22:
+            pnls.append(payout if close[i + 1] > close[i] else -1.0)
+        elif signal == "FALL" and rsi[i] > 30 and adx[i] > 22:
+            pnls.append(payout if close[i + 1] < close[i] else -1.0)
+    if not pnls:
+        return {"trades": 0, "wins": 0, "pnl_total": 0.0, "max_drawdown": 0.0, "sharpe": None, "sortino": None}
+    cum = peak = max_dd = 0.0
+    for p in pnls:
+        cum += p
+        peak = max(peak, cum)
+        max_dd = max(max_dd, peak - cum)
+    m = sum(pnls) / len(pnls)
+    sd = (sum((x - m) ** 2 for x in pnls) / max(len(pnls) - 1, 1)) ** 0.5
+    dd = (sum(min(0.0, x - m) ** 2 for x in pnls) / max(len(pnls) - 1, 1)) ** 0.5
+    return {
+        "trades": len(pnls),
+        "wins": sum(1 for p in pnls if p > 0),
+        "pnl_total": sum(pnls),
+        "max_drawdown": max_dd,
+        "sharpe": m / sd if sd > 0 else None,
+        "sortino": m / dd if dd > 0 else None,
+    }
+
+
+def _same(a, b, tol=1e-9):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tol * max(1.0, abs(b))
+
+
+def test_sweep_matches_per_threshold_loop():
+    close, adx, rsi = _inputs()
+    thresholds = [0.5, 0.51, 0.55, 0.6, 0.7, 0.9, 0.95]
+    rows = river_threshold_sweep(close, adx, rsi, thresholds)
+    assert [r["threshold"] for r in rows] == thresholds
+    assert sum(1 for r in rows if r["trades"] > 1) >= 4
+    for row, t in zip(rows, thresholds):
+        ref = _loop(close, adx, rsi, t)
+        assert (row["trades"], row["wins"]) == (ref["trades"], ref["wins"]), t
+        for k in ("pnl_total", "max_drawdown", "sharpe", "sortino"):
+            assert _same(row[k], ref[k]), (t, k, row[k], ref[k])
+        if ref["trades"]:
+            assert _same(row["win_rate"], ref["wins"] / ref["trades"])
+            assert _same(row["expected_value"], ref["pnl_total"] / ref["trades"])
+
+
+def test_sweep_without_enough_candles_returns_empty_rows():
+    close, adx, rsi = _inputs(n=40)
+    rows = river_threshold_sweep(close, adx, rsi, [0.6])
+    assert rows == [{"threshold": 0.6, "trades": 0, "wins": 0, "win_rate": 0.0, "pnl_total": 0.0,
+                     "expected_value": 0.0, "max_drawdown": 0.0, "sharpe": None, "sortino": None}]
@@ -0,0 +1,106 @@
+import dataclasses
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import rsi_reinforced  # noqa: E402
+from rsi_reinforced import GRID_FIELDS, RsiReinforcedParams, backtest_signals, generate_signals, grid_backtest  # noqa: E402
+
+
+def _frame(n=1500, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 1000 + np.cumsum(rng.normal(0, 1.2, n))
+    open_ = close + rng.normal(0, 0.4, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.8, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.8, n),
+        "close": close,
+        "volume": rng.uniform(1, 50, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="1min"))
+
+
+def _params(**kw):
+    return RsiReinforcedParams(min_bandwidth=4.0, distance_from_mid_min=3.0, **kw)
+
+
+def _loop_signals(cdf, params):
+    """Laço por candle da versão original de generate_signals."""
+    cols = rsi_reinforced._signal_columns(cdf)
+    out = []
+    for i in range(2, len(cdf)):
+        side = rsi_reinforced._signal_at(i, cols, cols["htf"][i], cols["htf_slope"][i], params)
+        if side is not None:
+            out.append({"index": i, "timestamp": cdf.index[i], "side": side})
+    return out
+
+
+def _loop_backtest(df, signals, params):
+    """Laço trade a trade da versão original de backtest_signals."""
+    close = df["close"].values
+    h = max(1, int(params.horizon))
+    wins = losses = 0
+    eq = peak = max_dd = 0.0
+    for s in signals:
+        i = int(s["index"])
+        if i + h >= len(close):
+            continue
+        win = close[i + h] > close[i] if s["side"] == "CALL" else close[i + h] < close[i]
+        if win:
+            wins += 1
+            eq += params.payout_ratio
+        else:
+            losses += 1
+            eq -= 1.0
+        peak = max(peak, eq)
+        max_dd = min(max_dd, eq - peak)
+    total = wins + losses
+    return {"total_signals": total, "wins": wins, "losses": losses, "winrate": wins / total if total else 0.0,
+            "equity_final": eq if total else 0.0, "max_drawdown": max_dd}
+
+
+def test_vectorized_signals_and_backtest_match_per_bar_loop():
+    df = _frame()
+    for params in (_params(), _params(reentry_only=False, horizon=5), _params(confirm_with_slope=False, higher_tf_factor=1),
+                   _params(confirm_with_midline=False, rsi_bb_k=1.5)):
+        cdf, signals = generate_signals(df, params)
+        assert signals, params
+        assert signals == _loop_signals(cdf, params)
+        got = backtest_signals(df, signals, params)
+        ref = _loop_backtest(df, signals, params)
+        assert {k: got[k] for k in ("total_signals", "wins", "losses")} == {k: ref[k] for k in ("total_signals", "wins", "losses")}
+        for k in ("winrate", "equity_final", "max_drawdown"):
+            assert abs(got[k] - ref[k]) < 1e-9, (k, got[k], ref[k])
+
+
+def test_grid_matches_per_combination_runs_across_chunks():
+    df = _frame(900, seed=3)
+    base = _params()
+    grid = {
+        "rsi_period": [7, 14],
+        "rsi_bb_length": [20],
+        "rsi_bb_k": [1.5, 2.0],
+        "min_bandwidth": [2.0, 4.0, 8.0],
+        "distance_from_mid_min": [1.0, 3.0],
+        "horizon": [1, 3],
+    }
+    ref = []
+    for combo in itertools.product(*(grid[f] for f in GRID_FIELDS)):
+        params = dataclasses.replace(base, **dict(zip(GRID_FIELDS, combo)))
+        _, signals = generate_signals(df, params)
+        ref.append({**dict(zip(GRID_FIELDS, combo)), **backtest_signals(df, signals, params)})
+    ref.sort(key=lambda r: (r["equity_final"], r["winrate"]), reverse=True)
+
+    # blocos de 4 linhas (6 pares bandwidth x distância => último bloco parcial) e bloco único
+    for chunk_cells in (4 * len(df), 10 ** 9):
+        rows = grid_backtest(df, base, grid, chunk_cells=chunk_cells)
+        assert len(rows) == len(ref) == 48
+        for got, want in zip(rows, ref):
+            assert {f: got[f] for f in GRID_FIELDS} == {f: want[f] for f in GRID_FIELDS}
+            for k in ("total_signals", "wins", "losses", "winrate", "equity_final", "max_drawdown"):
+                assert got[k] == want[k], (k, got, want)
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+server = pytest.importorskip("server")
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def _endpoint(path, method):
+    for route in server.app.routes:
+        if getattr(route, "path", None) == path and method in getattr(route, "methods", ()):
+            return route.endpoint
+    return None
+
+
+def test_proposal_route_asks_deriv_for_a_quote(monkeypatch):
+    assert _endpoint("/api/deriv/proposal", "POST") is server.deriv_proposal
+    sent = []
+
+    async def fake_proposal(payload, timeout=10):
+        sent.append(payload)
+        return {"id": "P-1", "payout": 1.95, "ask_price": 1.0, "spot": 123.4}
+
+    monkeypatch.setattr(server._deriv, "connected", True)
+    monkeypatch.setattr(server._deriv.rpc, "proposal", fake_proposal)
+    # sem `with`: o lifespan (conexão real com a Deriv) não é executado
+    res = TestClient(server.app).post("/api/deriv/proposal", json={"symbol": "R_10", "contract_type": "CALL", "stake": 1.0})
+    assert res.status_code == 200
+    assert res.json() == {"id": "P-1", "payout": 1.95, "ask_price": 1.0, "spot": 123.4}
+    assert sent == [server._proposal_payload(server.BuyRequest(symbol="R_10", contract_type="CALL", stake=1.0))]
+
+
+def test_river_training_replays_learns_made_while_the_job_ran(monkeypatch, tmp_path):
+    import pickle
+    import river_online_model
+
+    monkeypatch.setattr(river_online_model, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(river_online_model, "METADATA_PATH", str(tmp_path / "meta.json"))
+    monkeypatch.setattr(server, "_river_model", river_online_model.RiverOnlineCandleModel())
+    monkeypatch.setattr(server, "_river_persistence", river_online_model.RiverPersistence(
+        path=str(tmp_path / "river.pkl"), interval_sec=3600, every_n=1000))
+    blob, since_seq = server._river_snapshot()
+    # contratos expirando enquanto o worker treina sobre o snapshot
+    server._river_learn("2024-01-01T00:00:00", 10.0, 11.0, 9.0, 10.5, 0.0, next_close=10.6, key="R_10")
+    server._river_learn("2024-01-01T00:01:00", 10.5, 11.0, 10.0, 10.6, 0.0, next_close=10.4, key="R_10")
+    trained = pickle.loads(blob)
+
+    summary = server._river_train_result(since_seq, {"model": trained, "summary": {"samples": 0}})
+    assert summary["replayed_learns"] == 2
+    assert server._river_model is trained
+    assert trained.sample_count == 2
+    # o modelo novo é persistido pelo processo principal (o worker não grava nada)
+    server._river_persistence.stop(flush=True)
+    assert server._river_persistence.pending == 0
+    assert pickle.loads((tmp_path / "river.pkl").read_bytes()).sample_count == 2
+
+
+def test_ml_engine_artifacts_are_promoted_from_staging(tmp_path):
+    import ml_engine
+    import model_registry
+
+    reg = model_registry.ModelRegistry(models_dir=str(tmp_path))
+    key = ("R_10", "1m", 3)
+    staging, final = reg.staging_path(key, 1), reg.artifact_path(key, 1)
+    ml_engine.save_trained_models(ml_engine.TrainedModels(), staging)
+    # antes do promote (ex.: job cancelado) nada é visível para o registry
+    assert reg.scan() == 0 and not (tmp_path / "ml_engine_R_10_1m_h3_v1_meta.pkl").exists()
+    ml_engine.save_trained_models(ml_engine.TrainedModels(), staging)
+    reg.promote(staging, final)
+    assert reg.scan() == 1 and reg.active[key] == 1
+    assert not list(tmp_path.glob(".staging_*"))
+
+
+def test_contracts_for_cache_is_dropped_when_reauthorizing_into_another_account(monkeypatch):
+    import asyncio
+
+    deriv = server.DerivWS("1", "token", "wss://example.invalid")
+    calls = []
+
+    async def fake_contracts_for(symbol, product_type=None, currency=None, timeout=12):
+        calls.append((symbol, deriv.landing_company_name))
+        return {"available": [{"contract_type": "CALL"}], "landing_company": deriv.landing_company_name}
+
+    monkeypatch.setattr(deriv.rpc, "contracts_for", fake_contracts_for)
+    deriv._on_authorize({"authorize": {"landing_company_name": "svg", "currency": "USD"}})
+
+    async def fetch_twice():
+        return [await deriv.contracts_for.get("R_10", currency="USD") for _ in range(2)]
+
+    asyncio.run(fetch_twice())
+    assert len(calls) == 1 and deriv.contracts_for.entries
+
+    # re-authorize na mesma conta mantém o cache; em outra conta o descarta
+    deriv._on_authorize({"authorize": {"landing_company_name": "svg", "currency": "USD"}})
+    assert deriv.contracts_for.entries
+    deriv._on_authorize({"authorize": {"landing_company_name": "maltainvest", "currency": "EUR"}})
+    assert not deriv.contracts_for.entries and deriv.currency == "EUR"